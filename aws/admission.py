@@ -0,0 +1,80 @@
+import threading
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """Request rejected by admission control; maps to an HTTP status + Retry-After."""
+
+    def __init__(self, status_code, reason, retry_after):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounds how much inference work may be queued, failing fast when full.
+
+    - More than max_pending requests admitted in total        -> 503 (queue full)
+    - pending >= shed_threshold and the request is not high
+      priority                                                 -> 503 (shed)
+    - an endpoint group already has `limits[group]` requests
+      in flight and the request is not high priority           -> 429
+
+    High-priority requests (possible danger windows) skip the shedding
+    threshold and the per-group limit; only the hard max_pending cap applies,
+    so they keep being served while regression and bulk work is shed.
+    """
+
+    def __init__(self, max_pending=512, shed_threshold=384, limits=None, retry_after=1):
+        self.max_pending = int(max_pending)
+        self.shed_threshold = min(int(shed_threshold), self.max_pending)
+        self.limits = dict(limits or {})
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.in_flight = {group: 0 for group in self.limits}
+        self.rejected = {}
+
+    def _reject(self, group, status_code, reason):
+        key = (group, reason)
+        self.rejected[key] = self.rejected.get(key, 0) + 1
+        raise Overloaded(status_code, reason, self.retry_after)
+
+    def acquire(self, group, high_priority=False):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self._reject(group, 503, "queue_full")
+            if not high_priority:
+                if self.pending >= self.shed_threshold:
+                    self._reject(group, 503, "shed")
+                limit = self.limits.get(group)
+                if limit is not None and self.in_flight.get(group, 0) >= limit:
+                    self._reject(group, 429, "concurrency_limit")
+            self.pending += 1
+            self.in_flight[group] = self.in_flight.get(group, 0) + 1
+
+    def release(self, group):
+        with self._lock:
+            self.pending -= 1
+            self.in_flight[group] -= 1
+
+    @contextmanager
+    def admit(self, group, high_priority=False):
+        self.acquire(group, high_priority)
+        try:
+            yield
+        finally:
+            self.release(group)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "shed_threshold": self.shed_threshold,
+                "in_flight": dict(self.in_flight),
+                "limits": dict(self.limits),
+                "rejected": {f"{group}:{reason}": n for (group, reason), n in self.rejected.items()},
+            }
@@ -1,17 +1,229 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, ValidationError
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import asyncio
+import os
+import time
 import numpy as np
-import tensorflow as tf
+
+from admission import AdmissionController, Overloaded
+from binary_format import UnsupportedContentType, decode_window
+from bulk import predict_windows, series_windows, window_count
+from inference_backends import MODEL_FILES, tflite_model_path
+from metrics import Registry, RequestMetricsMiddleware
+from model_server import ModelServer
+from prediction_cache import CLASSIFY_FEATURES, REGRESSION_FEATURES, PredictionCache, parse_resolutions
+from streaming import STREAM_COLUMNS, DeviceRegistry, event_to_row
+
+# ------------------- Config -------------------
+
+# Micro-batching: concurrent windows are coalesced into one model call of up
+# to BATCH_MAX_SIZE windows, waiting at most BATCH_MAX_WAIT_MS for stragglers.
+# BATCH_MAX_SIZE=1 restores one predict() per request.
+BATCH_MAX_SIZE = int(os.environ.get("CO_BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("CO_BATCH_MAX_WAIT_MS", "5"))
+
+# Inference backend: keras (model.predict), tf_function (traced, fixed input
+# signature) or tflite (interpreter pool over the exported .tflite files).
+INFERENCE_BACKEND = os.environ.get("CO_INFERENCE_BACKEND", "keras")
+TFLITE_POOL_SIZE = int(os.environ.get("CO_TFLITE_POOL_SIZE", "2"))
+
+# Sharded serving: CO_INFERENCE_WORKERS > 0 runs the models in that many
+# spawned worker processes, each limited to CO_THREADS_PER_WORKER TF threads
+# (and pinned to its own cores with CO_PIN_WORKERS=1). This process then only
+# parses requests and dispatches batches. See worker_pool.py for sizing.
+INFERENCE_WORKERS = int(os.environ.get("CO_INFERENCE_WORKERS", "0"))
+THREADS_PER_WORKER = int(os.environ.get("CO_THREADS_PER_WORKER", "1"))
+PIN_WORKERS = os.environ.get("CO_PIN_WORKERS", "0") == "1"
+
+# Streaming: per-device ring buffers kept for at most this many devices
+MAX_STREAM_DEVICES = int(os.environ.get("CO_MAX_STREAM_DEVICES", "10000"))
+
+# Bulk endpoints: requests above any cap are rejected with 413; windows are
+# run through the model BULK_CHUNK_WINDOWS at a time to bound memory.
+BULK_MAX_WINDOWS = int(os.environ.get("CO_BULK_MAX_WINDOWS", "200000"))
+# JSON bodies: events (series rows, or window samples) per request. Each parsed
+# event costs far more memory than its JSON bytes, so this is the real bound.
+BULK_MAX_EVENTS = int(os.environ.get("CO_BULK_MAX_EVENTS", "250000"))
+BULK_MAX_BODY_BYTES = int(os.environ.get("CO_BULK_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+BULK_CHUNK_WINDOWS = int(os.environ.get("CO_BULK_CHUNK_WINDOWS", "4096"))
+
+# Backpressure: at most ADMISSION_MAX_PENDING requests may be waiting on
+# inference; past ADMISSION_SHED_AT pending, only possible-danger classify
+# windows (any COppm >= PRIORITY_PPM) are admitted and everything else gets
+# 503. Each endpoint group is also capped at its own concurrency limit (429).
+# Rejections carry Retry-After: RETRY_AFTER_SECONDS.
+ADMISSION_MAX_PENDING = int(os.environ.get("CO_ADMISSION_MAX_PENDING", "512"))
+ADMISSION_SHED_AT = int(os.environ.get("CO_ADMISSION_SHED_AT", "384"))
+LIMIT_CLASSIFY = int(os.environ.get("CO_LIMIT_CLASSIFY", "256"))
+LIMIT_PREDICT_PPM = int(os.environ.get("CO_LIMIT_PREDICT_PPM", "256"))
+LIMIT_BULK = int(os.environ.get("CO_LIMIT_BULK", "2"))
+PRIORITY_PPM = float(os.environ.get("CO_PRIORITY_PPM", "50"))
+RETRY_AFTER_SECONDS = int(os.environ.get("CO_RETRY_AFTER_SECONDS", "1"))
+
+# Bulk requests run on their own executor, never on the request threadpool
+BULK_WORKERS = int(os.environ.get("CO_BULK_WORKERS", "1"))
+
+# Startup warm-up: one synthetic batch per size per model before /readyz
+# reports ready (defaults to the sizes the micro-batcher produces).
+WARMUP_BATCH_SIZES = [
+    int(size) for size in
+    os.environ.get("CO_WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE}").split(",") if size.strip()
+]
+
+# Prediction cache (off by default): windows are quantized per feature and
+# hashed; identical quantized windows reuse the last prediction. Resolutions
+# are "feature=step" lists; features not listed are matched exactly, so COppm
+# is never coarsened unless it is named explicitly. Example:
+#   CO_CACHE_CLASSIFY_RESOLUTION="temperature=0.1,humidity=0.5,heaterVoltage=0.001"
+#   CO_CACHE_PREDICT_RESOLUTION="temperature=0.1,humidity=0.5,sensorResistances=0.001"
+CACHE_ENABLED = os.environ.get("CO_CACHE_ENABLED", "0") == "1"
+CACHE_MAX_ENTRIES = int(os.environ.get("CO_CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = float(os.environ.get("CO_CACHE_TTL_SECONDS", "300"))
+CACHE_CLASSIFY_RESOLUTION = os.environ.get("CO_CACHE_CLASSIFY_RESOLUTION", "")
+CACHE_PREDICT_RESOLUTION = os.environ.get("CO_CACHE_PREDICT_RESOLUTION", "")
+
+# ------------------- Metrics -------------------
+
+# Exposed in Prometheus text format at GET /metrics
+metrics = Registry()
+REQUESTS_TOTAL = metrics.counter(
+    "co_http_requests_total", "HTTP requests by endpoint and status code", ("endpoint", "status"))
+REQUEST_SECONDS = metrics.histogram(
+    "co_http_request_seconds", "End-to-end HTTP request latency", ("endpoint",))
+IN_FLIGHT = metrics.gauge(
+    "co_http_requests_in_flight", "HTTP requests currently being handled")
+STAGE_SECONDS = metrics.histogram(
+    "co_request_stage_seconds",
+    "Latency per request stage: parse (receive + JSON/pydantic or binary decode), "
+    "build_array, inference, serialize",
+    ("endpoint", "stage"))
+BATCH_SIZE = metrics.histogram(
+    "co_inference_batch_size", "Windows per micro-batched model call", ("model",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+BATCH_SECONDS = metrics.histogram(
+    "co_inference_batch_seconds", "Model call latency per micro-batch", ("model",))
+MODEL_INFO = metrics.gauge(
+    "co_model_info", "Loaded model versions", ("model", "version", "backend"))
+CACHE_LOOKUPS = metrics.counter(
+    "co_cache_lookups_total", "Prediction cache lookups", ("model", "result"))
+REJECTED = metrics.counter(
+    "co_requests_rejected_total", "Requests rejected by admission control", ("group", "reason"))
+PENDING = metrics.gauge(
+    "co_inference_pending", "Requests admitted and waiting on inference")
+CACHE_EVICTIONS = metrics.counter(
+    "co_cache_evictions_total", "Prediction cache LRU evictions and TTL expirations", ("model", "reason"))
+
+def observe_batch(model_name, size, seconds):
+    BATCH_SIZE.observe(model_name, value=size)
+    BATCH_SECONDS.observe(model_name, value=seconds)
 
 # ------------------- Load Models -------------------
 
-# Load Keras models
-clf_model = tf.keras.models.load_model("co_lstm_classifier_v1.h5")
-reg_model = tf.keras.models.load_model("co_lstm_regression_v1.h5")
+clf_cache = reg_cache = None
+if CACHE_ENABLED:
+    clf_cache = PredictionCache(
+        parse_resolutions(CACHE_CLASSIFY_RESOLUTION, CLASSIFY_FEATURES),
+        max_entries=CACHE_MAX_ENTRIES,
+        ttl_seconds=CACHE_TTL_SECONDS,
+    )
+    reg_cache = PredictionCache(
+        parse_resolutions(CACHE_PREDICT_RESOLUTION, REGRESSION_FEATURES),
+        max_entries=CACHE_MAX_ENTRIES,
+        ttl_seconds=CACHE_TTL_SECONDS,
+    )
+
+# Models are loaded and warmed in the background after the app starts, so a
+# worker binds its port immediately; traffic should wait for /readyz.
+models = ModelServer(
+    backend=INFERENCE_BACKEND,
+    pool_size=TFLITE_POOL_SIZE,
+    batch_max_size=BATCH_MAX_SIZE,
+    batch_max_wait_ms=BATCH_MAX_WAIT_MS,
+    warmup_batch_sizes=WARMUP_BATCH_SIZES,
+    clf_cache=clf_cache,
+    reg_cache=reg_cache,
+    workers=INFERENCE_WORKERS,
+    threads_per_worker=THREADS_PER_WORKER,
+    pin_workers=PIN_WORKERS,
+    on_batch=observe_batch,
+)
+
+for model_name, (keras_file, tflite_file, _) in MODEL_FILES.items():
+    model_file = keras_file
+    if INFERENCE_BACKEND == "tflite":
+        model_file = os.path.basename(tflite_model_path(".", tflite_file))
+    MODEL_INFO.set(model_name, os.path.splitext(model_file)[0], INFERENCE_BACKEND, value=1)
+
+def collect_cache_metrics():
+    for model_name, cache in (("classifier", clf_cache), ("regression", reg_cache)):
+        if cache is None:
+            continue
+        stats = cache.stats()
+        CACHE_LOOKUPS.set_total(model_name, "hit", value=stats["hits"])
+        CACHE_LOOKUPS.set_total(model_name, "miss", value=stats["misses"])
+        CACHE_EVICTIONS.set_total(model_name, "lru", value=stats["evictions"])
+        CACHE_EVICTIONS.set_total(model_name, "ttl", value=stats["expirations"])
+
+metrics.add_collector(collect_cache_metrics)
+
+admission = AdmissionController(
+    max_pending=ADMISSION_MAX_PENDING,
+    shed_threshold=ADMISSION_SHED_AT,
+    limits={"classify": LIMIT_CLASSIFY, "predict_ppm": LIMIT_PREDICT_PPM, "bulk": LIMIT_BULK},
+    retry_after=RETRY_AFTER_SECONDS,
+)
+bulk_executor = ThreadPoolExecutor(BULK_WORKERS, thread_name_prefix="bulk-inference")
+# Bulk body parsing has its own threads, one per admitted bulk request, so a
+# large parse never queues behind (or delays) bulk inference
+bulk_parse_executor = ThreadPoolExecutor(max(LIMIT_BULK, 1), thread_name_prefix="bulk-parse")
+
+def collect_admission_metrics():
+    stats = admission.stats()
+    PENDING.set(value=stats["pending"])
+    for key, n in stats["rejected"].items():
+        group, reason = key.split(":")
+        REJECTED.set_total(group, reason, value=n)
+
+metrics.add_collector(collect_admission_metrics)
+
+@asynccontextmanager
+async def lifespan(app):
+    models.start()
+    yield
+    bulk_executor.shutdown(wait=False)
+    bulk_parse_executor.shutdown(wait=False)
+    models.close()
+
+def ready_models():
+    if not models.ready:
+        raise HTTPException(status_code=503, detail=f"Models not ready ({models.phase})",
+                            headers={"Retry-After": "1"})
+    return models
 
 # ------------------- FastAPI -------------------
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(
+    RequestMetricsMiddleware,
+    requests_total=REQUESTS_TOTAL,
+    request_seconds=REQUEST_SECONDS,
+    in_flight=IN_FLIGHT,
+)
+
+stream_devices = DeviceRegistry(max_devices=MAX_STREAM_DEVICES)
+
+LABELS = ["safe", "warning", "danger"]
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": f"Server overloaded ({exc.reason})"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # ------------------- Models -------------------
 
@@ -23,52 +235,368 @@ class SensorEvent(BaseModel):
     sensorResistances: List[float]  # 14 items
     COppm: float  # Only used for classification
 
-# ------------------- Endpoints -------------------
+# Either N windows, or one contiguous series cut into windows every `stride` rows
+class BulkRequest(BaseModel):
+    windows: Optional[List[List[SensorEvent]]] = None
+    series: Optional[List[SensorEvent]] = None
+    stride: Optional[int] = None     # series only; default 1
 
-@app.post("/classify")
-def classify(events: List[SensorEvent]):
-    if len(events) != 10:
-        raise HTTPException(status_code=400, detail="Classification model requires exactly 10 samples")
+# ------------------- Features -------------------
 
-    input_sequence = [
-        [e.temperature, e.humidity, e.heaterVoltage, e.COppm]
-        for e in events
-    ]
+def classify_features(events):
+    return np.array(
+        [[e.temperature, e.humidity, e.heaterVoltage, e.COppm] for e in events],
+        dtype=np.float32
+    ).reshape(len(events), 4)
 
-    input_array = np.array(input_sequence, dtype=np.float32).reshape(1, 10, 4)
+def regression_features(events):
+    if any(len(e.sensorResistances) != 14 for e in events):
+        raise ValueError("sensorResistances must have exactly 14 values")
+    return np.array(
+        [
+            [
+                e.temperature,
+                e.humidity,
+                e.heaterVoltage,
+                e.flowRate,
+                *e.sensorResistances  # Unpack the 14 values
+            ]
+            for e in events
+        ],
+        dtype=np.float32
+    ).reshape(len(events), 18)
 
-    # Run inference
-    predictions = clf_model.predict(input_array)
-    class_index = int(np.argmax(predictions[0]))
-    labels = ["safe", "warning", "danger"]
+# ------------------- Responses -------------------
 
+def classify_response(prediction):
+    class_index = int(np.argmax(prediction))
     return {
-        "label": labels[class_index],
-        "confidence": predictions[0].tolist()
+        "label": LABELS[class_index],
+        "confidence": prediction.tolist()
     }
 
+def regression_response(prediction):
+    return {
+        "predicted_COppm": float(prediction[0])
+    }
+
+# ------------------- Stage timing -------------------
+
+# Time from the middleware seeing the request to the handler starting work:
+# body receive plus JSON/pydantic validation (or binary decode)
+def observe_parse(request: Request, endpoint):
+    start = request.scope.get("co_request_start")
+    if start is not None:
+        STAGE_SECONDS.observe(endpoint, "parse", value=time.perf_counter() - start)
+
+def timed_response(endpoint, content):
+    with STAGE_SECONDS.time(endpoint, "serialize"):
+        return JSONResponse(content)
+
+# ------------------- Inference -------------------
+
+# A classify window that already reads warning-level CO may be a danger
+# window; it is queued ahead of other work and is the last to be shed.
+def possible_danger(classify_window):
+    return bool(classify_window[:, 3].max() >= PRIORITY_PPM)
+
+# Admit, queue on the model's micro-batcher thread and await the result
+# without holding a request thread
+async def infer(predictor, group, window, high_priority=False):
+    with admission.admit(group, high_priority):
+        return await asyncio.wrap_future(predictor.submit(window, high_priority))
+
+# The caller holds the "bulk" admission slot (taken before the body is read)
+async def infer_bulk(model, windows):
+    future = bulk_executor.submit(predict_windows, model.predict, windows, BULK_CHUNK_WINDOWS)
+    return await asyncio.wrap_future(future)
+
+# ------------------- Endpoints -------------------
+
+@app.post("/classify")
+async def classify(events: List[SensorEvent], request: Request):
+    observe_parse(request, "classify")
+    if len(events) != 10:
+        raise HTTPException(status_code=400, detail="Classification model requires exactly 10 samples")
+
+    with STAGE_SECONDS.time("classify", "build_array"):
+        input_array = classify_features(events)
+
+    # Run inference (coalesced with concurrent requests)
+    with STAGE_SECONDS.time("classify", "inference"):
+        prediction = await infer(ready_models().clf_predictor, "classify", input_array,
+                                 possible_danger(input_array))
+    return timed_response("classify", classify_response(prediction))
+
 @app.post("/predict_ppm")
-def predict_ppm(events: List[SensorEvent]):
+async def predict_ppm(events: List[SensorEvent], request: Request):
+    observe_parse(request, "predict_ppm")
     if len(events) != 30:
         raise HTTPException(status_code=400, detail="Regression model requires exactly 30 samples")
 
-    input_sequence = [
-        [
-            e.temperature,
-            e.humidity,
-            e.heaterVoltage,
-            e.flowRate,
-            *e.sensorResistances  # Unpack the 14 values
-        ]
-        for e in events
-    ]
+    try:
+        with STAGE_SECONDS.time("predict_ppm", "build_array"):
+            input_array = regression_features(events)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Run inference (coalesced with concurrent requests)
+    with STAGE_SECONDS.time("predict_ppm", "inference"):
+        prediction = await infer(ready_models().reg_predictor, "predict_ppm", input_array)
+    return timed_response("predict_ppm", regression_response(prediction))
+
+# ------------------- Binary Endpoints -------------------
+
+# Same models as /classify and /predict_ppm, but the body is the window itself
+# as packed float32 rows (application/octet-stream) or .npy (application/x-npy),
+# decoded with np.frombuffer instead of per-field pydantic objects.
+# See binary_format.py for the column layouts.
+
+async def read_binary_window(request: Request, n_rows, n_columns):
+    body = await request.body()
+    try:
+        return decode_window(body, request.headers.get("content-type"), n_columns, n_rows=n_rows)
+    except UnsupportedContentType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/classify_bin")
+async def classify_bin(request: Request):
+    input_array = await read_binary_window(request, 10, 4)
+    observe_parse(request, "classify_bin")
+    with STAGE_SECONDS.time("classify_bin", "inference"):
+        prediction = await infer(ready_models().clf_predictor, "classify", input_array,
+                                 possible_danger(input_array))
+    return timed_response("classify_bin", classify_response(prediction))
+
+@app.post("/predict_ppm_bin")
+async def predict_ppm_bin(request: Request):
+    input_array = await read_binary_window(request, 30, 18)
+    observe_parse(request, "predict_ppm_bin")
+    with STAGE_SECONDS.time("predict_ppm_bin", "inference"):
+        prediction = await infer(ready_models().reg_predictor, "predict_ppm", input_array)
+    return timed_response("predict_ppm_bin", regression_response(prediction))
+
+# ------------------- Bulk Endpoints -------------------
+
+# For backfills: many windows in one request and one vectorized forward pass.
+# JSON body: {"windows": [[SensorEvent x 10|30], ...]}
+#         or {"series": [SensorEvent, ...], "stride": k}
+# Binary body (octet-stream / npy, layouts as above): the series rows, cut
+# every ?stride= rows (default: the window length, i.e. N stacked windows).
+# A JSON series takes its stride from ?stride= or the body (default 1); both
+# given and different, or any stride with "windows", is a 422.
+# Windows are strided views over the series, never copied one by one.
+
+def _body_too_large():
+    return HTTPException(status_code=413, detail=f"Body exceeds {BULK_MAX_BODY_BYTES} bytes")
+
+# Runs on bulk_parse_executor: parsing up to BULK_MAX_BODY_BYTES of JSON would block
+# the event loop (and /healthz, /readyz) for every client. Every JSON event has
+# one "temperature" key, so the event count is capped on the raw bytes before
+# any per-event pydantic object is built.
+def parse_bulk_body(body, content_type, window, n_columns, features_fn, stride):
+    if content_type.split(";")[0].strip().lower() == "application/json":
+        n_events = body.count(b'"temperature"')
+        if n_events > BULK_MAX_EVENTS:
+            raise HTTPException(status_code=413,
+                                detail=f"{n_events} events exceeds the limit of {BULK_MAX_EVENTS}")
+        bulk = BulkRequest.model_validate_json(body)
+        if (bulk.windows is None) == (bulk.series is None):
+            raise ValueError("Provide exactly one of 'windows' or 'series'")
+        if stride is not None and bulk.stride is not None and stride != bulk.stride:
+            raise HTTPException(status_code=422,
+                                detail=f"?stride={stride} conflicts with the body's stride {bulk.stride}")
+        stride = bulk.stride if stride is None else stride
+        if bulk.windows is not None:
+            if stride is not None:
+                raise HTTPException(status_code=422, detail="stride applies to 'series', not 'windows'")
+            if any(len(w) != window for w in bulk.windows):
+                raise ValueError(f"Every window must have exactly {window} samples")
+            series = features_fn([e for w in bulk.windows for e in w])
+            stride = window
+        else:
+            series = features_fn(bulk.series)
+            stride = 1 if stride is None else stride
+    else:
+        series = decode_window(body, content_type, n_columns)
+        stride = window if stride is None else stride
 
-    input_array = np.array(input_sequence, dtype=np.float32).reshape(1, 30, 18)
+    if stride < 1:
+        raise ValueError("stride must be >= 1")
+    n_windows = window_count(len(series), window, stride)
+    if n_windows > BULK_MAX_WINDOWS:
+        raise HTTPException(status_code=413,
+                            detail=f"{n_windows} windows exceeds the limit of {BULK_MAX_WINDOWS}")
+    return series_windows(series, window, stride)
 
-    # Run inference
-    prediction = reg_model.predict(input_array)
-    predicted_COppm = float(prediction[0][0])
+# Call with the "bulk" admission slot held, so LIMIT_BULK also bounds how many
+# bodies are buffered at once and an overloaded server sheds before reading
+async def read_bulk_windows(request: Request, window, n_columns, features_fn, stride):
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        try:
+            declared = int(content_length)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+        if declared > BULK_MAX_BODY_BYTES:
+            raise _body_too_large()
+    body = await request.body()
+    if len(body) > BULK_MAX_BODY_BYTES:
+        raise _body_too_large()
 
+    content_type = request.headers.get("content-type") or "application/json"
+    try:
+        future = bulk_parse_executor.submit(parse_bulk_body, body, content_type, window, n_columns, features_fn,
+                                            stride)
+        return await asyncio.wrap_future(future)
+    except UnsupportedContentType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except (ValidationError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/classify_batch")
+async def classify_batch(request: Request, stride: Optional[int] = None):
+    model = ready_models().clf_model
+    with admission.admit("bulk"):
+        windows = await read_bulk_windows(request, 10, 4, classify_features, stride)
+        observe_parse(request, "classify_batch")
+        with STAGE_SECONDS.time("classify_batch", "inference"):
+            predictions = await infer_bulk(model, windows)
+    class_indices = np.argmax(predictions, axis=1)
+    return timed_response("classify_batch", {
+        "count": len(predictions),
+        "labels": [LABELS[i] for i in class_indices],
+        "confidence": predictions.tolist()
+    })
+
+@app.post("/predict_ppm_batch")
+async def predict_ppm_batch(request: Request, stride: Optional[int] = None):
+    model = ready_models().reg_model
+    with admission.admit("bulk"):
+        windows = await read_bulk_windows(request, 30, 18, regression_features, stride)
+        observe_parse(request, "predict_ppm_batch")
+        with STAGE_SECONDS.time("predict_ppm_batch", "inference"):
+            predictions = await infer_bulk(model, windows)
+    return timed_response("predict_ppm_batch", {
+        "count": len(predictions),
+        "predicted_COppm": predictions[:, 0].tolist()
+    })
+
+@app.get("/batch_stats")
+def batch_stats():
+    m = ready_models()
+    return {
+        "classify": m.clf_batcher.stats(),
+        "predict_ppm": m.reg_batcher.stats(),
+    }
+
+@app.get("/cache_stats")
+def cache_stats():
+    if not CACHE_ENABLED:
+        return {"enabled": False}
     return {
-        "predicted_COppm": predicted_COppm
-    }
\ No newline at end of file
+        "enabled": True,
+        "classify": clf_cache.stats(),
+        "predict_ppm": reg_cache.stats(),
+    }
+
+@app.get("/admission_stats")
+def admission_stats():
+    return admission.stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# ------------------- Health -------------------
+
+# Liveness: the process is up and model loading has not failed
+@app.get("/healthz")
+def healthz():
+    if models.failed:
+        return JSONResponse(status_code=500, content={"status": "failed", **models.status()})
+    return {"status": "ok", "phase": models.phase}
+
+# Readiness: both models loaded and warmed, safe to route traffic here
+@app.get("/readyz")
+def readyz():
+    if not models.ready:
+        return JSONResponse(status_code=503, content={"status": "not ready", **models.status()},
+                            headers={"Retry-After": "1"})
+    return {"status": "ready", **models.status()}
+
+# ------------------- Streaming -------------------
+
+# One event per message, either a SensorEvent JSON text frame or a binary
+# frame of 19 little-endian float32 (column order in streaming.py). The server
+# keeps the last 30 events per device and emits {"model": "classify", ...} / {"model": "predict_ppm", ...} messages.
+# A newer connection for the same device_id replaces the older one, which is
+# closed (1008) on its next message.
+#   mode=tumbling  one result per full 10 / 30 event window (default)
+#   mode=sliding   one result per event once the window is full
+@app.websocket("/stream/{device_id}")
+async def stream(websocket: WebSocket, device_id: str, mode: str = "tumbling"):
+    if mode not in ("tumbling", "sliding"):
+        await websocket.close(code=1008, reason="mode must be 'tumbling' or 'sliding'")
+        return
+
+    if not models.ready:
+        await websocket.close(code=1013, reason="Models not ready")
+        return
+
+    await websocket.accept()
+    device = stream_devices.get(device_id, stride=1 if mode == "sliding" else None, owner=websocket)
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if device.owner is not websocket:
+                await websocket.close(code=1008, reason="Replaced by a newer connection for this device")
+                return
+            try:
+                if message.get("bytes") is not None:
+                    row = decode_window(message["bytes"], "application/octet-stream",
+                                        STREAM_COLUMNS, n_rows=1)[0]
+                else:
+                    row = event_to_row(SensorEvent.model_validate_json(message["text"]))
+            except (ValidationError, ValueError) as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+
+            # Results are awaited before this connection pushes its next
+            # event, but a connection taking the device over may push in the
+            # meantime, so the regression window (a ring buffer view) is
+            # copied; the classify column pick is a copy already.
+            device.push(row)
+            seq = device.buffer.count
+
+            clf_window = device.classify_window()
+            reg_window = device.regression_window()
+            if reg_window is not None:
+                reg_window = reg_window.copy()
+            pending = []
+            if clf_window is not None:
+                pending.append(("classify", classify_response, infer(
+                    models.clf_predictor, "classify", clf_window, possible_danger(clf_window))))
+            if reg_window is not None:
+                pending.append(("predict_ppm", regression_response, infer(
+                    models.reg_predictor, "predict_ppm", reg_window)))
+
+            results = await asyncio.gather(*(c for _, _, c in pending), return_exceptions=True)
+            for (name, respond, _), result in zip(pending, results):
+                if isinstance(result, Overloaded):
+                    content = {"error": f"Server overloaded ({result.reason})",
+                               "retry_after": result.retry_after}
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    content = respond(result)
+                await websocket.send_json({"model": name, "device_id": device_id, "seq": seq, **content})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stream_devices.release(device_id, websocket)
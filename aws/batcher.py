@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger("uvicorn.error")
+
+# Coalesces concurrent single-window requests into one batched model call.
+#
+# Callers submit a (time_steps, n_features) window and get a Future back. A
+# background thread waits for the first window, then keeps collecting until
+# either max_batch_size windows are queued or max_wait_ms has elapsed, runs
+# predict_fn once on the stacked batch and hands row i back to caller i.
+#
+# concurrency > 1 lets that many batches be in predict_fn at once (for
+# backends that fan out to several worker processes); while all slots are
+# busy the next batch keeps filling up.
+#
+# on_batch(size, seconds), if given, is called after every model call.
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0, name="batcher", concurrency=1,
+                 on_batch=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be >= 0")
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_s = float(max_wait_ms) / 1000.0
+        self.name = name
+        self.concurrency = int(concurrency)
+        self.on_batch = on_batch
+
+        self._queue = deque()
+        self._priority = deque()     # drained first, in arrival order
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Fill statistics
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._windows = 0
+        self._size_counts = [0] * (self.max_batch_size + 1)
+
+        self._slots = threading.Semaphore(self.concurrency)
+        self._executor = None
+        if self.concurrency > 1:
+            self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix=name)
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    # Queue one window, returns a Future resolving to the model output row.
+    # priority=True queues it ahead of every normal window (priority windows
+    # keep their own first-in, first-out order).
+    def submit(self, window, priority=False) -> Future:
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed")
+            (self._priority if priority else self._queue).append((window, future))
+            self._cond.notify()
+        return future
+
+    def _queued(self):
+        return len(self._priority) + len(self._queue)
+
+    # Blocking helper for sync handlers
+    def predict(self, window, timeout=None, priority=False):
+        return self.submit(window, priority).result(timeout=timeout)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queued() and not self._closed:
+                self._cond.wait()
+            if not self._queued():
+                return None
+
+            deadline = time.monotonic() + self.max_wait_s
+            while self._queued() < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            for queue in (self._priority, self._queue):
+                while queue and len(batch) < self.max_batch_size:
+                    batch.append(queue.popleft())
+            return batch
+
+    def _run(self):
+        while True:
+            self._slots.acquire()
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            if self._executor is None:
+                self._run_batch(batch)
+                continue
+            try:
+                self._executor.submit(self._run_batch, batch)
+            except Exception as e:
+                # executor shut down under us: fail the batch, keep the slot count right
+                self._fail(batch, e)
+                self._slots.release()
+
+    # Never raises: any error (backend failure, bad window shape, wrong output
+    # size) fails this batch's futures and the thread moves on to the next one
+    def _run_batch(self, batch):
+        try:
+            # Drop callers that gave up while queued
+            batch = [(w, f) for w, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                return
+
+            inputs = np.stack([w for w, _ in batch]).astype(np.float32, copy=False)
+            start = time.perf_counter()
+            outputs = np.asarray(self.predict_fn(inputs))
+            seconds = time.perf_counter() - start
+            if len(outputs) != len(batch):
+                raise ValueError(f"model returned {len(outputs)} rows for a batch of {len(batch)}")
+
+            for i, (_, f) in enumerate(batch):
+                f.set_result(outputs[i])
+            self._record(len(batch))
+            if self.on_batch is not None:
+                self.on_batch(len(batch), seconds)
+        except Exception as e:
+            logger.exception("%s: batch of %d windows failed", self.name, len(batch))
+            self._fail(batch, e)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _fail(batch, exc):
+        for _, f in batch:
+            if not f.done():
+                f.set_exception(exc)
+
+    def _record(self, size):
+        with self._stats_lock:
+            self._batches += 1
+            self._windows += size
+            self._size_counts[size] += 1
+
+    # Batch fill report: how many windows each model call actually carried
+    def stats(self):
+        with self._stats_lock:
+            batches = self._batches
+            windows = self._windows
+            size_counts = list(self._size_counts)
+
+        mean_size = windows / batches if batches else 0.0
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000.0,
+            "concurrency": self.concurrency,
+            "batches": batches,
+            "windows": windows,
+            "mean_batch_size": round(mean_size, 3),
+            "mean_fill_ratio": round(mean_size / self.max_batch_size, 3),
+            "full_batches": size_counts[self.max_batch_size],
+            "size_histogram": {str(size): n for size, n in enumerate(size_counts) if n},
+            "queued": self._queued(),
+        }
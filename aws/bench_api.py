@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+
+from sensor_simulate import rows_to_events
+from streaming import CLASSIFY_COLUMNS, CLASSIFY_WINDOW, PREDICT_WINDOW, REGRESSION_COLUMNS, STREAM_COLUMNS
+
+# ------------------- Config -------------------
+
+# Closed-loop benchmark of the serving API: at each concurrency level, that
+# many clients send back-to-back requests for DURATION seconds (after a
+# WARMUP period whose samples are dropped). The app runs in this process,
+# either behind httpx's ASGI transport (no sockets) or uvicorn on 127.0.0.1.
+DEFAULT_ENDPOINTS = ["/classify", "/predict_ppm"]
+DEFAULT_LEVELS = [1, 4, 16, 64]
+DURATION_SECONDS = 10.0
+WARMUP_SECONDS = 2.0
+PAYLOAD_POOL = 64          # distinct windows per endpoint, sent round-robin
+READY_TIMEOUT_SECONDS = 300.0
+
+# Compare mode: a level regresses when throughput drops, or p50 / p99 grow,
+# by more than this fraction of the baseline
+REGRESSION_TOLERANCE = 0.10
+
+# ------------------- Payloads -------------------
+
+# Synthetic stream rows in the ranges benchmark.py uses (19 columns, see streaming.py)
+def synthetic_rows(n, rng):
+    rows = np.empty((n, STREAM_COLUMNS), dtype=np.float32)
+    rows[:, 0] = rng.uniform(20.0, 30.0, n)       # temperature
+    rows[:, 1] = rng.uniform(40.0, 60.0, n)       # humidity
+    rows[:, 2] = rng.uniform(0.85, 0.95, n)       # heaterVoltage
+    rows[:, 3] = rng.uniform(230.0, 270.0, n)     # flowRate
+    rows[:, 4:18] = rng.uniform(0.1, 0.15, (n, 14))
+    rows[:, 18] = rng.uniform(0.0, 10.0, n)       # COppm
+    return rows
+
+# endpoint -> list of client.post keyword arguments
+def build_payloads(endpoints, pool=PAYLOAD_POOL, seed=0):
+    rng = np.random.default_rng(seed)
+    payloads = {}
+    for endpoint in endpoints:
+        window = CLASSIFY_WINDOW if endpoint.startswith("/classify") else PREDICT_WINDOW
+        columns = CLASSIFY_COLUMNS if endpoint.startswith("/classify") else REGRESSION_COLUMNS
+        items = []
+        for _ in range(pool):
+            rows = synthetic_rows(window, rng)
+            if endpoint.endswith("_bin"):
+                items.append({"content": np.ascontiguousarray(rows[:, columns]).tobytes(),
+                              "headers": {"Content-Type": "application/octet-stream"}})
+            else:
+                items.append({"json": rows_to_events(rows)})
+        payloads[endpoint] = items
+    return payloads
+
+# ------------------- Load -------------------
+
+async def run_level(client, endpoint, payloads, concurrency, duration, warmup):
+    loop = asyncio.get_running_loop()
+    measure_from = loop.time() + warmup
+    stop_at = measure_from + duration
+    latencies, statuses, errors = [], {}, {}
+
+    async def worker(offset):
+        i = offset
+        while loop.time() < stop_at:
+            payload = payloads[i % len(payloads)]
+            i += concurrency
+            start = time.perf_counter()
+            try:
+                response = await client.post(endpoint, **payload)
+                outcome = response.status_code
+            except httpx.HTTPError as e:
+                outcome = type(e).__name__
+            elapsed = time.perf_counter() - start
+            if loop.time() < measure_from:
+                continue
+            latencies.append(elapsed)
+            if isinstance(outcome, int):
+                statuses[outcome] = statuses.get(outcome, 0) + 1
+            else:
+                errors[outcome] = errors.get(outcome, 0) + 1
+
+    await asyncio.gather(*(worker(c) for c in range(concurrency)))
+    return summarize(latencies, statuses, errors, duration)
+
+def summarize(latencies, statuses, errors, duration):
+    ok = sum(n for status, n in statuses.items() if 200 <= status < 300)
+    if not latencies:
+        return {"requests": 0, "ok": 0, "error_rate": 1.0, "throughput_rps": 0.0,
+                "p50_ms": None, "p99_ms": None, "mean_ms": None,
+                "status_codes": {}, "transport_errors": errors}
+    ms = np.array(latencies) * 1000.0
+    return {
+        "requests": len(latencies),
+        "ok": ok,
+        "error_rate": round(1.0 - ok / len(latencies), 4),
+        # only successful responses count towards throughput
+        "throughput_rps": round(ok / duration, 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "status_codes": {str(s): n for s, n in sorted(statuses.items())},
+        "transport_errors": errors,
+    }
+
+async def wait_ready(client, timeout=READY_TIMEOUT_SECONDS):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            response = await client.get("/readyz")
+            if response.status_code == 200:
+                return response.json()
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Server not ready after {timeout:.0f} s")
+        await asyncio.sleep(0.5)
+
+async def drive(client, endpoints, levels, duration, warmup, seed):
+    ready = await wait_ready(client)
+    payloads = build_payloads(endpoints, seed=seed)
+    results = {}
+    for endpoint in endpoints:
+        results[endpoint] = {}
+        for concurrency in levels:
+            level = await run_level(client, endpoint, payloads[endpoint], concurrency, duration, warmup)
+            results[endpoint][str(concurrency)] = level
+            print(f"{endpoint:<16} c={concurrency:<4} {level['throughput_rps']:>9.1f} rps  "
+                  f"p50 {level['p50_ms'] or 0:>8.2f} ms  p99 {level['p99_ms'] or 0:>8.2f} ms  "
+                  f"errors {level['error_rate']:.2%}")
+    return ready, results
+
+# ------------------- Servers -------------------
+
+# Config is read from CO_* environment variables when app.py is imported, so
+# --env overrides are applied before the import.
+def import_app(env):
+    os.environ.update(env)
+    from app import app
+    return app
+
+async def bench_asgi(env, **kwargs):
+    app = import_app(env)
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport does not run the lifespan, which starts model loading
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as client:
+            return await drive(client, **kwargs)
+
+async def bench_url(url, **kwargs):
+    n = max(kwargs["levels"])
+    limits = httpx.Limits(max_connections=n, max_keepalive_connections=n)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        return await drive(client, **kwargs)
+
+# uvicorn on a local port in a background thread; the client shares the
+# process (and the GIL) with the server, so absolute numbers are pessimistic
+class LocalServer:
+    def __init__(self, env, port):
+        import uvicorn
+
+        config = uvicorn.Config(import_app(env), host="127.0.0.1", port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.url = f"http://127.0.0.1:{port}"
+        self._thread = threading.Thread(target=self.server.run, name="bench-uvicorn", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        while not self.server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("uvicorn exited during startup")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self._thread.join()
+
+# ------------------- Compare -------------------
+
+# Returns a list of human-readable regressions of `current` against `baseline`
+def compare(baseline, current, tolerance=REGRESSION_TOLERANCE):
+    regressions = []
+    for endpoint, levels in current["results"].items():
+        for level, now in levels.items():
+            before = baseline["results"].get(endpoint, {}).get(level)
+            if before is None:
+                continue
+            where = f"{endpoint} c={level}"
+            if before["throughput_rps"] and now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+                regressions.append(f"{where}: throughput {before['throughput_rps']:.1f} -> "
+                                   f"{now['throughput_rps']:.1f} rps")
+            for key in ("p50_ms", "p99_ms"):
+                if before[key] is None:
+                    continue
+                if now[key] is None or now[key] > before[key] * (1 + tolerance):
+                    regressions.append(f"{where}: {key[:3]} {before[key]:.2f} -> {now[key]} ms")
+            if now["error_rate"] > before["error_rate"] + 0.01:
+                regressions.append(f"{where}: error rate {before['error_rate']:.2%} -> {now['error_rate']:.2%}")
+    return regressions
+
+def print_comparison(baseline, current, tolerance):
+    print(f"\n--- Compared to {baseline['meta'].get('commit') or 'baseline'} "
+          f"(tolerance {tolerance:.0%}) ---")
+    print(f"{'endpoint':<16} {'c':>4} {'rps':>18} {'p50 ms':>18} {'p99 ms':>18}")
+    for endpoint, levels in current["results"].items():
+        for level, now in levels.items():
+            before = baseline["results"].get(endpoint, {}).get(level)
+            if before is None:
+                continue
+            cells = [f"{before[k] or 0:>8.1f}->{now[k] or 0:<8.1f}"
+                     for k in ("throughput_rps", "p50_ms", "p99_ms")]
+            print(f"{endpoint:<16} {level:>4} " + " ".join(f"{c:>18}" for c in cells))
+
+    regressions = compare(baseline, current, tolerance)
+    if regressions:
+        print("\nREGRESSIONS:")
+        for line in regressions:
+            print("  " + line)
+    else:
+        print("\nNo regressions.")
+    return regressions
+
+# ------------------- Main -------------------
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_env(pairs):
+    env = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"--env expects KEY=VALUE, got {pair!r}")
+        env[key] = value
+    return env
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Latency / throughput benchmark for the CO inference API")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="benchmark the API and write a JSON report")
+    run.add_argument("--mode", choices=["asgi", "socket", "url"], default="asgi",
+                     help="asgi: in-process, no sockets; socket: uvicorn on 127.0.0.1; url: existing server")
+    run.add_argument("--url", default=None, help="server base URL for --mode url")
+    run.add_argument("--port", type=int, default=8765, help="local port for --mode socket")
+    run.add_argument("--endpoints", nargs="+", default=DEFAULT_ENDPOINTS)
+    run.add_argument("--levels", type=int, nargs="+", default=DEFAULT_LEVELS, help="concurrency levels")
+    run.add_argument("--duration", type=float, default=DURATION_SECONDS, help="measured seconds per level")
+    run.add_argument("--warmup", type=float, default=WARMUP_SECONDS, help="unmeasured seconds per level")
+    run.add_argument("--seed", type=int, default=0, help="payload RNG seed")
+    run.add_argument("--env", nargs="*", metavar="KEY=VALUE",
+                     help="server config overrides, e.g. CO_INFERENCE_BACKEND=tflite (asgi / socket)")
+    run.add_argument("--output", default="bench.json", help="JSON report path")
+    run.add_argument("--baseline", default=None, help="compare against this report afterwards")
+    run.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+
+    cmp = sub.add_parser("compare", help="compare two JSON reports")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    return parser.parse_args()
+
+def run(args):
+    env = parse_env(args.env)
+    kwargs = dict(endpoints=args.endpoints, levels=args.levels, duration=args.duration,
+                  warmup=args.warmup, seed=args.seed)
+
+    if args.mode == "asgi":
+        ready, results = asyncio.run(bench_asgi(env, **kwargs))
+    elif args.mode == "socket":
+        with LocalServer(env, args.port) as server:
+            ready, results = asyncio.run(bench_url(server.url, **kwargs))
+    else:
+        if not args.url:
+            raise SystemExit("--mode url needs --url")
+        ready, results = asyncio.run(bench_url(args.url, **kwargs))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "mode": args.mode,
+            "url": args.url,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "seed": args.seed,
+            # server config, only known when the app ran in this process
+            "env": {k: v for k, v in sorted(os.environ.items())
+                    if k.startswith("CO_") and args.mode != "url"},
+            "server": ready,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if print_comparison(baseline, report, args.tolerance):
+            sys.exit(1)
+
+def main():
+    args = parse_args()
+    if args.command == "run":
+        run(args)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if print_comparison(baseline, current, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import io
+
+import numpy as np
+
+
+# ------------------- Binary windows -------------------
+
+# Request bodies accepted by the binary endpoints:
+#   application/octet-stream  packed little-endian float32 rows, row-major
+#   application/x-npy         a .npy file holding a float32 (rows, columns) array
+# Column order is the model layout:
+#   classifier (4)  temperature, humidity, heaterVoltage, COppm
+#   regressor (18)  temperature, humidity, heaterVoltage, flowRate, R1..R14
+RAW_CONTENT_TYPE = "application/octet-stream"
+NPY_CONTENT_TYPE = "application/x-npy"
+
+FLOAT32_LE = np.dtype("<f4")
+
+
+class UnsupportedContentType(ValueError):
+    pass
+
+
+def _decode_raw(body, n_columns):
+    row_bytes = FLOAT32_LE.itemsize * n_columns
+    if len(body) == 0 or len(body) % row_bytes:
+        raise ValueError(f"Body must be a whole number of {n_columns}-column float32 rows "
+                         f"({row_bytes} bytes each), got {len(body)} bytes")
+    return np.frombuffer(body, dtype=FLOAT32_LE).reshape(-1, n_columns)
+
+
+def _decode_npy(body, n_columns):
+    header = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(header)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+        else:
+            raise ValueError(f"unsupported .npy version {version}")
+    except ValueError as e:
+        raise ValueError(f"Invalid .npy body: {e}")
+
+    if fortran_order:
+        raise ValueError(".npy array must be C-ordered")
+    if dtype != FLOAT32_LE:
+        raise ValueError(f".npy array must be little-endian float32, got {dtype}")
+    if len(shape) != 2 or shape[1] != n_columns:
+        raise ValueError(f".npy array must have shape (rows, {n_columns}), got {shape}")
+
+    offset = header.tell()
+    expected = offset + shape[0] * shape[1] * dtype.itemsize
+    if len(body) != expected:
+        raise ValueError(f".npy body is {len(body)} bytes, header implies {expected}")
+    return np.frombuffer(body, dtype=dtype, offset=offset).reshape(shape)
+
+
+# Decode a binary body into a read-only (rows, n_columns) float32 view of it.
+# n_rows, if given, is the exact number of rows required.
+def decode_window(body, content_type, n_columns, n_rows=None):
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type == RAW_CONTENT_TYPE:
+        window = _decode_raw(body, n_columns)
+    elif media_type == NPY_CONTENT_TYPE:
+        window = _decode_npy(body, n_columns)
+    else:
+        raise UnsupportedContentType(
+            f"Content-Type must be {RAW_CONTENT_TYPE} or {NPY_CONTENT_TYPE}, got '{media_type}'")
+
+    if n_rows is not None and window.shape[0] != n_rows:
+        raise ValueError(f"Expected {n_rows} rows of {n_columns} float32, got {window.shape[0]}")
+    if not np.isfinite(window).all():
+        raise ValueError("Window contains NaN or infinite values")
+    return window
+
+
+# Client-side helper: encode a (rows, columns) window as packed float32 rows
+def encode_window(window):
+    return np.ascontiguousarray(window, dtype=FLOAT32_LE).tobytes()
@@ -0,0 +1,39 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# ------------------- Bulk windowing -------------------
+
+# Number of windows produced by a (rows, columns) series
+def window_count(n_rows, window, stride):
+    if n_rows < window:
+        return 0
+    return (n_rows - window) // stride + 1
+
+
+# (n_windows, window, columns) strided view over a contiguous series, no copy
+def series_windows(series, window, stride=1):
+    if stride < 1:
+        raise ValueError("stride must be >= 1")
+    if series.ndim != 2:
+        raise ValueError(f"series must be (rows, columns), got shape {series.shape}")
+    if series.shape[0] < window:
+        raise ValueError(f"series has {series.shape[0]} rows, need at least {window}")
+    # sliding_window_view gives (rows - window + 1, 1, window, columns)
+    view = sliding_window_view(series, (window, series.shape[1]))[:, 0]
+    return view[::stride]
+
+
+# Run predict_fn over the windows chunk by chunk into one preallocated output.
+# Only one chunk of windows is materialised at a time, which bounds the input
+# tensor size regardless of how many windows the request covers.
+def predict_windows(predict_fn, windows, chunk_size=4096):
+    n = windows.shape[0]
+    output = None
+    for start in range(0, n, chunk_size):
+        chunk = np.ascontiguousarray(windows[start:start + chunk_size], dtype=np.float32)
+        result = np.asarray(predict_fn(chunk))
+        if output is None:
+            output = np.empty((n,) + result.shape[1:], dtype=result.dtype)
+        output[start:start + len(result)] = result
+    return output
@@ -0,0 +1,212 @@
+import os
+import queue
+
+import numpy as np
+
+
+# ------------------- Model files -------------------
+
+# name -> (keras file, tflite file, (time_steps, n_features))
+MODEL_FILES = {
+    "classifier": ("co_lstm_classifier_v1.h5", "co_lstm_classifier_v1.tflite", (10, 4)),
+    "regression": ("co_lstm_regression_v1.h5", "co_lstm_regression_v1.tflite", (30, 18)),
+}
+
+BACKENDS = ("keras", "tf_function", "tflite")
+
+# Max absolute output difference accepted between backends for the same input.
+# keras and tf_function run the same graph, so only float reordering differs.
+# TFLite uses its own LSTM kernels, so it gets a looser bound.
+PARITY_TOLERANCE = {
+    "keras": 1e-6,
+    "tf_function": 1e-5,
+    "tflite": 1e-4,
+}
+
+
+# ------------------- Backends -------------------
+
+# Every backend exposes predict(x) taking float32 (batch, time_steps, n_features)
+# and returning a numpy array of shape (batch, n_outputs).
+
+class KerasBackend:
+    """Plain Keras model.predict(), the original server behaviour."""
+
+    kind = "keras"
+
+    def __init__(self, model_path, input_shape):
+        import tensorflow as tf
+
+        self.model_path = model_path
+        self.input_shape = tuple(input_shape)
+        self.model = tf.keras.models.load_model(model_path, compile=False)
+
+    def predict(self, x):
+        return self.model.predict(x, verbose=0)
+
+
+class TFFunctionBackend:
+    """Keras model called through a tf.function traced once for a fixed signature.
+
+    Skips predict()'s per-call data adapter / callback setup, which dominates
+    for (1, 10, 4) and (1, 30, 18) inputs.
+    """
+
+    kind = "tf_function"
+
+    def __init__(self, model_path, input_shape):
+        import tensorflow as tf
+
+        self.model_path = model_path
+        self.input_shape = tuple(input_shape)
+        self.model = tf.keras.models.load_model(model_path, compile=False)
+
+        model = self.model
+        signature = [tf.TensorSpec(shape=(None,) + self.input_shape, dtype=tf.float32)]
+
+        @tf.function(input_signature=signature, reduce_retracing=True)
+        def serve(x):
+            return model(x, training=False)
+
+        self._serve = serve
+
+    def predict(self, x):
+        return self._serve(np.asarray(x, dtype=np.float32)).numpy()
+
+
+# Custom ops of the Select TF ops (Flex) delegate are stored by name in the
+# flatbuffer, e.g. FlexTensorListReserve in the default LSTM exports
+def needs_select_tf_ops(model_path):
+    with open(model_path, "rb") as f:
+        return b"Flex" in f.read()
+
+
+# tflite_runtime has no Flex delegate, so Flex models need tf.lite.Interpreter
+def _tflite_interpreter_class(select_tf_ops=False):
+    if not select_tf_ops:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+            return Interpreter
+        except ImportError:
+            pass
+    try:
+        import tensorflow as tf
+    except ImportError:
+        if select_tf_ops:
+            raise RuntimeError("this .tflite model uses Select TF ops (Flex), which tflite_runtime cannot run: "
+                               "install tensorflow, or export the builtin-only model "
+                               "(edgeAI/tflite_builtin.py, *_builtin.tflite)") from None
+        raise
+    return tf.lite.Interpreter
+
+
+# The builtin-only export (edgeAI/tflite_builtin.py) when it is next to the
+# default one: it runs on tflite_runtime and needs no Flex delegate
+def tflite_model_path(model_dir, tflite_file):
+    builtin = os.path.join(model_dir, os.path.splitext(tflite_file)[0] + "_builtin.tflite")
+    return builtin if os.path.exists(builtin) else os.path.join(model_dir, tflite_file)
+
+
+class TFLiteBackend:
+    """Pool of TFLite interpreters loaded from the exported co_lstm_*_v1 .tflite files.
+
+    An Interpreter is not thread safe, so each call checks one out of the pool.
+    Interpreters are resized lazily when the batch size changes; models exported
+    with a fixed batch (the *_builtin.tflite files) are invoked once per window.
+    """
+
+    kind = "tflite"
+
+    def __init__(self, model_path, input_shape, pool_size=2, num_threads=1):
+        self.select_tf_ops = needs_select_tf_ops(model_path)
+        Interpreter = _tflite_interpreter_class(self.select_tf_ops)
+
+        self.model_path = model_path
+        self.input_shape = tuple(input_shape)
+        self.pool_size = int(pool_size)
+
+        self._pool = queue.Queue()
+        for _ in range(self.pool_size):
+            interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+            interpreter.allocate_tensors()
+            details = interpreter.get_input_details()[0]
+            output_index = interpreter.get_output_details()[0]["index"]
+            batch = int(details["shape"][0])
+            self.fixed_batch = int(details.get("shape_signature", details["shape"])[0]) != -1
+            self._pool.put([interpreter, details["index"], output_index, batch])
+
+    def predict(self, x):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        slot = self._pool.get()
+        try:
+            interpreter, input_index, output_index, batch = slot
+            if self.fixed_batch and x.shape[0] != batch:
+                return np.concatenate([self._invoke(interpreter, input_index, output_index, x[i:i + batch])
+                                       for i in range(0, x.shape[0], batch)])
+            if batch != x.shape[0]:
+                interpreter.resize_tensor_input(input_index, list(x.shape), strict=False)
+                interpreter.allocate_tensors()
+                slot[3] = x.shape[0]
+            return self._invoke(interpreter, input_index, output_index, x)
+        finally:
+            self._pool.put(slot)
+
+    @staticmethod
+    def _invoke(interpreter, input_index, output_index, x):
+        interpreter.set_tensor(input_index, x)
+        interpreter.invoke()
+        return interpreter.get_tensor(output_index).copy()
+
+
+# ------------------- Factory -------------------
+
+# Import the heavy runtime a backend needs, so startup can time it on its own
+def import_runtime(kind):
+    if kind == "tflite":
+        return _tflite_interpreter_class()
+    import tensorflow as tf
+    return tf
+
+
+def load_backend(kind, model_name, model_dir=".", pool_size=2, num_threads=1):
+    if model_name not in MODEL_FILES:
+        raise ValueError(f"Unknown model '{model_name}', expected one of {list(MODEL_FILES)}")
+    keras_file, tflite_file, input_shape = MODEL_FILES[model_name]
+
+    if kind == "keras":
+        return KerasBackend(os.path.join(model_dir, keras_file), input_shape)
+    if kind == "tf_function":
+        return TFFunctionBackend(os.path.join(model_dir, keras_file), input_shape)
+    if kind == "tflite":
+        return TFLiteBackend(tflite_model_path(model_dir, tflite_file), input_shape,
+                             pool_size=pool_size, num_threads=num_threads)
+    raise ValueError(f"Unknown inference backend '{kind}', expected one of {BACKENDS}")
+
+
+# Max abs difference between two backends on random windows
+def compare_backends(reference, candidate, batch_sizes=(1, 8), seed=0):
+    rng = np.random.default_rng(seed)
+    worst = 0.0
+    for batch in batch_sizes:
+        x = rng.random((batch,) + reference.input_shape, dtype=np.float32)
+        diff = np.abs(np.asarray(reference.predict(x)) - np.asarray(candidate.predict(x)))
+        worst = max(worst, float(diff.max()))
+    return worst
+
+
+# ------------------- Parity check -------------------
+
+# python inference_backends.py  -> checks every backend against Keras
+if __name__ == "__main__":
+    for model_name in MODEL_FILES:
+        reference = load_backend("keras", model_name)
+        for kind in BACKENDS[1:]:
+            try:
+                candidate = load_backend(kind, model_name)
+            except (OSError, ValueError, ImportError, RuntimeError) as e:
+                print(f"{model_name:<10} {kind:<12} skipped: {e}")
+                continue
+            worst = compare_backends(reference, candidate)
+            status = "OK" if worst <= PARITY_TOLERANCE[kind] else "FAIL"
+            print(f"{model_name:<10} {kind:<12} max|diff|={worst:.2e} "
+                  f"(tol {PARITY_TOLERANCE[kind]:.0e}) {status}")
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from batcher import MicroBatcher
+from inference_backends import MODEL_FILES, import_runtime, load_backend
+from prediction_cache import CachedPredictor
+from worker_pool import PooledBackend, WorkerPool
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class ModelServer:
+    """Loads and warms both models off the request path.
+
+    start() returns immediately; a background thread imports the runtime,
+    loads the classifier and regressor, runs warm-up batches at every size in
+    warmup_batch_sizes (so graph tracing / tensor allocation happens before
+    the first real request) and only then marks the server ready.
+
+    clf_predictor / reg_predictor are what single-window requests go through:
+    the micro-batcher, behind a PredictionCache when one is given.
+
+    With workers > 0 the models live in that many worker processes instead
+    (see worker_pool.py) and this process never imports TensorFlow.
+    """
+
+    def __init__(self, backend="keras", pool_size=2, batch_max_size=32,
+                 batch_max_wait_ms=5.0, warmup_batch_sizes=(1,), clf_cache=None, reg_cache=None,
+                 workers=0, threads_per_worker=1, pin_workers=False, on_batch=None):
+        self.backend = backend
+        self.pool_size = pool_size
+        self.batch_max_size = batch_max_size
+        self.batch_max_wait_ms = batch_max_wait_ms
+        self.warmup_batch_sizes = tuple(sorted(set(warmup_batch_sizes)))
+        self.workers = int(workers)
+        self.threads_per_worker = int(threads_per_worker)
+        self.pin_workers = pin_workers
+        self.on_batch = on_batch    # on_batch(model_name, size, seconds)
+        self.pool = None
+
+        self.clf_model = None
+        self.reg_model = None
+        self.clf_batcher = None
+        self.reg_batcher = None
+        self.clf_cache = clf_cache
+        self.reg_cache = reg_cache
+        self.clf_predictor = None
+        self.reg_predictor = None
+
+        self.phase = "starting"
+        self.error = None
+        self.timings = {}
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    @property
+    def failed(self):
+        return self.phase == "failed"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+        self._thread.start()
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def _timed(self, phase, fn):
+        self.phase = phase
+        start = time.perf_counter()
+        result = fn()
+        self.timings[phase] = round(time.perf_counter() - start, 3)
+        return result
+
+    def _warm_up(self):
+        for model_name, model in (("classifier", self.clf_model), ("regression", self.reg_model)):
+            input_shape = MODEL_FILES[model_name][2]
+            for batch in self.warmup_batch_sizes:
+                model.predict(np.zeros((batch,) + input_shape, dtype=np.float32))
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            if self.workers:
+                # Runtime imports happen inside the workers, timed as model_load
+                self.timings["imports"] = 0.0
+            else:
+                self._timed("imports", lambda: import_runtime(self.backend))
+            self._timed("model_load", self._load_models)
+            self._timed("warmup", self._warm_up)
+        except Exception as e:
+            self.error = repr(e)
+            self.phase = "failed"
+            logger.exception("Model startup failed")
+            return
+
+        self.clf_batcher = MicroBatcher(
+            self.clf_model.predict,
+            max_batch_size=self.batch_max_size,
+            max_wait_ms=self.batch_max_wait_ms,
+            name="classify-batcher",
+            concurrency=max(self.workers, 1),
+            on_batch=self._batch_observer("classifier"),
+        )
+        self.reg_batcher = MicroBatcher(
+            self.reg_model.predict,
+            max_batch_size=self.batch_max_size,
+            max_wait_ms=self.batch_max_wait_ms,
+            name="predict-ppm-batcher",
+            concurrency=max(self.workers, 1),
+            on_batch=self._batch_observer("regression"),
+        )
+        self.clf_predictor = self._with_cache(self.clf_batcher, self.clf_cache)
+        self.reg_predictor = self._with_cache(self.reg_batcher, self.reg_cache)
+        self.timings["total"] = round(time.perf_counter() - start, 3)
+        self.phase = "ready"
+        self._ready.set()
+        logger.info(
+            "Models ready (%s backend): imports %.2fs, model load %.2fs, warm-up %.2fs "
+            "(batch sizes %s), total %.2fs",
+            self.backend, self.timings["imports"], self.timings["model_load"],
+            self.timings["warmup"], list(self.warmup_batch_sizes), self.timings["total"],
+        )
+
+    def _batch_observer(self, model_name):
+        if self.on_batch is None:
+            return None
+        return lambda size, seconds: self.on_batch(model_name, size, seconds)
+
+    @staticmethod
+    def _with_cache(batcher, cache):
+        return batcher if cache is None else CachedPredictor(batcher, cache)
+
+    def _load_models(self):
+        if self.workers:
+            self.pool = WorkerPool(
+                self.backend, self.workers, self.threads_per_worker, pin=self.pin_workers,
+                warmup_batch_sizes=self.warmup_batch_sizes,
+            )
+            self.clf_model = PooledBackend(self.pool, "classifier")
+            self.reg_model = PooledBackend(self.pool, "regression")
+            return
+        self.clf_model = load_backend(self.backend, "classifier", pool_size=self.pool_size)
+        self.reg_model = load_backend(self.backend, "regression", pool_size=self.pool_size)
+
+    def close(self):
+        for batcher in (self.clf_batcher, self.reg_batcher):
+            if batcher is not None:
+                batcher.close()
+        if self.pool is not None:
+            self.pool.close()
+
+    def status(self):
+        return {
+            "phase": self.phase,
+            "backend": self.backend,
+            "workers": self.workers,
+            "workers_ready": self.pool.ready_workers if self.pool is not None else None,
+            "startup_seconds": dict(self.timings),
+            "warmup_batch_sizes": list(self.warmup_batch_sizes),
+            "error": self.error,
+        }
@@ -0,0 +1,146 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+
+# ------------------- Feature names -------------------
+
+CLASSIFY_FEATURES = ["temperature", "humidity", "heaterVoltage", "COppm"]
+REGRESSION_FEATURES = ["temperature", "humidity", "heaterVoltage", "flowRate"] + \
+    [f"R{i}" for i in range(1, 15)]
+
+
+# "temperature=0.1,humidity=0.5,sensorResistances=0.001" -> per-column array.
+# Columns not named get resolution 0, meaning their exact float32 bits are
+# hashed, so nothing (in particular COppm) is coarsened unless asked for.
+def parse_resolutions(spec, feature_names):
+    resolutions = np.zeros(len(feature_names), dtype=np.float64)
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name == "sensorResistances" and "R1" in feature_names:
+            names = [f"R{i}" for i in range(1, 15)]
+        elif name in feature_names:
+            names = [name]
+        else:
+            raise ValueError(f"Unknown cache feature '{name}', expected one of {feature_names}")
+        resolution = float(value)
+        if resolution < 0:
+            raise ValueError(f"Cache resolution for '{name}' must be >= 0")
+        for n in names:
+            resolutions[feature_names.index(n)] = resolution
+    return resolutions
+
+
+# ------------------- Cache -------------------
+
+class PredictionCache:
+    """Bounded LRU + TTL cache keyed by a hash of the quantized input window.
+
+    Each column is rounded to a multiple of its resolution before hashing, so
+    windows that differ by less than the resolution share a cache entry.
+    """
+
+    def __init__(self, resolutions, max_entries=10000, ttl_seconds=300.0, clock=time.monotonic):
+        self.resolutions = np.asarray(resolutions, dtype=np.float64)
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = float(ttl_seconds)
+        self.clock = clock
+
+        self._quantized = self.resolutions > 0
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, window):
+        window = np.asarray(window, dtype=np.float32)
+        if window.shape[-1] != len(self.resolutions):
+            raise ValueError(f"Window has {window.shape[-1]} columns, cache expects {len(self.resolutions)}")
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(window.shape).encode())
+        if self._quantized.any():
+            steps = self.resolutions[self._quantized]
+            quantized = np.rint(window[:, self._quantized] / steps).astype(np.int64)
+            digest.update(np.ascontiguousarray(quantized).tobytes())
+        if not self._quantized.all():
+            digest.update(np.ascontiguousarray(window[:, ~self._quantized]).tobytes())
+        return digest.digest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "resolutions": self.resolutions.tolist(),
+            }
+
+
+class CachedPredictor:
+    """Puts a PredictionCache in front of a MicroBatcher (same submit/predict API)."""
+
+    def __init__(self, batcher, cache):
+        self.batcher = batcher
+        self.cache = cache
+
+    def submit(self, window, priority=False):
+        key = self.cache.key(window)
+        value = self.cache.get(key)
+        if value is not None:
+            future = Future()
+            future.set_result(value)
+            return future
+
+        future = self.batcher.submit(window, priority)
+
+        def store(done):
+            if not done.cancelled() and done.exception() is None:
+                self.cache.put(key, done.result())
+
+        future.add_done_callback(store)
+        return future
+
+    def predict(self, window, timeout=None, priority=False):
+        return self.submit(window, priority).result(timeout=timeout)
+
+    def stats(self):
+        return self.batcher.stats()
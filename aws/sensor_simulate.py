@@ -1,69 +1,377 @@
-import csv
+import argparse
+import asyncio
+import json
+import os
+import sys
 import time
-import requests
-import threading
+from collections import defaultdict
 
-# Replace with server endpoint
+import httpx
+import numpy as np
+
+from streaming import CLASSIFY_COLUMNS, REGRESSION_COLUMNS, DeviceStream
+
+# Shared columnar CSV loader from the training scripts (edgeAI/sensor_dataset.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "edgeAI"))
+from sensor_dataset import load_sensor_csv  # noqa: E402
+
+# Replace with server endpoint (or pass --url, e.g. http://127.0.0.1:8000)
 API_URL = "http://ec2-AA-BBB-AAA-X.us-west-1.compute.amazonaws.com:8000"
+CSV_FILE = "20161001_231809.csv"
 
 CLASSIFY_BUFFER_SIZE = 10
 PREDICT_BUFFER_SIZE = 30
-SEND_INTERVAL_SECONDS = 10  # Send data every 10 seconds
-
-classify_buffer = []
-predict_buffer = []
-
-def row_to_sensor_event(row):
-    return {
-        "temperature": float(row["Temperature (C)"]),
-        "humidity": float(row["Humidity (%r.h.)"]),
-        "flowRate": float(row["Flow rate (mL/min)"]),
-        "heaterVoltage": float(row["Heater voltage (V)"]),
-        "sensorResistances": [float(row[f"R{i} (MOhm)"]) for i in range(1, 15)],
-        "COppm": float(row["CO (ppm)"]),
-    }
-
-def test_classify(samples):
-    start_time = time.time()
-    response = requests.post(f"{API_URL}/classify", json=samples)
-    end_time = time.time()
-    print("\n--- Classification Response ---")
-    print("Status Code:", response.status_code)
-    print("Latency (seconds):", round(end_time - start_time, 4))
-    print("Raw Response:", response.text)
-
-def test_predict_ppm(samples):
-    start_time = time.time()
-    response = requests.post(f"{API_URL}/predict_ppm", json=samples)
-    end_time = time.time()
-    print("\n--- Regression Response ---")
-    print("Status Code:", response.status_code)
-    print("Latency (seconds):", round(end_time - start_time, 4))
-    print("Raw Response:", response.text)
-
-def process_row(row):
-    global classify_buffer, predict_buffer
-    event = row_to_sensor_event(row)
-
-    classify_buffer.append(event)
-    predict_buffer.append(event)
-
-    if len(classify_buffer) == CLASSIFY_BUFFER_SIZE:
-        samples = classify_buffer.copy()
-        classify_buffer.clear()
-        threading.Thread(target=test_classify, args=(samples,)).start()
-
-    if len(predict_buffer) == PREDICT_BUFFER_SIZE:
-        samples = predict_buffer.copy()
-        predict_buffer.clear()
-        threading.Thread(target=test_predict_ppm, args=(samples,)).start()
+SEND_INTERVAL_SECONDS = 10  # Gap between events when a CSV has no "Time (s)" column
+
+# Push one event at a time over the /stream WebSocket instead of buffering
+# 10 / 30 event windows client-side. STREAM_WINDOW_MODE is tumbling or sliding.
+STREAM_MODE = False
+STREAM_DEVICE_ID = "simulator-1"
+STREAM_WINDOW_MODE = "tumbling"
+
+# Window emission: tumbling (one request per 10 / 30 new events, the original
+# behaviour) or sliding every WINDOW_STRIDE events over a shared ring buffer
+WINDOW_STRIDE = None
+
+# Stream row layout (see streaming.py, same as sensor_dataset.SENSOR_COLUMNS) -> SensorEvent JSON
+def rows_to_events(rows):
+    return [
+        {
+            "temperature": r[0],
+            "humidity": r[1],
+            "heaterVoltage": r[2],
+            "flowRate": r[3],
+            "sensorResistances": r[4:18],
+            "COppm": r[18],
+        }
+        for r in rows.tolist()
+    ]
+
+# ------------------- Recordings -------------------
+
+class Recording:
+    """Events from one CSV plus the recorded gap (seconds) before each event.
+
+    Gaps come from the "Time (s)" column when present; otherwise, or when
+    interval is given, every gap is `interval`. The gap before event 0 (used
+    when a device wraps around) is the median gap.
+
+    The CSV is parsed column-wise once and cached as .npy next to it, so
+    later runs (and every device sharing it) memory-map the same matrix.
+    """
+
+    def __init__(self, csv_file, interval=None, cache=True):
+        self.name = csv_file
+        data = load_sensor_csv(csv_file, cache=cache)
+        # (events, 19) float32 in the stream row layout
+        self.rows = data.matrix
+
+        if interval is None and data.time is not None and len(data):
+            times = np.asarray(data.time)
+            gaps = np.diff(times, prepend=times[0])
+            gaps[0] = float(np.median(gaps[1:])) if len(gaps) > 1 else 0.0
+            self.gaps = np.clip(gaps, 0.0, None)
+        else:
+            gap = SEND_INTERVAL_SECONDS if interval is None else interval
+            self.gaps = np.full(len(self.rows), float(gap))
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def duration(self):
+        return float(self.gaps[1:].sum())
+
+# ------------------- Latency report -------------------
+
+class LatencyReport:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, endpoint, seconds, status=None, error=None):
+        self.latencies[endpoint].append(seconds)
+        if error is not None:
+            self.errors[endpoint][error] += 1
+        else:
+            self.statuses[endpoint][status] += 1
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        result = {"elapsed_seconds": round(elapsed, 3), "endpoints": {}}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            ms = np.array(latencies) * 1000.0
+            ok = sum(n for status, n in self.statuses[endpoint].items() if 200 <= status < 300)
+            failed = len(latencies) - ok
+            result["endpoints"][endpoint] = {
+                "requests": len(latencies),
+                "ok": ok,
+                "error_rate": round(failed / len(latencies), 4),
+                "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": round(float(np.percentile(ms, 50)), 2),
+                "p90_ms": round(float(np.percentile(ms, 90)), 2),
+                "p99_ms": round(float(np.percentile(ms, 99)), 2),
+                "max_ms": round(float(ms.max()), 2),
+                "status_codes": {str(s): n for s, n in sorted(self.statuses[endpoint].items())},
+                "transport_errors": dict(self.errors[endpoint]),
+            }
+        return result
+
+    def print(self):
+        summary = self.summary()
+        print(f"\n--- Latency Report ({summary['elapsed_seconds']:.1f} s) ---")
+        print(f"{'endpoint':<14} {'requests':>8} {'rps':>8} {'p50 ms':>8} {'p90 ms':>8} "
+              f"{'p99 ms':>8} {'errors':>7}")
+        for endpoint, s in summary["endpoints"].items():
+            print(f"{endpoint:<14} {s['requests']:>8} {s['throughput_rps']:>8.1f} {s['p50_ms']:>8.1f} "
+                  f"{s['p90_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['error_rate']:>7.2%}")
+            if s["transport_errors"] or len(s["status_codes"]) > 1:
+                print(f"{'':<14} status {s['status_codes']} transport {s['transport_errors']}")
+
+# ------------------- Load generator -------------------
+
+# Spaces request starts to hit a target rate across all devices (0 = unlimited)
+class RatePacer:
+    def __init__(self, rps):
+        self.interval = 1.0 / rps if rps else 0.0
+        self._next = time.monotonic()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(self._next, now)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class LoadGenerator:
+    """Shared keep-alive HTTP session plus rate and concurrency limits.
+
+    Each send is a task, so devices never wait for their own responses
+    (open loop); max_concurrency bounds requests actually on the wire and
+    devices pause once 4x that many requests are outstanding.
+    """
+
+    def __init__(self, client, report, rps=0.0, max_concurrency=64, verbose=False):
+        self.client = client
+        self.report = report
+        self.pacer = RatePacer(rps)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.verbose = verbose
+        self._outstanding = asyncio.Semaphore(4 * max_concurrency)
+        self._tasks = set()
+
+    async def _post(self, endpoint, payload):
+        await self.pacer.wait()
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self.client.post(endpoint, **payload)
+            except httpx.HTTPError as e:
+                self.report.record(endpoint, time.perf_counter() - start, error=type(e).__name__)
+                return
+            self.report.record(endpoint, time.perf_counter() - start, status=response.status_code)
+            if self.verbose:
+                print(f"{endpoint} {response.status_code} {response.text}")
+
+    # payload: keyword arguments for client.post (json=... or content=..., headers=...)
+    async def send(self, endpoint, payload):
+        await self._outstanding.acquire()
+        task = asyncio.create_task(self._post(endpoint, payload))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self._tasks.discard(task)
+        self._outstanding.release()
+
+    async def drain(self):
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+class VirtualDevice:
+    """One replayed sensor: an asyncio task, not a thread.
+
+    Event i is sent at start_delay + (recorded time since the device's first
+    event) / speed, scheduled against the loop clock so that slow sends do
+    not accumulate drift. speed=0 replays as fast as possible.
+
+    Both windows are read from one preallocated ring buffer of the last 30
+    events; stride=None sends tumbling windows, stride=k a window every k
+    events once full. binary=True posts packed float32 to the _bin endpoints.
+    """
+
+    def __init__(self, device_id, recording, start_index=0, start_delay=0.0, speed=1.0,
+                 stride=None, binary=False):
+        self.device_id = device_id
+        self.recording = recording
+        self.start_index = start_index
+        self.start_delay = start_delay
+        self.speed = speed
+        self.binary = binary
+        self.stream = DeviceStream(stride)
+
+    def _payload(self, rows, columns):
+        if self.binary:
+            return {"content": np.ascontiguousarray(rows[:, columns]).tobytes(),
+                    "headers": {"Content-Type": "application/octet-stream"}}
+        return {"json": rows_to_events(rows)}
+
+    # Payloads are encoded immediately, before the next push reuses the slots
+    async def process_row(self, row, generator):
+        self.stream.push(row)
+        suffix = "_bin" if self.binary else ""
+
+        if self.stream.due(CLASSIFY_BUFFER_SIZE):
+            rows = self.stream.buffer.latest(CLASSIFY_BUFFER_SIZE)
+            await generator.send("/classify" + suffix, self._payload(rows, CLASSIFY_COLUMNS))
+
+        if self.stream.due(PREDICT_BUFFER_SIZE):
+            rows = self.stream.buffer.latest(PREDICT_BUFFER_SIZE)
+            await generator.send("/predict_ppm" + suffix, self._payload(rows, REGRESSION_COLUMNS))
+
+    async def run(self, generator, n_events):
+        loop = asyncio.get_running_loop()
+        start = loop.time() + (self.start_delay / self.speed if self.speed else 0.0)
+        rows, gaps = self.recording.rows, self.recording.gaps
+        recorded = 0.0
+
+        for i in range(n_events):
+            index = (self.start_index + i) % len(rows)
+            if i:
+                recorded += gaps[index]
+            if self.speed:
+                delay = start + recorded / self.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self.process_row(rows[index], generator)
+
+# Build the fleet: devices take the recordings round-robin, start at different
+# rows (so devices sharing a CSV do not send identical windows) and are
+# staggered by `stagger` recorded seconds each.
+def build_fleet(recordings, devices, speed=1.0, stagger=0.0, stride=None, binary=False):
+    per_recording = -(-devices // len(recordings))
+    fleet = []
+    for d in range(devices):
+        recording = recordings[d % len(recordings)]
+        slot = d // len(recordings)
+        start_index = slot * max(len(recording) // per_recording, 1)
+        fleet.append(VirtualDevice(f"device-{d}", recording, start_index=start_index,
+                                   start_delay=d * stagger, speed=speed, stride=stride,
+                                   binary=binary))
+    return fleet
+
+async def run_load(url, recordings, devices=1, events_per_device=None, rps=0.0, max_concurrency=64,
+                   speed=1.0, stagger=0.0, stride=None, binary=False, verbose=False):
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    report = LatencyReport()
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+        generator = LoadGenerator(client, report, rps=rps, max_concurrency=max_concurrency, verbose=verbose)
+        fleet = build_fleet(recordings, devices, speed=speed, stagger=stagger, stride=stride, binary=binary)
+        await asyncio.gather(*(
+            device.run(generator, events_per_device or len(device.recording)) for device in fleet
+        ))
+        await generator.drain()
+    report.finish()
+    return report
+
+# ------------------- Streaming -------------------
+
+# Replays a Recording over the WebSocket with the same timing as the HTTP
+# devices: recorded (or --interval) gaps scaled by speed, 0 = no waiting
+async def stream_rows(recording, speed=1.0, device_id=STREAM_DEVICE_ID, mode=STREAM_WINDOW_MODE, url=API_URL):
+    import websockets
+
+    loop = asyncio.get_running_loop()
+
+    ws_url = url.replace("http", "ws", 1) + f"/stream/{device_id}?mode={mode}"
+    async with websockets.connect(ws_url) as ws:
+        async def print_results():
+            async for message in ws:
+                print("\n--- Stream Response ---")
+                print("Raw Response:", message)
+
+        reader_task = asyncio.create_task(print_results())
+        start, recorded = loop.time(), 0.0
+        try:
+            for i, event in enumerate(rows_to_events(recording.rows)):
+                if i:
+                    recorded += recording.gaps[i]
+                if speed:
+                    delay = start + recorded / speed - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                await ws.send(json.dumps(event))
+        finally:
+            reader_task.cancel()
+
+# ------------------- Main -------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay sensor CSV data against the CO inference API")
+    parser.add_argument("--url", default=API_URL, help="server base URL, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--csv", nargs="+", default=[CSV_FILE],
+                        help="one or more recordings, assigned to devices round-robin")
+    parser.add_argument("--devices", type=int, default=1, help="virtual devices")
+    parser.add_argument("--events", type=int, default=None, help="events per device (default: whole CSV)")
+    parser.add_argument("--rps", type=float, default=0.0, help="target requests/s overall (0 = unlimited)")
+    parser.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed: 1 = real time, N = Nx faster, 0 = as fast as possible")
+    parser.add_argument("--stagger", type=float, default=0.0,
+                        help="recorded seconds between successive device start times")
+    parser.add_argument("--interval", type=float, default=None,
+                        help="fixed seconds between events, ignoring the recorded Time (s) column")
+    parser.add_argument("--stride", type=int, default=WINDOW_STRIDE,
+                        help="send a sliding window every N events (default: tumbling windows)")
+    parser.add_argument("--binary", action="store_true",
+                        help="post packed float32 windows to /classify_bin and /predict_ppm_bin")
+    parser.add_argument("--report-json", default=None, help="also write the latency report here")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="re-parse the CSVs instead of using / writing the .npy cache")
+    parser.add_argument("--verbose", action="store_true", help="print every response")
+    parser.add_argument("--stream", action="store_true", default=STREAM_MODE,
+                        help="push events over the /stream WebSocket instead")
+    return parser.parse_args()
 
 def main():
-    with open("20161001_231809.csv", "r") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            process_row(row)
-            time.sleep(SEND_INTERVAL_SECONDS)
+    args = parse_args()
+
+    if args.stream:
+        recording = Recording(args.csv[0], interval=args.interval, cache=not args.no_cache)
+        asyncio.run(stream_rows(recording, speed=args.speed, url=args.url))
+        return
+
+    recordings = [Recording(csv_file, interval=args.interval, cache=not args.no_cache)
+                  for csv_file in args.csv]
+    for recording in recordings:
+        replay = recording.duration / args.speed if args.speed else 0.0
+        print(f"{recording.name}: {len(recording)} events, {recording.duration:.0f} s recorded, "
+              f"~{replay:.0f} s to replay at speed {args.speed:g}")
+
+    report = asyncio.run(run_load(
+        args.url, recordings,
+        devices=args.devices,
+        events_per_device=args.events,
+        rps=args.rps,
+        max_concurrency=args.concurrency,
+        speed=args.speed,
+        stagger=args.stagger,
+        stride=args.stride,
+        binary=args.binary,
+        verbose=args.verbose,
+    ))
+    report.print()
+    if args.report_json:
+        with open(args.report_json, "w") as f:
+            json.dump(report.summary(), f, indent=2)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+# ------------------- Stream layout -------------------
+
+# One row per pushed event, holding every column either model needs:
+#   0 temperature, 1 humidity, 2 heaterVoltage, 3 flowRate,
+#   4..17 sensorResistances R1..R14, 18 COppm
+STREAM_COLUMNS = 19
+CLASSIFY_COLUMNS = np.array([0, 1, 2, 18])   # (10, 4) classifier layout
+REGRESSION_COLUMNS = slice(0, 18)            # (30, 18) regressor layout
+
+CLASSIFY_WINDOW = 10
+PREDICT_WINDOW = 30
+
+
+# ------------------- Ring buffer -------------------
+
+class WindowRingBuffer:
+    """Fixed-size ring buffer whose latest window is always a contiguous view.
+
+    Every row is written twice, at i and i + capacity, into a (2 * capacity)
+    array, so the last n rows are buf[head - n:head] with no wrap-around copy.
+    """
+
+    def __init__(self, capacity, n_columns, dtype=np.float32):
+        self.capacity = int(capacity)
+        self._buf = np.zeros((2 * self.capacity, n_columns), dtype=dtype)
+        self._pos = 0       # next write slot in [0, capacity)
+        self.count = 0      # total rows ever pushed
+
+    def push(self, row):
+        self._buf[self._pos] = row
+        self._buf[self._pos + self.capacity] = row
+        self._pos = (self._pos + 1) % self.capacity
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    # View of the last n rows in arrival order (oldest first)
+    def latest(self, n):
+        if n > len(self):
+            raise ValueError(f"Only {len(self)} rows buffered, {n} requested")
+        end = self._pos + self.capacity
+        return self._buf[end - n:end]
+
+
+# ------------------- Per-device state -------------------
+
+class DeviceStream:
+    """Ring buffer plus emission schedule for one streaming device.
+
+    stride=None is tumbling mode (emit once per full, non-overlapping window);
+    stride=k emits every k events once the window is full (stride=1 is
+    sliding mode, one result per event).
+    """
+
+    def __init__(self, stride=None):
+        self.stride = stride
+        self.buffer = WindowRingBuffer(PREDICT_WINDOW, STREAM_COLUMNS)
+        self.owner = None   # the connection currently feeding this device
+
+    # True when a `window`-row window should be emitted after the latest push
+    def due(self, window):
+        count = self.buffer.count
+        if count < window:
+            return False
+        step = self.stride or window
+        return (count - window) % step == 0
+
+    def push(self, row):
+        self.buffer.push(row)
+
+    def classify_window(self):
+        if not self.due(CLASSIFY_WINDOW):
+            return None
+        return self.buffer.latest(CLASSIFY_WINDOW)[:, CLASSIFY_COLUMNS]
+
+    def regression_window(self):
+        if not self.due(PREDICT_WINDOW):
+            return None
+        return self.buffer.latest(PREDICT_WINDOW)[:, REGRESSION_COLUMNS]
+
+
+class DeviceRegistry:
+    """device_id -> DeviceStream, LRU-bounded so stale, disconnected devices are dropped.
+
+    Buffers survive reconnects, so a device resumes its window where it left off.
+    Each stream has one owner: a second connection for the same device_id
+    takes the stream over, and the older connection should stop pushing.
+    """
+
+    def __init__(self, max_devices=10000):
+        self.max_devices = int(max_devices)
+        self._streams = OrderedDict()
+
+    def get(self, device_id, stride=None, owner=None):
+        stream = self._streams.get(device_id)
+        if stream is None or stream.stride != stride:
+            if stream is not None:
+                stream.owner = None
+            stream = DeviceStream(stride)
+            self._streams[device_id] = stream
+        stream.owner = owner
+        self._streams.move_to_end(device_id)
+        self._evict(keep=device_id)
+        return stream
+
+    # Connection closed: its device may now be evicted (if nobody took it over)
+    def release(self, device_id, owner):
+        stream = self._streams.get(device_id)
+        if stream is not None and stream.owner is owner:
+            stream.owner = None
+
+    # Least recently used devices with no open connection go first; devices
+    # still being fed are never dropped, so the registry may exceed
+    # max_devices while more than that many connections are open. `keep` (the
+    # device just handed out) is never dropped, owner or not.
+    def _evict(self, keep):
+        excess = len(self._streams) - self.max_devices
+        if excess <= 0:
+            return
+        idle = [d for d, s in self._streams.items() if s.owner is None and d != keep][:excess]
+        for device_id in idle:
+            del self._streams[device_id]
+
+    def __len__(self):
+        return len(self._streams)
+
+
+def event_to_row(event):
+    row = np.empty(STREAM_COLUMNS, dtype=np.float32)
+    row[0] = event.temperature
+    row[1] = event.humidity
+    row[2] = event.heaterVoltage
+    row[3] = event.flowRate
+    row[4:18] = event.sensorResistances
+    row[18] = event.COppm
+    return row
@@ -0,0 +1,58 @@
+import pytest
+
+from admission import AdmissionController, Overloaded
+
+
+def rejection(controller, group, high_priority=False):
+    with pytest.raises(Overloaded) as info:
+        controller.acquire(group, high_priority)
+    return info.value
+
+
+def test_group_limit_is_429_and_leaves_other_groups_alone():
+    controller = AdmissionController(max_pending=10, shed_threshold=10, limits={"bulk": 1}, retry_after=2)
+    controller.acquire("bulk")
+
+    overloaded = rejection(controller, "bulk")
+    assert (overloaded.status_code, overloaded.reason, overloaded.retry_after) == (429, "concurrency_limit", 2)
+
+    controller.acquire("classify")
+    assert controller.stats()["in_flight"] == {"bulk": 1, "classify": 1}
+
+
+def test_shed_threshold_is_503_for_normal_requests_only():
+    controller = AdmissionController(max_pending=3, shed_threshold=2)
+    controller.acquire("predict")
+    controller.acquire("predict")
+
+    overloaded = rejection(controller, "predict")
+    assert (overloaded.status_code, overloaded.reason) == (503, "shed")
+
+    # danger windows skip shedding
+    controller.acquire("classify", high_priority=True)
+    assert controller.pending == 3
+
+
+def test_max_pending_is_503_even_for_high_priority():
+    controller = AdmissionController(max_pending=2, shed_threshold=2, limits={"classify": 1})
+    controller.acquire("classify", high_priority=True)
+    controller.acquire("classify", high_priority=True)   # past the group limit too
+
+    overloaded = rejection(controller, "classify", high_priority=True)
+    assert (overloaded.status_code, overloaded.reason) == (503, "queue_full")
+
+
+def test_admit_releases_on_error_and_counts_rejections():
+    controller = AdmissionController(max_pending=4, shed_threshold=4, limits={"bulk": 1})
+    with pytest.raises(KeyError):
+        with controller.admit("bulk"):
+            raise KeyError("boom")
+    assert controller.pending == 0
+
+    with controller.admit("bulk"):
+        rejection(controller, "bulk")
+        rejection(controller, "bulk")
+    stats = controller.stats()
+    assert stats["pending"] == 0
+    assert stats["in_flight"] == {"bulk": 0}
+    assert stats["rejected"] == {"bulk:concurrency_limit": 2}
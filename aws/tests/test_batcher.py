@@ -0,0 +1,120 @@
+import threading
+
+import numpy as np
+import pytest
+
+from batcher import MicroBatcher
+
+
+def window(value):
+    return np.full((3, 2), value, dtype=np.float32)
+
+
+# Model stand-in: records each batch (as the first value of every window) and
+# returns those values, optionally blocking until `gate` is set
+class RecordingModel:
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.batches = []
+        self.started = threading.Event()
+
+    def __call__(self, inputs):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        values = inputs[:, 0, 0]
+        self.batches.append(values.tolist())
+        return values
+
+
+def test_concurrent_windows_share_one_model_call():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=1000)
+    try:
+        futures = [batcher.submit(window(i)) for i in range(4)]
+        assert [f.result(timeout=5) for f in futures] == [0, 1, 2, 3]
+    finally:
+        batcher.close()
+
+    assert model.batches == [[0, 1, 2, 3]]
+    stats = batcher.stats()
+    assert stats["batches"] == 1
+    assert stats["full_batches"] == 1
+    assert stats["size_histogram"] == {"4": 1}
+
+
+def test_batch_is_capped_at_max_batch_size():
+    gate = threading.Event()
+    model = RecordingModel(gate)
+    batcher = MicroBatcher(model, max_batch_size=2, max_wait_ms=0)
+    try:
+        first = batcher.submit(window(0))
+        assert model.started.wait(5)
+        futures = [batcher.submit(window(i)) for i in range(1, 6)]
+        gate.set()
+        first.result(timeout=5)
+        assert [f.result(timeout=5) for f in futures] == [1, 2, 3, 4, 5]
+    finally:
+        batcher.close()
+
+    assert model.batches == [[0], [1, 2], [3, 4], [5]]
+
+
+def test_priority_windows_go_first_in_arrival_order():
+    gate = threading.Event()
+    model = RecordingModel(gate)
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=0)
+    try:
+        # Hold the model busy so everything below queues up behind it
+        busy = batcher.submit(window(0))
+        assert model.started.wait(5)
+        futures = [
+            batcher.submit(window(1)),
+            batcher.submit(window(2)),
+            batcher.submit(window(10), priority=True),
+            batcher.submit(window(3)),
+            batcher.submit(window(11), priority=True),
+            batcher.submit(window(12), priority=True),
+        ]
+        gate.set()
+        busy.result(timeout=5)
+        for f in futures:
+            f.result(timeout=5)
+    finally:
+        batcher.close()
+
+    assert model.batches == [[0], [10, 11, 12, 1, 2, 3]]
+
+
+def test_failed_batch_fails_its_futures_and_the_batcher_keeps_serving():
+    calls = []
+
+    def flaky(inputs):
+        calls.append(len(inputs))
+        if len(calls) == 1:
+            raise RuntimeError("backend down")
+        return inputs[:, 0, 0]
+
+    batcher = MicroBatcher(flaky, max_batch_size=4, max_wait_ms=0)
+    try:
+        with pytest.raises(RuntimeError, match="backend down"):
+            batcher.predict(window(1), timeout=5)
+        assert batcher.predict(window(2), timeout=5) == 2
+    finally:
+        batcher.close()
+
+
+def test_wrong_number_of_output_rows_fails_the_batch():
+    batcher = MicroBatcher(lambda inputs: np.zeros(len(inputs) + 1), max_batch_size=4, max_wait_ms=0)
+    try:
+        with pytest.raises(ValueError, match="rows for a batch of"):
+            batcher.predict(window(1), timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_submit_after_close_raises():
+    batcher = MicroBatcher(lambda inputs: inputs[:, 0, 0])
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(window(0))
@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+import pytest
+
+from binary_format import NPY_CONTENT_TYPE, RAW_CONTENT_TYPE, UnsupportedContentType, decode_window, \
+    encode_window
+
+
+WINDOW = np.arange(40, dtype=np.float32).reshape(10, 4)
+
+
+def npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def test_raw_round_trip():
+    window = decode_window(encode_window(WINDOW), RAW_CONTENT_TYPE, 4, n_rows=10)
+    np.testing.assert_array_equal(window, WINDOW)
+    assert not window.flags.writeable
+
+
+def test_npy_round_trip_with_content_type_parameters():
+    window = decode_window(npy_bytes(WINDOW), NPY_CONTENT_TYPE.upper() + "; charset=binary", 4)
+    np.testing.assert_array_equal(window, WINDOW)
+
+
+def test_unsupported_content_type():
+    with pytest.raises(UnsupportedContentType):
+        decode_window(encode_window(WINDOW), "application/json", 4)
+    with pytest.raises(UnsupportedContentType):
+        decode_window(encode_window(WINDOW), None, 4)
+
+
+@pytest.mark.parametrize("body", [b"", encode_window(WINDOW)[:-1], encode_window(WINDOW) + b"\0" * 4])
+def test_raw_body_must_be_whole_rows(body):
+    with pytest.raises(ValueError, match="whole number"):
+        decode_window(body, RAW_CONTENT_TYPE, 4)
+
+
+@pytest.mark.parametrize("body, message", [
+    (b"not an npy file at all", "Invalid .npy body"),
+    (npy_bytes(WINDOW.astype(np.float64)), "float32"),
+    (npy_bytes(WINDOW.astype(">f4")), "float32"),
+    (npy_bytes(np.asfortranarray(WINDOW)), "C-ordered"),
+    (npy_bytes(WINDOW.reshape(5, 8)), "shape"),
+    (npy_bytes(WINDOW.ravel()), "shape"),
+    (npy_bytes(WINDOW)[:-4], "header implies"),
+    (npy_bytes(WINDOW) + b"\0" * 4, "header implies"),
+])
+def test_malformed_npy_bodies(body, message):
+    with pytest.raises(ValueError, match=message):
+        decode_window(body, NPY_CONTENT_TYPE, 4)
+
+
+def test_wrong_row_count():
+    with pytest.raises(ValueError, match="Expected 30 rows"):
+        decode_window(encode_window(WINDOW), RAW_CONTENT_TYPE, 4, n_rows=30)
+
+
+@pytest.mark.parametrize("bad", [np.nan, np.inf, -np.inf])
+def test_non_finite_values(bad):
+    window = WINDOW.copy()
+    window[3, 2] = bad
+    for body, content_type in ((encode_window(window), RAW_CONTENT_TYPE), (npy_bytes(window), NPY_CONTENT_TYPE)):
+        with pytest.raises(ValueError, match="NaN or infinite"):
+            decode_window(body, content_type, 4)
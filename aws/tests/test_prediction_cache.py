@@ -0,0 +1,93 @@
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from prediction_cache import CLASSIFY_FEATURES, REGRESSION_FEATURES, CachedPredictor, PredictionCache, \
+    parse_resolutions
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def classify_window(temperature=20.0, co=5.0):
+    return np.tile(np.array([temperature, 50.0, 0.2, co], dtype=np.float32), (10, 1))
+
+
+def test_parse_resolutions():
+    resolutions = parse_resolutions("temperature=0.1, humidity=0.5", CLASSIFY_FEATURES)
+    assert resolutions.tolist() == [0.1, 0.5, 0.0, 0.0]
+
+    resolutions = parse_resolutions("sensorResistances=0.001", REGRESSION_FEATURES)
+    assert resolutions[:4].tolist() == [0.0] * 4
+    assert resolutions[4:].tolist() == [0.001] * 14
+
+    with pytest.raises(ValueError, match="Unknown cache feature"):
+        parse_resolutions("pressure=1", CLASSIFY_FEATURES)
+    with pytest.raises(ValueError, match=">= 0"):
+        parse_resolutions("temperature=-1", CLASSIFY_FEATURES)
+
+
+def test_windows_within_the_resolution_share_a_key():
+    cache = PredictionCache(parse_resolutions("temperature=0.5", CLASSIFY_FEATURES))
+    cache.put(cache.key(classify_window(20.0)), "low")
+
+    assert cache.get(cache.key(classify_window(20.2))) == "low"
+    assert cache.get(cache.key(classify_window(20.4))) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_unquantized_columns_must_match_exactly():
+    cache = PredictionCache(parse_resolutions("temperature=0.5", CLASSIFY_FEATURES))
+    assert cache.key(classify_window(co=5.0)) != cache.key(classify_window(co=5.0001))
+    assert cache.key(classify_window(co=5.0)) == cache.key(classify_window(co=5.0))
+
+
+def test_window_shape_is_part_of_the_key():
+    cache = PredictionCache(parse_resolutions("temperature=0.5", CLASSIFY_FEATURES))
+    assert cache.key(classify_window()) != cache.key(classify_window()[:5])
+    with pytest.raises(ValueError, match="columns"):
+        cache.key(np.zeros((10, 3), dtype=np.float32))
+
+
+def test_ttl_and_lru_eviction():
+    clock = FakeClock()
+    cache = PredictionCache(np.zeros(4), max_entries=2, ttl_seconds=10, clock=clock)
+    a, b, c = (cache.key(classify_window(t)) for t in (1.0, 2.0, 3.0))
+
+    cache.put(a, 1)
+    cache.put(b, 2)
+    assert cache.get(a) == 1    # a is now the most recently used
+    cache.put(c, 3)             # evicts b
+    assert cache.get(b) is None
+    assert cache.get(a) == 1
+
+    clock.now = 10.0
+    assert cache.get(c) is None
+    stats = cache.stats()
+    assert (stats["evictions"], stats["expirations"]) == (1, 1)
+
+
+class StubBatcher:
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, window, priority=False):
+        self.submitted += 1
+        future = Future()
+        future.set_result(float(window[0, 0]))
+        return future
+
+
+def test_cached_predictor_only_calls_the_batcher_on_a_miss():
+    batcher = StubBatcher()
+    predictor = CachedPredictor(batcher, PredictionCache(parse_resolutions("temperature=0.5", CLASSIFY_FEATURES)))
+
+    assert predictor.predict(classify_window(20.0)) == 20.0
+    assert predictor.predict(classify_window(20.1)) == 20.0
+    assert batcher.submitted == 1
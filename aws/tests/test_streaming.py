@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from streaming import CLASSIFY_WINDOW, PREDICT_WINDOW, STREAM_COLUMNS, DeviceRegistry, DeviceStream, \
+    WindowRingBuffer
+
+
+def row(value, n_columns=STREAM_COLUMNS):
+    return np.full(n_columns, value, dtype=np.float32)
+
+
+def test_ring_buffer_latest_is_oldest_first_across_wraparound():
+    buffer = WindowRingBuffer(4, 2)
+    for i in range(10):
+        buffer.push(row(i, 2))
+
+    assert len(buffer) == 4
+    assert buffer.count == 10
+    assert buffer.latest(4)[:, 0].tolist() == [6, 7, 8, 9]
+    assert buffer.latest(2)[:, 0].tolist() == [8, 9]
+
+
+def test_ring_buffer_latest_is_a_view():
+    buffer = WindowRingBuffer(3, 2)
+    for i in range(5):
+        buffer.push(row(i, 2))
+    assert np.shares_memory(buffer.latest(3), buffer._buf)
+
+
+def test_ring_buffer_rejects_more_rows_than_buffered():
+    buffer = WindowRingBuffer(4, 2)
+    buffer.push(row(0, 2))
+    with pytest.raises(ValueError, match="Only 1 rows buffered"):
+        buffer.latest(2)
+
+
+def emitted_at(stream, events):
+    emitted = []
+    for i in range(1, events + 1):
+        stream.push(row(i))
+        if stream.classify_window() is not None:
+            emitted.append(i)
+    return emitted
+
+
+def test_tumbling_and_strided_emission():
+    assert emitted_at(DeviceStream(), 35) == [10, 20, 30]
+    assert emitted_at(DeviceStream(stride=5), 25) == [10, 15, 20, 25]
+    assert emitted_at(DeviceStream(stride=1), 12) == [10, 11, 12]
+
+
+def test_windows_use_the_model_column_layout():
+    stream = DeviceStream()
+    for i in range(PREDICT_WINDOW):
+        stream.push(np.arange(STREAM_COLUMNS, dtype=np.float32) + 100 * i)
+
+    classify = stream.buffer.latest(CLASSIFY_WINDOW)
+    assert stream.regression_window().shape == (PREDICT_WINDOW, 18)
+    assert classify.shape == (CLASSIFY_WINDOW, STREAM_COLUMNS)
+    assert stream.classify_window()[-1].tolist() == [2900, 2901, 2902, 2918]
+
+
+def test_registry_evicts_idle_devices_only():
+    registry = DeviceRegistry(max_devices=2)
+    live = object()
+    registry.get("a", owner=live)
+    registry.get("b")
+    registry.get("c")       # over the limit: "b" is the oldest idle device
+    assert sorted(registry._streams) == ["a", "c"]
+
+    other = object()
+    registry.get("c", owner=other)
+    registry.get("d", owner=object())
+    assert len(registry) == 3   # every device has an open connection
+
+    registry.release("c", other)
+    registry.get("e")
+    assert sorted(registry._streams) == ["a", "d", "e"]
+
+
+def test_registry_keeps_the_buffer_across_reconnects():
+    registry = DeviceRegistry()
+    first, second = object(), object()
+    stream = registry.get("a", owner=first)
+    stream.push(row(1))
+
+    assert registry.get("a", owner=second) is stream
+    registry.release("a", first)    # the old connection closing late
+    assert stream.owner is second
+    assert registry.get("a", stride=1, owner=second).buffer.count == 0
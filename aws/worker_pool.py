@@ -0,0 +1,352 @@
+import argparse
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing import connection as mp_connection
+
+import numpy as np
+
+from inference_backends import MODEL_FILES, load_backend
+
+# Upper bound on one dispatched batch; a worker stuck longer than this (or
+# dead without the monitor noticing) fails the request instead of hanging it
+RESULT_TIMEOUT_SECONDS = float(os.environ.get("CO_WORKER_RESULT_TIMEOUT", "30"))
+# A worker that fails to start (or dies before it is ready) is retried after
+# RESPAWN_BACKOFF_SECONDS, doubling per consecutive failure up to the max
+RESPAWN_BACKOFF_SECONDS = float(os.environ.get("CO_WORKER_RESPAWN_BACKOFF", "1"))
+RESPAWN_BACKOFF_MAX_SECONDS = float(os.environ.get("CO_WORKER_RESPAWN_BACKOFF_MAX", "60"))
+
+logger = logging.getLogger("uvicorn.error")
+
+# ------------------- Worker process -------------------
+
+# Restrict TF (and the BLAS / OpenMP pools under it) to `threads` threads, and
+# optionally pin the process to its own slice of cores. Must run before
+# tensorflow is imported in the worker.
+def _configure_threads(index, threads, pin):
+    for var in ("TF_NUM_INTRAOP_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+
+    if pin and hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        first = (index * threads) % len(cpus)
+        os.sched_setaffinity(0, {cpus[(first + i) % len(cpus)] for i in range(threads)})
+
+
+def _worker_main(index, backend, threads, pin, model_dir, warmup_batch_sizes, tasks, results):
+    try:
+        _configure_threads(index, threads, pin)
+        if backend != "tflite":
+            import tensorflow as tf
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+
+        models = {
+            name: load_backend(backend, name, model_dir=model_dir, pool_size=1, num_threads=threads)
+            for name in MODEL_FILES
+        }
+        for name, model in models.items():
+            for batch in warmup_batch_sizes:
+                model.predict(np.zeros((batch,) + MODEL_FILES[name][2], dtype=np.float32))
+    except Exception as e:
+        results.send(("failed", None, repr(e)))
+        return
+
+    results.send(("ready", None, os.getpid()))
+
+    while True:
+        try:
+            task = tasks.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        task_id, model_name, x = task
+        try:
+            results.send((task_id, models[model_name].predict(x), None))
+        except Exception as e:
+            results.send((task_id, None, repr(e)))
+
+
+# ------------------- Front-end -------------------
+
+class _Worker:
+    """One worker process with its own task / result pipes and in-flight tasks."""
+
+    def __init__(self, ctx, index, args):
+        self.index = index
+        # Pipe(duplex=False) returns (reader, writer)
+        child_tasks, self.tasks = ctx.Pipe(duplex=False)
+        self.results, child_results = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(index,) + args + (child_tasks, child_results),
+            name=f"inference-worker-{index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_tasks.close()
+        child_results.close()
+        self.ready = False
+        self.pid = None
+        self.in_flight = {}
+        self.send_lock = threading.Lock()
+
+
+class WorkerPool:
+    """N inference processes, each with its own model copy and TF thread limits.
+
+    Each batch goes to the ready worker with the fewest tasks in flight, over
+    that worker's own pipe. A monitor thread reads results and watches the
+    process sentinels: when a worker dies (OOM kill, segfault) its in-flight
+    futures fail at once and a replacement is spawned, so callers never wait
+    on a task nobody is running. A replacement that fails to start is retried
+    with exponential backoff, so the pool returns to `workers` processes once
+    the cause (e.g. memory pressure) clears. Processes are spawned (not
+    forked) so every worker initialises TensorFlow cleanly.
+
+    With the tflite backend each worker memory-maps the same .tflite file, so
+    the weights are shared read-only through the page cache and resident memory
+    grows only by per-interpreter activations. Keras/tf_function workers each
+    hold a private copy of the (small, < 1 MB) weights.
+    """
+
+    def __init__(self, backend="keras", workers=2, threads_per_worker=1, pin=False,
+                 model_dir=".", warmup_batch_sizes=(1,), start_timeout=300.0):
+        self.backend = backend
+        self.workers = int(workers)
+        self.threads_per_worker = int(threads_per_worker)
+        self.respawns = 0
+        self._failed_starts = {}    # worker index -> consecutive failed starts
+
+        self._ctx = mp.get_context("spawn")
+        self._args = (backend, self.threads_per_worker, pin, model_dir, tuple(warmup_batch_sizes))
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._workers = [_Worker(self._ctx, i, self._args) for i in range(self.workers)]
+
+        deadline = time.monotonic() + start_timeout
+        for worker in self._workers:
+            remaining = max(deadline - time.monotonic(), 0.1)
+            if not worker.results.poll(remaining):
+                self.close()
+                raise RuntimeError(f"Inference worker {worker.index} did not start in {start_timeout:.0f} s")
+            try:
+                status, _, detail = worker.results.recv()
+            except EOFError:
+                status, detail = "failed", f"exit code {worker.process.exitcode}"
+            if status == "failed":
+                self.close()
+                raise RuntimeError(f"Inference worker {worker.index} failed to start: {detail}")
+            worker.ready, worker.pid = True, detail
+
+        self._monitor = threading.Thread(target=self._watch, name="worker-pool-monitor", daemon=True)
+        self._monitor.start()
+
+    @property
+    def pids(self):
+        return [w.pid for w in self._workers if w.pid is not None]
+
+    @property
+    def ready_workers(self):
+        with self._lock:
+            return sum(1 for w in self._workers if w.ready)
+
+    # Results and deaths of every worker, in one thread
+    def _watch(self):
+        while not self._closed:
+            with self._lock:
+                workers = list(self._workers)
+            handles = {}
+            for worker in workers:
+                handles[worker.results] = worker
+                handles[worker.process.sentinel] = worker
+            for handle in mp_connection.wait(list(handles), timeout=1.0):
+                worker = handles[handle]
+                if handle is worker.results:
+                    self._receive(worker)
+                elif not self._closed:
+                    self._replace(worker, f"exited with code {worker.process.exitcode}")
+
+    def _receive(self, worker):
+        try:
+            status, output, error = worker.results.recv()
+        except (EOFError, OSError):
+            # the sentinel fires too; the dead worker is replaced there
+            return
+        if status == "ready":
+            worker.ready, worker.pid = True, error
+            self._failed_starts.pop(worker.index, None)
+            logger.info("Inference worker %d ready (pid %s)", worker.index, error)
+            return
+        if status == "failed":
+            self._replace(worker, f"failed to start: {error}")
+            return
+        with self._lock:
+            future = worker.in_flight.pop(status, None)
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(output)
+
+    def _fail(self, worker, exc):
+        with self._lock:
+            futures, worker.in_flight = list(worker.in_flight.values()), {}
+        for future in futures:
+            if not future.done():
+                future.set_exception(exc)
+
+    # Drop a dead or failed worker and start another in its slot: at once if
+    # it had been serving, after a growing backoff if it never became ready
+    def _replace(self, worker, reason):
+        with self._lock:
+            if worker not in self._workers:
+                return
+            self._workers.remove(worker)
+        self._fail(worker, RuntimeError(f"inference worker {worker.index} {reason}"))
+        worker.tasks.close()
+        worker.results.close()
+        if worker.process.is_alive():
+            worker.process.terminate()
+
+        delay = 0.0 if worker.ready else self._backoff(worker.index)
+        logger.warning("Inference worker %d (pid %s) %s; respawning in %.0f s (%d of %d workers ready)",
+                       worker.index, worker.pid, reason, delay, self.ready_workers, self.workers)
+        self._spawn_after(worker.index, delay)
+
+    def _backoff(self, index):
+        failures = self._failed_starts.get(index, 0)
+        self._failed_starts[index] = failures + 1
+        return min(RESPAWN_BACKOFF_SECONDS * 2 ** failures, RESPAWN_BACKOFF_MAX_SECONDS)
+
+    def _spawn_after(self, index, delay):
+        if not delay:
+            self._spawn(index)
+            return
+        timer = threading.Timer(delay, self._spawn, (index,))
+        timer.daemon = True
+        timer.start()
+
+    def _spawn(self, index):
+        if self._closed:
+            return
+        try:
+            replacement = _Worker(self._ctx, index, self._args)
+        except Exception:
+            delay = self._backoff(index)
+            logger.exception("Could not start inference worker %d; retrying in %.0f s", index, delay)
+            self._spawn_after(index, delay)
+            return
+        with self._lock:
+            self._workers.append(replacement)
+            self.respawns += 1
+
+    def submit(self, model_name, x) -> Future:
+        future = Future()
+        future.task_id = next(self._ids)
+        with self._lock:
+            candidates = [w for w in self._workers if w.ready] or list(self._workers)
+            if not candidates:
+                raise RuntimeError("no inference worker is running")
+            worker = min(candidates, key=lambda w: len(w.in_flight))
+            worker.in_flight[future.task_id] = future
+        future.worker = worker
+        try:
+            with worker.send_lock:
+                worker.tasks.send((future.task_id, model_name, np.ascontiguousarray(x, dtype=np.float32)))
+        except (OSError, ValueError) as e:
+            self.discard(future)
+            future.set_exception(RuntimeError(f"inference worker {worker.index} is gone: {e!r}"))
+        return future
+
+    # Forget a task the caller stopped waiting for (result timeout)
+    def discard(self, future):
+        with self._lock:
+            future.worker.in_flight.pop(future.task_id, None)
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                with worker.send_lock:
+                    worker.tasks.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            self._fail(worker, RuntimeError("worker pool closed"))
+
+
+class PooledBackend:
+    """Backend interface (predict / input_shape) over one model in a WorkerPool."""
+
+    def __init__(self, pool, model_name, timeout=RESULT_TIMEOUT_SECONDS):
+        self.pool = pool
+        self.kind = f"{pool.backend}x{pool.workers}"
+        self.input_shape = MODEL_FILES[model_name][2]
+        self.model_name = model_name
+        self.timeout = timeout
+
+    def predict(self, x):
+        future = self.pool.submit(self.model_name, x)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.pool.discard(future)
+            raise TimeoutError(f"{self.model_name} batch took longer than {self.timeout:.0f} s") from None
+
+
+# ------------------- Scaling guidance -------------------
+
+# python worker_pool.py --max-workers 4 --threads 1
+# Prints windows/s for 1..max workers so the worker count can be sized per host.
+def main():
+    parser = argparse.ArgumentParser(description="Measure inference throughput against worker count")
+    parser.add_argument("--backend", default="keras", choices=["keras", "tf_function", "tflite"])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=1, help="TF threads per worker")
+    parser.add_argument("--batch", type=int, default=32, help="windows per dispatched batch")
+    parser.add_argument("--batches", type=int, default=200, help="batches per model per run")
+    parser.add_argument("--pin", action="store_true", help="pin each worker to its own cores")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    inputs = {name: rng.random((args.batch,) + shape, dtype=np.float32)
+              for name, (_, _, shape) in MODEL_FILES.items()}
+
+    print(f"{'workers':>7} {'threads':>7} {'classify win/s':>15} {'predict_ppm win/s':>18}")
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        pool = WorkerPool(args.backend, workers, args.threads, pin=args.pin,
+                          warmup_batch_sizes=(args.batch,))
+        rates = []
+        try:
+            for name in MODEL_FILES:
+                start = time.perf_counter()
+                futures = [pool.submit(name, inputs[name]) for _ in range(args.batches)]
+                for future in futures:
+                    future.result()
+                rates.append(args.batch * args.batches / (time.perf_counter() - start))
+        finally:
+            pool.close()
+
+        baseline = baseline or rates
+        speedup = rates[0] / baseline[0]
+        print(f"{workers:>7} {args.threads:>7} {rates[0]:>15.0f} {rates[1]:>18.0f}   x{speedup:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,6 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-from sklearn.preprocessing import MinMaxScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix, ConfusionMatrixDisplay
 import tensorflow as tf
@@ -12,58 +11,91 @@ from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense
 from tensorflow.keras.utils import to_categorical
 
+from sensor_dataset import CLASSIFY_FEATURES, sequence_dataset, sequence_view
+from preprocess_cache import restore_label_encoder, restore_minmax
+from train import classifier_data, full_config
+from quantize import EVAL_WINDOWS, accuracy_score, quantization_report, sample_windows
+from tflite_builtin import export_builtin
+
 # Set save directory
 output_dir = "/Users/admin/Downloads"
 os.makedirs(output_dir, exist_ok=True)
 
 # --- Load and preprocess data ---
-df = pd.read_csv("20160930_203718.csv")
-df.columns = df.columns.str.strip()
-
-# Simulate drift and noise on CO (optional, keep if you want)
-df["CO_ppm_drifted"] = df["CO (ppm)"] + np.linspace(0, 0.001 * len(df), len(df))
-df["CO_ppm_noisy"] = df["CO_ppm_drifted"] + np.random.normal(0, 0.05, size=df.shape[0])
-
-# Create hazard labels from noisy CO
-df["hazard_label"] = pd.cut(df["CO_ppm_noisy"], bins=[-np.inf, 50, 100, np.inf], labels=["safe", "warning", "danger"])
-df = df.dropna(subset=["hazard_label"])
+# Drift / noise simulation and hazard label bins; the noise is seeded so runs
+# are repeatable
+csv_file = "20160930_203718.csv"
+DRIFT_RATE = 0.001
+NOISE_STD = 0.05
+NOISE_SEED = 0
+LABEL_BINS = [-np.inf, 50, 100, np.inf]
+LABEL_NAMES = ["safe", "warning", "danger"]
+
+# Scaling and labels are cached per distinct (CSV contents, parameters) and
+# memory-mapped on later runs (see preprocess_cache.py); None disables it
+PREPROCESS_CACHE = ".preprocess_cache"
+
+time_steps = 10
+
+# Opt-in: also write dynamic-range int8, full int8 and float16 TFLite variants
+# (co_lstm_classifier_v1_<variant>.tflite) with a size / latency / accuracy report
+QUANTIZE_EXPORTS = False
+
+# Opt-in: also write co_lstm_classifier_v1_builtin.tflite, which needs no Flex delegate
+# (fixed batch of 1, fused LSTM), after a parity check against Keras
+BUILTIN_EXPORT = False
+
+# Drift and noise on CO, hazard labels (rows with missing CO get no label and
+# are dropped), feature scaling and label encoding are train.py's
+# classifier_data(), shared with train.py, sweep.py and finetune.py
+config = full_config("classifier", {"drift_rate": DRIFT_RATE, "noise_std": NOISE_STD, "noise_seed": NOISE_SEED,
+                                    "label_bins": LABEL_BINS, "label_names": LABEL_NAMES,
+                                    "time_steps": time_steps})
 
 # --- UPDATED: include CO (ppm) as input feature ---
-features = ["Temperature (C)", "Humidity (%r.h.)", "Heater voltage (V)", "CO (ppm)"]
+features = CLASSIFY_FEATURES  # Temperature, Humidity, Heater voltage, CO (ppm)
 
-# Normalize features
-scaler = MinMaxScaler()
-scaled_features = scaler.fit_transform(df[features])
-
-# Encode labels
-label_encoder = LabelEncoder()
-labels = label_encoder.fit_transform(df["hazard_label"])
+prepared = classifier_data([csv_file], config, cache_root=PREPROCESS_CACHE)
+scaled_features = prepared["scaled_features"]
+scaler = restore_minmax(prepared, "scaler")
+label_encoder = restore_label_encoder(prepared, "label_encoder")
+labels = prepared["labels"]
 categorical_labels = to_categorical(labels)
 
-# Create sequences
-def create_sequences(X, y, time_steps=10):
-    Xs, ys = [], []
-    for i in range(len(X) - time_steps):
-        Xs.append(X[i:i + time_steps])
-        ys.append(y[i + time_steps])
-    return np.array(Xs), np.array(ys)
+# Create sequences: X_seq is a strided view over scaled_features (no N x 10 x 4
+# copy). USE_TF_DATA=True builds the windows batch by batch in a tf.data
+# pipeline instead, for recordings too long to materialize for fit().
+USE_TF_DATA = False
 
-X_seq, y_seq = create_sequences(scaled_features, categorical_labels, time_steps=10)
+X_seq, y_seq = sequence_view(scaled_features, categorical_labels, time_steps)
 
-# Train/test split
-X_train, X_test, y_train, y_test = train_test_split(X_seq, y_seq, test_size=0.2, random_state=42)
+# Train/test split on window indices (same permutation as splitting the arrays)
+train_idx, test_idx = train_test_split(np.arange(len(X_seq)), test_size=0.2, random_state=42)
+y_train, y_test = y_seq[train_idx], y_seq[test_idx]
 
 # --- Build LSTM model ---
 model = Sequential()
-model.add(LSTM(64, input_shape=(X_train.shape[1], X_train.shape[2]), return_sequences=False))
+model.add(LSTM(64, input_shape=(X_seq.shape[1], X_seq.shape[2]), return_sequences=False))
 model.add(Dense(3, activation='softmax'))
 model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
 
 # Train
-history = model.fit(X_train, y_train, epochs=10, batch_size=32, validation_split=0.1)
+if USE_TF_DATA:
+    # Same hold-out as validation_split=0.1: the last 10% of the training windows
+    val_start = int(len(train_idx) * 0.9)
+    train_data = sequence_dataset(scaled_features, categorical_labels, time_steps,
+                                  indices=train_idx[:val_start], batch_size=32, shuffle=True)
+    val_data = sequence_dataset(scaled_features, categorical_labels, time_steps,
+                                indices=train_idx[val_start:], batch_size=32)
+    history = model.fit(train_data, epochs=10, validation_data=val_data)
+    test_inputs = sequence_dataset(scaled_features, categorical_labels, time_steps, indices=test_idx)
+else:
+    X_train, X_test = X_seq[train_idx], X_seq[test_idx]
+    history = model.fit(X_train, y_train, epochs=10, batch_size=32, validation_split=0.1)
+    test_inputs = X_test
 
 # --- Evaluation ---
-y_pred = model.predict(X_test)
+y_pred = model.predict(test_inputs)
 y_pred_labels = np.argmax(y_pred, axis=1)
 y_true_labels = np.argmax(y_test, axis=1)
 
@@ -166,7 +198,17 @@ print("✅ Exported to TFLite: co_lstm_classifier_v1.tflite")
 # Export the model to CoreML (for iOS) ---
 mlmodel = ct.convert(
     model,
-    inputs=[ct.TensorType(shape=(1, X_train.shape[1], X_train.shape[2]))]
+    inputs=[ct.TensorType(shape=(1, X_seq.shape[1], X_seq.shape[2]))]
 )
 mlmodel.save("co_lstm_classifier_v1.mlmodel")
-print("✅ Exported to CoreML: co_lstm_classifier_v1.mlmodel")
\ No newline at end of file
+print("✅ Exported to CoreML: co_lstm_classifier_v1.mlmodel")
+
+# Quantized TFLite variants (see quantize.py) ---
+eval_idx = test_idx[:EVAL_WINDOWS]
+if QUANTIZE_EXPORTS:
+    quantization_report(model, "co_lstm_classifier_v1", X_seq[sample_windows(train_idx)], X_seq[eval_idx],
+                        accuracy_score(y_seq[eval_idx]))
+
+# TFLite with builtin ops only (see tflite_builtin.py) ---
+if BUILTIN_EXPORT:
+    export_builtin(model, "co_lstm_classifier_v1", X_seq[eval_idx])
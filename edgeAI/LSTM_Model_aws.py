@@ -1,4 +1,3 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.preprocessing import MinMaxScaler, LabelEncoder
@@ -12,70 +11,82 @@ from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import EarlyStopping
 from sklearn.model_selection import train_test_split
 from tensorflow.keras.utils import to_categorical
+
+from sensor_dataset import (REGRESSION_COLUMNS, REGRESSION_FEATURES, SENSOR_COLUMNS, StreamingCorpus,
+                            sequence_dataset, sequence_view)
+from preprocess_cache import minmax_state, restore_minmax, save_transformers
+from train import full_config, preprocess_params, regression_data, streaming_target
 from tensorflow.keras.losses import MeanSquaredError
 
 
 # --- Step 1: Load and preprocess data ---
+# Parsed column-wise into one float32 matrix; cached as .npy next to each CSV
+# and memory-mapped on later runs (see sensor_dataset.py)
 csv_files = ["20160930_203718.csv"]
-df_list = [pd.read_csv(file) for file in csv_files]
-df = pd.concat(df_list, ignore_index=True)
-df.columns = df.columns.str.strip()
-print("Cleaned column names:", df.columns.tolist())
-
-# --- Step 2: Simulate drift and noise (optional) ---
-def simulate_drift(data, drift_rate=0.001):
-    drift = np.linspace(0, drift_rate * len(data), len(data))
-    return data + drift
 
-def add_noise(data, std_dev=0.05):
-    return data + np.random.normal(0, std_dev, size=data.shape)
-
-df["CO_ppm_drifted"] = simulate_drift(df["CO (ppm)"])
-df["CO_ppm_noisy"] = add_noise(df["CO_ppm_drifted"])
-
-# --- Step 3: Select and scale features and target ---
-features = [
-    "Temperature (C)",
-    "Humidity (%r.h.)",
-    "Heater voltage (V)",
-    "Flow rate (mL/min)"
-] + [f"R{i} (MOhm)" for i in range(1, 15)]  # Sensor resistances
+# STREAM_FILES=True never concatenates csv_files (which may also be .npy
+# shards): the scalers are fitted in one pass and windows are streamed file by
+# file through tf.data (StreamingCorpus in sensor_dataset.py). Splits are then
+# chronological within each file: 72% train, 8% validation, 20% test.
+STREAM_FILES = False
+SHUFFLE_BUFFER = 10000
 
-target = "CO_ppm_noisy"
+# Drift / noise simulation (Step 2); the noise is seeded so runs are repeatable
+DRIFT_RATE = 0.001
+NOISE_STD = 0.05
+NOISE_SEED = 0
 
-scaler_X = MinMaxScaler()
-X_scaled = scaler_X.fit_transform(df[features])
-
-scaler_y = MinMaxScaler()
-y_scaled = scaler_y.fit_transform(df[target].values.reshape(-1, 1))
-
-# --- Step 4: Prepare data for LSTM ---
-def create_sequences(X, y, time_steps=30):
-    Xs, ys = [], []
-    for i in range(len(X) - time_steps):
-        Xs.append(X[i:i + time_steps])
-        ys.append(y[i + time_steps])
-    return np.array(Xs), np.array(ys)
+# Steps 2-3 are cached per distinct (csv_files contents, parameters) and
+# memory-mapped on later runs (see preprocess_cache.py); None disables it
+PREPROCESS_CACHE = ".preprocess_cache"
 
 time_steps = 30
-X_seq, y_seq = create_sequences(X_scaled, y_scaled, time_steps)
 
-# --- Step 5: Train-test split (chronological, no shuffle) ---
-split_index = int(len(X_seq) * 0.8)
-X_train, X_test = X_seq[:split_index], X_seq[split_index:]
-y_train, y_test = y_seq[:split_index], y_seq[split_index:]
+# --- Step 2: Simulate drift and noise (optional) ---
+# Steps 2-3 are train.py's preprocessing (simulate_drift / add_noise, MinMax
+# scaling), shared with train.py, sweep.py and finetune.py
+config = full_config("regression", {"drift_rate": DRIFT_RATE, "noise_std": NOISE_STD, "noise_seed": NOISE_SEED,
+                                    "time_steps": time_steps})
 
-# --- Step 6: Further split train into train/val for metrics callback ---
-val_split = 0.1
-val_samples = int(len(X_train) * val_split)
-X_val = X_train[-val_samples:]
-y_val = y_train[-val_samples:]
-X_train_final = X_train[:-val_samples]
-y_train_final = y_train[:-val_samples]
+if STREAM_FILES:
+    corpus = StreamingCorpus(csv_files, time_steps, streaming_target(config), feature_columns=REGRESSION_COLUMNS)
+    print(f"Streaming {len(csv_files)} files, {corpus.total_rows} rows, columns:", SENSOR_COLUMNS)
+
+# --- Step 3: Select and scale features and target ---
+features = REGRESSION_FEATURES  # Temperature, Humidity, Heater voltage, Flow rate, R1..R14
+
+if STREAM_FILES:
+    scaler_X, scaler_y = corpus.fit_scalers(MinMaxScaler(), MinMaxScaler())
+else:
+    prepared = regression_data(csv_files, config, cache_root=PREPROCESS_CACHE)
+    X_scaled, y_scaled = prepared["X_scaled"], prepared["y_scaled"]
+    scaler_X = restore_minmax(prepared, "scaler_X")
+    scaler_y = restore_minmax(prepared, "scaler_y")
+
+    # --- Step 4: Prepare data for LSTM ---
+    # X_seq is a strided view over X_scaled (no N x 30 x 18 copy) and the splits
+    # below stay views. USE_TF_DATA=True instead builds the windows batch by batch
+    # in a tf.data pipeline, for recordings too long to materialize for fit().
+    USE_TF_DATA = False
+
+    X_seq, y_seq = sequence_view(X_scaled, y_scaled, time_steps)
+
+    # --- Step 5: Train-test split (chronological, no shuffle) ---
+    split_index = int(len(X_seq) * 0.8)
+    X_train, X_test = X_seq[:split_index], X_seq[split_index:]
+    y_train, y_test = y_seq[:split_index], y_seq[split_index:]
+
+    # --- Step 6: Further split train into train/val for metrics callback ---
+    val_split = 0.1
+    val_samples = int(len(X_train) * val_split)
+    X_val = X_train[-val_samples:]
+    y_val = y_train[-val_samples:]
+    X_train_final = X_train[:-val_samples]
+    y_train_final = y_train[:-val_samples]
 
 # --- Step 7: Build LSTM model ---
 model = Sequential([
-    Input(shape=(X_train_final.shape[1], X_train_final.shape[2])),
+    Input(shape=(time_steps, len(features))),
     LSTM(128, return_sequences=True),
     Dropout(0.2),
     LSTM(64),
@@ -83,16 +94,51 @@ model = Sequential([
     Dense(1)
 ])
 
+# Per-epoch metrics (see Step 8): "full", "subsample" or "streaming"
+METRICS_MODE = "full"
+METRICS_EVERY = 1
+METRICS_TRAIN_SAMPLES = 4096
+
+if STREAM_FILES and METRICS_MODE != "streaming":
+    print("STREAM_FILES has no in-memory train / validation arrays, using METRICS_MODE = 'streaming'")
+    METRICS_MODE = "streaming"
+
+def streaming_metrics():
+    return [
+        tf.keras.metrics.RootMeanSquaredError(name="rmse"),
+        tf.keras.metrics.MeanAbsoluteError(name="mae"),
+        tf.keras.metrics.R2Score(name="r2"),
+    ]
+
 optimizer = Adam(learning_rate=0.001)
 #model.compile(optimizer=optimizer, loss='mse')
-model.compile(optimizer=optimizer, loss=MeanSquaredError())
+model.compile(optimizer=optimizer, loss=MeanSquaredError(),
+              metrics=streaming_metrics() if METRICS_MODE == "streaming" else None)
 
 # --- Step 8: Custom callback to print and store RMSE, MAE, R2 per epoch ---
+# Metrics are in CO ppm (targets un-scaled with scaler_y) in every mode:
+#   "full"       predict on every train and validation window each epoch
+#   "subsample"  train metrics from a fixed random subsample of
+#                METRICS_TRAIN_SAMPLES windows (same windows every epoch);
+#                validation metrics still on the full validation set
+#   "streaming"  no extra predict: RMSE / MAE / R2 are compiled Keras metrics
+#                accumulated during fit()'s own forward passes. Validation
+#                values match "full"; train values are averaged over the
+#                epoch's batches (weights changing, dropout on), like the loss
+# METRICS_EVERY=K computes them every K epochs (and after the last epoch).
 class MetricsCallback(tf.keras.callbacks.Callback):
-    def __init__(self, train_data, val_data):
+    def __init__(self, train_data, val_data, mode="full", every=1, train_samples=4096,
+                 predict_batch_size=1024, seed=0):
         super().__init__()
         self.X_train, self.y_train = train_data
         self.X_val, self.y_val = val_data
+        self.mode = mode
+        self.every = max(int(every), 1)
+        self.predict_batch_size = predict_batch_size
+        if mode == "subsample" and len(self.X_train) > train_samples:
+            idx = np.sort(np.random.default_rng(seed).choice(len(self.X_train), train_samples, replace=False))
+            self.X_train, self.y_train = self.X_train[idx], self.y_train[idx]
+        self.epochs = []
         self.train_rmse = []
         self.val_rmse = []
         self.train_mae = []
@@ -100,24 +146,26 @@ class MetricsCallback(tf.keras.callbacks.Callback):
         self.train_r2 = []
         self.val_r2 = []
 
-    def on_epoch_end(self, epoch, logs=None):
-        y_train_pred = self.model.predict(self.X_train, verbose=0)
-        y_val_pred = self.model.predict(self.X_val, verbose=0)
-
-        y_train_true_unscaled = scaler_y.inverse_transform(self.y_train)
-        y_train_pred_unscaled = scaler_y.inverse_transform(y_train_pred)
-        y_val_true_unscaled = scaler_y.inverse_transform(self.y_val)
-        y_val_pred_unscaled = scaler_y.inverse_transform(y_val_pred)
-
-        def calc_metrics(true, pred):
-            rmse = sqrt(mean_squared_error(true, pred))
-            mae = mean_absolute_error(true, pred)
-            r2 = r2_score(true, pred)
-            return rmse, mae, r2
-
-        train_rmse, train_mae, train_r2 = calc_metrics(y_train_true_unscaled, y_train_pred_unscaled)
-        val_rmse, val_mae, val_r2 = calc_metrics(y_val_true_unscaled, y_val_pred_unscaled)
-
+    def _predicted_metrics(self, X, y):
+        y_pred = self.model.predict(X, batch_size=self.predict_batch_size, verbose=0)
+        true = scaler_y.inverse_transform(y)
+        pred = scaler_y.inverse_transform(y_pred)
+        return sqrt(mean_squared_error(true, pred)), mean_absolute_error(true, pred), r2_score(true, pred)
+
+    # RMSE and MAE scale linearly with the MinMaxScaler; R2 is scale-free
+    def _streaming_metrics(self, logs, prefix=""):
+        scale = scaler_y.scale_[0]
+        return logs[prefix + "rmse"] / scale, logs[prefix + "mae"] / scale, logs[prefix + "r2"]
+
+    def _record(self, epoch, logs):
+        if self.mode == "streaming":
+            train_rmse, train_mae, train_r2 = self._streaming_metrics(logs)
+            val_rmse, val_mae, val_r2 = self._streaming_metrics(logs, "val_")
+        else:
+            train_rmse, train_mae, train_r2 = self._predicted_metrics(self.X_train, self.y_train)
+            val_rmse, val_mae, val_r2 = self._predicted_metrics(self.X_val, self.y_val)
+
+        self.epochs.append(epoch + 1)
         self.train_rmse.append(train_rmse)
         self.val_rmse.append(val_rmse)
         self.train_mae.append(train_mae)
@@ -129,21 +177,49 @@ class MetricsCallback(tf.keras.callbacks.Callback):
         print(f"  Train - RMSE: {train_rmse:.4f}, MAE: {train_mae:.4f}, R2: {train_r2:.4f}")
         print(f"  Val   - RMSE: {val_rmse:.4f}, MAE: {val_mae:.4f}, R2: {val_r2:.4f}")
 
+    # With every > 1 the final epoch is recorded too: the last planned one, or
+    # the one where EarlyStopping (listed before this callback) stops training
+    def on_epoch_end(self, epoch, logs=None):
+        last = self.model.stop_training or epoch + 1 == self.params.get("epochs")
+        if (epoch + 1) % self.every == 0 or last:
+            self._record(epoch, logs)
+
 # --- Step 9: Train model ---
 early_stop = EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True)
-metrics_callback = MetricsCallback((X_train_final, y_train_final), (X_val, y_val))
+if STREAM_FILES:
+    metrics_callback = MetricsCallback((None, None), (None, None), mode=METRICS_MODE, every=METRICS_EVERY)
+else:
+    metrics_callback = MetricsCallback((X_train_final, y_train_final), (X_val, y_val), mode=METRICS_MODE,
+                                       every=METRICS_EVERY, train_samples=METRICS_TRAIN_SAMPLES)
+
+if STREAM_FILES:
+    train_inputs = dict(x=corpus.dataset(0.0, 0.72, batch_size=32, shuffle_buffer=SHUFFLE_BUFFER))
+    val_data = corpus.dataset(0.72, 0.8, batch_size=256)
+    test_inputs = corpus.dataset(0.8, 1.0, batch_size=256)
+    # Test targets in the same (deterministic) order the predictions come out
+    y_test = np.concatenate([y.numpy() for _, y in test_inputs])
+elif USE_TF_DATA:
+    val_start = split_index - val_samples
+    train_inputs = dict(x=sequence_dataset(X_scaled, y_scaled, time_steps, indices=np.arange(val_start),
+                                           batch_size=32, shuffle=True))
+    val_data = sequence_dataset(X_scaled, y_scaled, time_steps, indices=np.arange(val_start, split_index))
+    test_inputs = sequence_dataset(X_scaled, y_scaled, time_steps,
+                                   indices=np.arange(split_index, len(X_seq)))
+else:
+    train_inputs = dict(x=X_train_final, y=y_train_final, batch_size=32)
+    val_data = (X_val, y_val)
+    test_inputs = X_test
 
 history = model.fit(
-    X_train_final, y_train_final,
+    **train_inputs,
     epochs=100,
-    batch_size=32,
-    validation_data=(X_val, y_val),
+    validation_data=val_data,
     callbacks=[early_stop, metrics_callback],
     verbose=2
 )
 
 # --- Step 10: Evaluate on test set ---
-y_pred = model.predict(X_test)
+y_pred = model.predict(test_inputs)
 y_pred_unscaled = scaler_y.inverse_transform(y_pred)
 y_test_unscaled = scaler_y.inverse_transform(y_test)
 
@@ -155,7 +231,7 @@ print(f"Test Set Metrics: RMSE={rmse:.4f}, MAE={mae:.4f}, R2={r2:.4f}")
 
 # --- Step 11: Plot metrics and predictions ---
 
-epochs = range(1, len(metrics_callback.train_rmse) + 1)
+epochs = metrics_callback.epochs
 
 # 1. Training and Validation RMSE over epochs
 plt.figure(figsize=(10,5))
@@ -203,3 +279,9 @@ plt.show()
 # --- Step 12: Export the model as a regular TensorFlow model (.h5) for server use (Amazon Linux / FastAPI) ---
 model.save("co_lstm_regression_v1.h5")
 print("✅ Saved model as TensorFlow .h5: co_lstm_regression_v1.h5")
+
+# Scaler parameters next to the model, for warm-start fine-tuning (finetune.py)
+save_transformers("co_lstm_regression_v1.h5",
+                  {**minmax_state(scaler_X, "scaler_X"), **minmax_state(scaler_y, "scaler_y")},
+                  preprocess_params("regression", config))
+print("✅ Saved scalers: co_lstm_regression_v1.preprocess.npz")
@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from preprocess_cache import restore_minmax
+from quantize import NUM_THREADS, TFLiteRunner
+from tflite_builtin import convert_builtin
+from train import (DEFAULT_CSV_FILES, classifier_data, classifier_splits, full_config, regression_data,
+                   regression_splits, train)
+
+# ------------------- Config -------------------
+
+# Compact students trained by knowledge distillation from the current model
+# (the teacher): each student is fitted to a blend of the true targets and the
+# teacher's predictions, weighted by ALPHA:
+#   regression  alpha * y + (1 - alpha) * teacher(x); with MSE this has the
+#               same gradients as alpha * MSE(y) + (1 - alpha) * MSE(teacher)
+#   classifier  alpha * one-hot + (1 - alpha) * teacher probabilities softened
+#               by TEMPERATURE; cross-entropy is linear in the target, so this
+#               is the usual hard + soft loss with the student at T = 1
+# Every student (and the teacher) is exported as builtin-only TFLite
+# (tflite_builtin.py) and timed one window at a time on this CPU; candidates
+# over the latency or size budget are rejected.
+STUDENTS = {
+    "lstm": [16, 32],        # one narrow LSTM layer
+    "gru": [16, 32],         # one GRU layer
+    "cnn": [16, 32],         # two causal dilated Conv1D layers + pooling
+}
+ALPHA = 0.5
+TEMPERATURE = 2.0
+LATENCY_BUDGET_MS = 2.0  # p50, one window, NUM_THREADS interpreter threads
+SIZE_BUDGET_KB = 256     # builtin .tflite file
+
+# Teachers used when --teacher is not given (the LSTM_Model.py /
+# LSTM_Classifier.py exports); one is trained with train.py only if missing
+SHIPPED_TEACHERS = {
+    "regression": "co_lstm_regression_v1.h5",
+    "classifier": "co_lstm_classifier_v1.h5",
+}
+
+# Budgets of the devices we ship to, for the per-device pick under the table
+DEVICE_CLASSES = {
+    "gateway": {"latency_ms": 10.0, "size_kb": 2048},
+    "phone": {"latency_ms": 2.0, "size_kb": 256},
+    "microcontroller": {"latency_ms": 0.5, "size_kb": 64},
+}
+
+# ------------------- Students -------------------
+
+def build_student(kind, width, input_shape, n_outputs, activation=None):
+    from tensorflow.keras.layers import GRU, LSTM, Conv1D, Dense, GlobalAveragePooling1D, Input
+    from tensorflow.keras.models import Sequential
+
+    layers = [Input(shape=input_shape)]
+    if kind == "lstm":
+        layers.append(LSTM(width))
+    elif kind == "gru":
+        layers.append(GRU(width))
+    elif kind == "cnn":
+        layers += [Conv1D(width, 3, padding="causal", activation="relu"),
+                   Conv1D(width, 3, padding="causal", dilation_rate=2, activation="relu"),
+                   GlobalAveragePooling1D()]
+    else:
+        raise ValueError(f"Unknown student kind {kind!r}, expected one of {sorted(STUDENTS)}")
+    layers.append(Dense(n_outputs, activation=activation))
+    return Sequential(layers)
+
+
+def soften(probabilities, temperature):
+    logits = np.log(np.clip(probabilities, 1e-7, 1.0)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+# ------------------- Data -------------------
+
+# Training / validation / test arrays, the blended distillation targets and
+# the test score. Regression scores RMSE in ppm (lower is better), the
+# classifier accuracy (higher is better).
+def distillation_data(task, teacher, config, csv_files, alpha=ALPHA, temperature=TEMPERATURE):
+    from sklearn.metrics import accuracy_score, mean_squared_error
+
+    if task == "regression":
+        prepared = regression_data(csv_files, config)
+        (X_train, y_train), (X_val, y_val), (X_test, y_test) = regression_splits(prepared, config)
+        soft = teacher.predict(X_train, batch_size=1024, verbose=0)
+        targets = alpha * y_train + (1 - alpha) * soft
+        scaler_y = restore_minmax(prepared, "scaler_y")
+        y_true = scaler_y.inverse_transform(y_test)
+
+        def score(model):
+            y_pred = scaler_y.inverse_transform(model.predict(X_test, batch_size=1024, verbose=0))
+            return float(np.sqrt(mean_squared_error(y_true, y_pred)))
+    else:
+        prepared = classifier_data(csv_files, config)
+        X_seq, y_seq, train_idx, test_idx = classifier_splits(prepared, config)
+        # same hold-out as validation_split: the last part of the training windows
+        val_start = int(len(train_idx) * (1 - config["val_split"]))
+        X_train, y_train = X_seq[train_idx[:val_start]], y_seq[train_idx[:val_start]]
+        X_val, y_val = X_seq[train_idx[val_start:]], y_seq[train_idx[val_start:]]
+        X_test, y_true = X_seq[test_idx], np.argmax(y_seq[test_idx], axis=1)
+        soft = soften(teacher.predict(X_train, batch_size=1024, verbose=0), temperature)
+        targets = alpha * y_train + (1 - alpha) * soft
+
+        def score(model):
+            y_pred = np.argmax(model.predict(X_test, batch_size=1024, verbose=0), axis=1)
+            return float(accuracy_score(y_true, y_pred))
+    return X_train, targets, (X_val, y_val), X_test, score
+
+
+# ------------------- Candidates -------------------
+
+def measure(model, X_test, num_threads=NUM_THREADS):
+    mode = "fused" if all(layer.__class__.__name__ != "GRU" for layer in model.layers) else "unrolled"
+    tflite_model = convert_builtin(model, mode)
+    p50, p99 = TFLiteRunner(tflite_model, num_threads).latency(X_test[0])
+    return tflite_model, {"size_kb": round(len(tflite_model) / 1024, 2), "latency_p50_ms": round(p50, 4),
+                          "latency_p99_ms": round(p99, 4)}
+
+
+def train_student(kind, width, task, data, config, verbose=0):
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    X_train, targets, val_data, _, _ = data
+    tf.keras.utils.set_random_seed(config["seed"])
+    regression = task == "regression"
+    model = build_student(kind, width, X_train.shape[1:], targets.shape[1], None if regression else "softmax")
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=config["learning_rate"]),
+                  loss="mse" if regression else "categorical_crossentropy")
+    callbacks = []
+    if config["patience"]:
+        callbacks.append(EarlyStopping(monitor="val_loss", patience=config["patience"], restore_best_weights=True))
+    start = time.perf_counter()
+    model.fit(X_train, targets, epochs=config["epochs"], batch_size=config["batch_size"],
+              validation_data=val_data, callbacks=callbacks, verbose=verbose)
+    return model, time.perf_counter() - start
+
+
+# Non-dominated rows on (metric, p50 latency) among the accepted ones
+def pareto_front(rows, higher_is_better):
+    def better_or_equal(a, b):
+        metric_ok = a["metric"] >= b["metric"] if higher_is_better else a["metric"] <= b["metric"]
+        return metric_ok and a["latency_p50_ms"] <= b["latency_p50_ms"]
+
+    accepted = [r for r in rows if r["accepted"]]
+    return [r for r in accepted
+            if not any(o is not r and better_or_equal(o, r) and not better_or_equal(r, o) for o in accepted)]
+
+
+def distill(task, teacher_path=None, config=None, csv_files=DEFAULT_CSV_FILES, output_dir="students",
+            students=STUDENTS, latency_budget_ms=LATENCY_BUDGET_MS, size_budget_kb=SIZE_BUDGET_KB,
+            alpha=ALPHA, temperature=TEMPERATURE, num_threads=NUM_THREADS, verbose=0):
+    from tensorflow.keras.models import load_model
+
+    config = full_config(task, config)
+    os.makedirs(output_dir, exist_ok=True)
+    if teacher_path is None and os.path.exists(SHIPPED_TEACHERS[task]):
+        teacher_path = SHIPPED_TEACHERS[task]
+        print(f"Using the shipped {task} teacher {teacher_path}")
+    if teacher_path is None:
+        print(f"Training the {task} teacher")
+        teacher_path = train(task, config, csv_files=csv_files, output_dir=output_dir, verbose=verbose)["model_path"]
+    teacher = load_model(teacher_path, compile=False)
+    if teacher.input_shape[1] != config["time_steps"]:
+        raise ValueError(f"{teacher_path} takes {teacher.input_shape[1]}-step windows, but time_steps is "
+                         f"{config['time_steps']}; pass a matching --teacher or --config")
+    data = distillation_data(task, teacher, config, csv_files, alpha, temperature)
+    X_test, score = data[3], data[4]
+
+    candidates = [("teacher", teacher, 0.0)]
+    for kind, widths in students.items():
+        for width in widths:
+            print(f"Distilling {kind}_{width}")
+            model, seconds = train_student(kind, width, task, data, config, verbose)
+            candidates.append((f"{kind}_{width}", model, seconds))
+
+    rows = []
+    for name, model, seconds in candidates:
+        row = {"name": name, "params": int(model.count_params()), "train_seconds": round(seconds, 1),
+               "metric": score(model)}
+        try:
+            tflite_model, timing = measure(model, X_test, num_threads)
+        except Exception as e:
+            row.update({"accepted": False, "reason": f"conversion failed: {e!r}"})
+            rows.append(row)
+            continue
+        row.update(timing)
+        reasons = []
+        if row["latency_p50_ms"] > latency_budget_ms:
+            reasons.append(f"latency {row['latency_p50_ms']:.3f} ms > {latency_budget_ms:g}")
+        if row["size_kb"] > size_budget_kb:
+            reasons.append(f"size {row['size_kb']:.1f} KB > {size_budget_kb:g}")
+        row.update({"accepted": not reasons, "reason": "; ".join(reasons)})
+        if name == "teacher":
+            row["model_path"] = teacher_path
+        else:
+            path = os.path.join(output_dir, f"co_{task}_{name}")
+            model.save(path + ".h5")
+            with open(path + "_builtin.tflite", "wb") as f:
+                f.write(tflite_model)
+            row["model_path"] = path + ".h5"
+        rows.append(row)
+
+    higher_is_better = task == "classifier"
+    front = {r["name"] for r in pareto_front(rows, higher_is_better)}
+    for row in rows:
+        row["pareto"] = row["name"] in front
+    report = {"task": task, "metric": "accuracy" if higher_is_better else "rmse", "teacher": teacher_path,
+              "alpha": alpha, "temperature": temperature, "num_threads": num_threads,
+              "budgets": {"latency_ms": latency_budget_ms, "size_kb": size_budget_kb},
+              "device_classes": device_picks(rows, higher_is_better), "candidates": rows}
+    with open(os.path.join(output_dir, f"distill_{task}.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print_table(report)
+    return report
+
+
+# Best-scoring candidate within each device class's budget (teacher included)
+def device_picks(rows, higher_is_better):
+    picks = {}
+    for device, budget in DEVICE_CLASSES.items():
+        fits = [r for r in rows if "latency_p50_ms" in r and r["latency_p50_ms"] <= budget["latency_ms"]
+                and r["size_kb"] <= budget["size_kb"]]
+        best = max(fits, key=lambda r: r["metric"] if higher_is_better else -r["metric"], default=None)
+        picks[device] = best["name"] if best else None
+    return picks
+
+
+# ------------------- Pareto table -------------------
+
+def print_table(report):
+    metric = report["metric"]
+    higher_is_better = metric == "accuracy"
+    rows = sorted(report["candidates"], key=lambda r: r.get("latency_p50_ms", float("inf")))
+    print(f"\n--- {report['task']} students ({metric}, {report['num_threads']} thread, budget "
+          f"{report['budgets']['latency_ms']:g} ms / {report['budgets']['size_kb']:g} KB) ---")
+    print(f"{'':<2} {'name':<12} {metric:>10} {'p50 ms':>8} {'p99 ms':>8} {'KB':>8} {'params':>8}  status")
+    for r in rows:
+        if "latency_p50_ms" not in r:
+            print(f"{'':<2} {r['name']:<12} {r['metric']:>10.4f} {'':>8} {'':>8} {'':>8} {r['params']:>8}  "
+                  f"{r['reason']}")
+            continue
+        status = "ok" if r["accepted"] else "rejected: " + r["reason"]
+        print(f"{'*' if r['pareto'] else '':<2} {r['name']:<12} {r['metric']:>10.4f} {r['latency_p50_ms']:>8.3f} "
+              f"{r['latency_p99_ms']:>8.3f} {r['size_kb']:>8.1f} {r['params']:>8}  {status}")
+    print(f"* Pareto front ({'higher' if higher_is_better else 'lower'} {metric}, lower latency) "
+          f"among accepted candidates")
+    for device, name in report["device_classes"].items():
+        budget = DEVICE_CLASSES[device]
+        print(f"{device:<16} ({budget['latency_ms']:g} ms / {budget['size_kb']:g} KB): {name or 'nothing fits'}")
+
+
+# ------------------- Main -------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Distil compact students from the CO LSTM under a latency budget")
+    parser.add_argument("task", choices=["regression", "classifier"])
+    parser.add_argument("--teacher", default=None,
+                        help="trained teacher .h5 (default: the shipped co_lstm_<task>_v1.h5, else train one)")
+    parser.add_argument("--config", default="{}", help="train.py settings of the teacher and student training (JSON)")
+    parser.add_argument("--students", default=json.dumps(STUDENTS), help="JSON object of kind -> list of widths")
+    parser.add_argument("--csv", nargs="+", default=DEFAULT_CSV_FILES)
+    parser.add_argument("--output-dir", default="students")
+    parser.add_argument("--latency-budget-ms", type=float, default=LATENCY_BUDGET_MS)
+    parser.add_argument("--size-budget-kb", type=float, default=SIZE_BUDGET_KB)
+    parser.add_argument("--alpha", type=float, default=ALPHA)
+    parser.add_argument("--temperature", type=float, default=TEMPERATURE)
+    parser.add_argument("--threads", type=int, default=NUM_THREADS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    distill(args.task, args.teacher, json.loads(args.config), args.csv, args.output_dir, json.loads(args.students),
+            args.latency_budget_ms, args.size_budget_kb, args.alpha, args.temperature, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score, mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+
+from preprocess_cache import (load_transformers, restore_label_encoder, restore_minmax, save_transformers,
+                              transformer_arrays)
+from sensor_dataset import load_sensor_file, sequence_view
+from train import (DEFAULT_CSV_FILES, add_noise, classifier_data, full_config, preprocess_params, regression_data,
+                   simulate_drift)
+
+# ------------------- Config -------------------
+
+# Warm start: load a trained model and continue training it on windows from
+# new recordings only, mixed with a random replay sample of the original
+# training windows so it does not forget the old conditions. New data is
+# scaled with the scaler (and label encoder) saved next to the model
+# (<model>.preprocess.npz), never refitted, so the model's input range and
+# the app's post-processing stay the same. The result is saved under the
+# next free version (co_lstm_regression_v1.h5 -> co_lstm_regression_v2.h5).
+FINETUNE_DEFAULTS = {
+    "learning_rate": 1e-4,       # a tenth of the original Adam rate
+    "epochs": 10,
+    "patience": 3,
+    "batch_size": 32,
+    "replay_fraction": 0.2,      # replayed old windows, per new training window
+    "test_split": 0.2,           # chronological tail of the new windows
+    "val_split": 0.1,
+    "seed": 0,
+}
+
+# Preprocessing settings saved with a model that map onto train.py's config
+CONFIG_KEYS = ("drift_rate", "noise_std", "noise_seed", "time_steps", "label_bins", "label_names")
+METRICS = {"regression": ["rmse", "mae", "r2"], "classifier": ["accuracy", "macro_f1"]}
+
+
+def next_version_path(model_path, output_dir=None):
+    stem, ext = os.path.splitext(os.path.basename(model_path))
+    match = re.match(r"(.*)_v(\d+)$", stem)
+    base, version = (match.group(1), int(match.group(2))) if match else (stem, 1)
+    output_dir = output_dir or os.path.dirname(model_path) or "."
+    while True:
+        version += 1
+        path = os.path.join(output_dir, f"{base}_v{version}{ext}")
+        if not os.path.exists(path):
+            return path
+
+
+# ------------------- Transformers and data -------------------
+
+# The saved scaler state and the train.py config it was made with. All data
+# below (new, replayed and old-test windows) is scaled with these arrays,
+# never refitted. Only legacy models saved before .preprocess.npz files
+# existed refit the scalers, on the original recordings (the same scalers if
+# the settings are the defaults), with a warning.
+def model_transformers(task, model_path, original_csvs, config=None):
+    saved = load_transformers(model_path)
+    if saved is None:
+        print(f"⚠️ No {os.path.basename(model_path)} scaler file; refitting the scalers on {original_csvs}")
+        config = full_config(task, config)
+        prepared = (regression_data if task == "regression" else classifier_data)(original_csvs, config)
+        return transformer_arrays(prepared), config
+    arrays, params = saved
+    config = full_config(task, {**(config or {}), **{k: params[k] for k in CONFIG_KEYS if k in params}})
+    return arrays, config
+
+
+# One recording (CSV or .npy shard in SENSOR_COLUMNS order) preprocessed like
+# training and scaled with the given arrays. Drift and noise start afresh in
+# each file, so nothing carries over from the previous recording. Returns the
+# windows, one target row per window, and the count of scaled feature values
+# outside the fitted [0, 1] range with the total count.
+def file_windows(task, path, arrays, config):
+    from tensorflow.keras.utils import to_categorical
+
+    data = load_sensor_file(path)
+    co_ppm = add_noise(simulate_drift(data.co_ppm.astype(np.float64), config["drift_rate"]), config["noise_std"],
+                       rng=np.random.default_rng(config["noise_seed"]))
+    if task == "regression":
+        X = restore_minmax(arrays, "scaler_X").transform(data.regression_features)
+        y = restore_minmax(arrays, "scaler_y").transform(co_ppm.reshape(-1, 1))
+    else:
+        hazard_label = pd.cut(co_ppm, bins=config["label_bins"], labels=config["label_names"])
+        valid = np.asarray(~pd.isna(hazard_label))
+        encoder = restore_label_encoder(arrays, "label_encoder")
+        X = restore_minmax(arrays, "scaler").transform(data.classify_features[valid])
+        y = to_categorical(encoder.transform(np.asarray(hazard_label[valid])), len(encoder.classes_))
+    X_seq, y_seq = sequence_view(X, y, config["time_steps"])
+    return X_seq, y_seq, int(np.count_nonzero((X < 0) | (X > 1))), X.size
+
+
+# Windows of several recordings, cut inside each file only (as StreamingCorpus
+# does) and then stacked; a single file stays a view
+def scaled_windows(task, paths, arrays, config):
+    parts = [file_windows(task, p, arrays, config) for p in paths]
+    if len(parts) == 1:
+        X_seq, y_seq = parts[0][:2]
+    else:
+        X_seq, y_seq = np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+    out_of_range = sum(p[2] for p in parts) / max(sum(p[3] for p in parts), 1)
+    return X_seq, y_seq, out_of_range
+
+
+def chronological_split(X, y, test_split, val_split):
+    test_start = int(len(X) * (1 - test_split))
+    val_start = test_start - int(test_start * val_split)
+    return ((X[:val_start], y[:val_start]),
+            (X[val_start:test_start], y[val_start:test_start]),
+            (X[test_start:], y[test_start:]))
+
+
+# Training and test windows of the original recordings, split as train.py
+# splits them, scaled with the same arrays as the new windows
+def original_windows(task, original_csvs, arrays, config):
+    X_seq, y_seq, _ = scaled_windows(task, original_csvs, arrays, config)
+    if task == "regression":
+        train, _, test = chronological_split(X_seq, y_seq, config["test_split"], config["val_split"])
+        return train, test
+    train_idx, test_idx = train_test_split(np.arange(len(X_seq)), test_size=config["test_split"],
+                                           random_state=config["split_seed"])
+    return (X_seq[train_idx], y_seq[train_idx]), (X_seq[test_idx], y_seq[test_idx])
+
+
+def evaluate(task, model, X, y, arrays):
+    pred = model.predict(X, batch_size=1024, verbose=0)
+    if task == "regression":
+        scaler_y = restore_minmax(arrays, "scaler_y")
+        pred, true = scaler_y.inverse_transform(pred), scaler_y.inverse_transform(y)
+        return {"rmse": float(np.sqrt(mean_squared_error(true, pred))),
+                "mae": float(mean_absolute_error(true, pred)), "r2": float(r2_score(true, pred))}
+    pred, true = np.argmax(pred, axis=1), np.argmax(y, axis=1)
+    return {"accuracy": float(accuracy_score(true, pred)), "macro_f1": float(f1_score(true, pred, average="macro"))}
+
+
+# ------------------- Training -------------------
+
+def fit(task, model, train_data, val_data, learning_rate, epochs, patience, batch_size, verbose):
+    import tensorflow as tf
+
+    loss = "mse" if task == "regression" else "categorical_crossentropy"
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate), loss=loss)
+    callbacks = []
+    if patience:
+        callbacks.append(tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=patience,
+                                                          restore_best_weights=True))
+    start = time.perf_counter()
+    history = model.fit(*train_data, epochs=epochs, batch_size=batch_size, validation_data=val_data,
+                        callbacks=callbacks, verbose=verbose)
+    return {"train_seconds": round(time.perf_counter() - start, 2), "epochs_run": len(history.history["loss"])}
+
+
+def finetune(task, model_path, new_csvs, original_csvs=DEFAULT_CSV_FILES, settings=None, output_dir=None,
+             compare_full=False, config=None, verbose=2):
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+
+    settings = {**FINETUNE_DEFAULTS, **(settings or {})}
+    tf.keras.utils.set_random_seed(settings["seed"])
+    arrays, config = model_transformers(task, model_path, original_csvs, config)
+
+    X_new, y_new, out_of_range = scaled_windows(task, new_csvs, arrays, config)
+    train_new, val_new, test_new = chronological_split(X_new, y_new, settings["test_split"], settings["val_split"])
+    if out_of_range:
+        print(f"{out_of_range:.2%} of the new scaled feature values are outside the original [0, 1] range")
+    (X_old, y_old), test_old = original_windows(task, original_csvs, arrays, config)
+
+    # New windows plus a random sample of the original training windows
+    rng = np.random.default_rng(settings["seed"])
+    n_replay = min(int(len(train_new[0]) * settings["replay_fraction"]), len(X_old))
+    replay = np.sort(rng.choice(len(X_old), n_replay, replace=False))
+    X_train = np.concatenate([train_new[0], X_old[replay]])
+    y_train = np.concatenate([train_new[1], y_old[replay]])
+    print(f"Fine-tuning on {len(train_new[0])} new + {n_replay} replayed windows")
+
+    base = load_model(model_path, compile=False)
+    rows = {"base": {"new_test": evaluate(task, base, *test_new, arrays),
+                     "old_test": evaluate(task, base, *test_old, arrays)}}
+
+    model = load_model(model_path, compile=False)
+    rows["finetuned"] = fit(task, model, (X_train, y_train), val_new, settings["learning_rate"],
+                            settings["epochs"], settings["patience"], settings["batch_size"], verbose)
+    rows["finetuned"].update({"new_test": evaluate(task, model, *test_new, arrays),
+                              "old_test": evaluate(task, model, *test_old, arrays)})
+
+    out_path = next_version_path(model_path, output_dir)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    model.save(out_path)
+    save_transformers(out_path, arrays, preprocess_params(task, config))
+
+    if compare_full:
+        # Same architecture from random initialisation, on all old + new
+        # training windows, with the original schedule
+        full = tf.keras.models.clone_model(base)
+        X_full = np.concatenate([X_old, train_new[0]])
+        y_full = np.concatenate([y_old, train_new[1]])
+        rows["full_retrain"] = fit(task, full, (X_full, y_full), val_new, config["learning_rate"],
+                                   config["epochs"], config["patience"], config["batch_size"], verbose)
+        rows["full_retrain"].update({"new_test": evaluate(task, full, *test_new, arrays),
+                                     "old_test": evaluate(task, full, *test_old, arrays)})
+
+    report = {
+        "task": task,
+        "parent": model_path,
+        "model_path": out_path,
+        "new_files": new_csvs,
+        "original_files": original_csvs,
+        "settings": settings,
+        "new_windows": {"train": len(train_new[0]), "val": len(val_new[0]), "test": len(test_new[0])},
+        "replayed_windows": n_replay,
+        "new_out_of_range": out_of_range,
+        "results": rows,
+    }
+    with open(os.path.splitext(out_path)[0] + ".finetune.json", "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print_report(report)
+    return report
+
+
+def print_report(report):
+    metrics = METRICS[report["task"]]
+    print(f"\n--- {os.path.basename(report['parent'])} -> {os.path.basename(report['model_path'])} ---")
+    header = [f"{'':<14}", f"{'seconds':>9}", f"{'epochs':>7}"]
+    header += [f"{'new ' + m:>12}" for m in metrics] + [f"{'old ' + m:>12}" for m in metrics]
+    print(" ".join(header))
+    for name, row in report["results"].items():
+        cells = [f"{name:<14}", f"{row.get('train_seconds', 0):>9.1f}", f"{row.get('epochs_run', 0):>7}"]
+        cells += [f"{row['new_test'][m]:>12.4f}" for m in metrics] + [f"{row['old_test'][m]:>12.4f}" for m in metrics]
+        print(" ".join(cells))
+    print(f"✅ Saved fine-tuned model: {report['model_path']}")
+
+
+# ------------------- Main -------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Warm-start fine-tuning of a saved CO model on new recordings")
+    parser.add_argument("task", choices=sorted(METRICS))
+    parser.add_argument("model", help="model to start from, e.g. co_lstm_regression_v1.h5")
+    parser.add_argument("--new", nargs="+", required=True, help="new recordings (CSV or .npy shards)")
+    parser.add_argument("--original", nargs="+", default=DEFAULT_CSV_FILES,
+                        help="recordings the model was trained on (replay sample and old test set)")
+    parser.add_argument("--settings", default="{}", help="JSON overrides of FINETUNE_DEFAULTS")
+    parser.add_argument("--output-dir", default=None, help="default: next to the model")
+    parser.add_argument("--compare-full", action="store_true",
+                        help="also retrain from scratch on old + new windows and compare")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    finetune(args.task, args.model, args.new, args.original, json.loads(args.settings), args.output_dir,
+             args.compare_full)
+
+
+if __name__ == "__main__":
+    main()
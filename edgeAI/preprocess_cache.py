@@ -0,0 +1,199 @@
+import hashlib
+import inspect
+import json
+import marshal
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from sklearn.preprocessing import LabelEncoder, MinMaxScaler
+
+
+# ------------------- Content-addressed preprocessing cache -------------------
+
+# Training-run preprocessing (drift / noise simulation, scaling, labels) is
+# stored under a key derived from the input files' contents plus every
+# preprocessing parameter, as plain .npy files that later runs memory-map.
+# A changed CSV or parameter gives a new key, so stale entries are never read.
+# `code` is a digest of the preprocessing functions' source (code_digest), so
+# editing the preprocessing code gives a new key as well. Bump CACHE_VERSION
+# when the entry format itself changes.
+CACHE_VERSION = 1
+DEFAULT_ROOT = ".preprocess_cache"
+_CHUNK_BYTES = 1 << 20
+
+
+def _digest_index_path(root):
+    return os.path.join(root, "file_digests.json")
+
+
+# blake2b of a file's bytes, memoized by (path, size, mtime) so unchanged
+# recordings are not re-read on every run
+def file_digest(path, root=DEFAULT_ROOT):
+    stat = os.stat(path)
+    memo_key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    index_path = _digest_index_path(root)
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    if memo_key in index:
+        return index[memo_key]
+
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_CHUNK_BYTES), b""):
+            h.update(block)
+    digest = h.hexdigest()
+
+    os.makedirs(root, exist_ok=True)
+    index[memo_key] = digest
+    _write_json_atomic(index_path, index)
+    return digest
+
+
+def cache_key(paths, params, root=DEFAULT_ROOT, code=None):
+    spec = {
+        "version": CACHE_VERSION,
+        "code": code,
+        "files": [file_digest(p, root) for p in paths],
+        "params": params,
+    }
+    encoded = json.dumps(spec, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+# blake2b of the functions' source code (their bytecode when the source is
+# not shipped)
+def code_digest(*functions):
+    h = hashlib.blake2b(digest_size=16)
+    for fn in functions:
+        try:
+            h.update(inspect.getsource(fn).encode())
+        except OSError:
+            h.update(marshal.dumps(fn.__code__))
+    return h.hexdigest()
+
+
+def _write_json_atomic(path, obj):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(obj, f, indent=2, sort_keys=True, default=str)
+    os.replace(tmp, path)
+
+
+# ------------------- Entries -------------------
+
+def load_entry(key, root=DEFAULT_ROOT):
+    entry = os.path.join(root, key)
+    try:
+        with open(os.path.join(entry, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    arrays = {name: np.load(os.path.join(entry, name + ".npy"), mmap_mode="r") for name in meta["arrays"]}
+    return arrays
+
+
+# Written to a temporary directory and renamed, so a crashed or concurrent
+# run never leaves a half-written entry behind
+def save_entry(key, arrays, paths, params, root=DEFAULT_ROOT, code=None):
+    os.makedirs(root, exist_ok=True)
+    entry = os.path.join(root, key)
+    tmp = tempfile.mkdtemp(dir=root, prefix=key + ".")
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, name + ".npy"), np.asarray(array), allow_pickle=False)
+    meta = {"arrays": sorted(arrays), "files": [os.path.abspath(p) for p in paths], "params": params, "code": code}
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2, sort_keys=True, default=str)
+    try:
+        os.rename(tmp, entry)
+    except OSError:
+        # another run stored the same key first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# build_fn() -> {name: array}. Returns the cached arrays (memory-mapped) when
+# this exact input + parameter combination has been preprocessed before.
+# root=None disables the cache.
+def cached_preprocess(paths, params, build_fn, root=DEFAULT_ROOT, code=None):
+    if root is None:
+        return build_fn()
+    key = cache_key(paths, params, root, code)
+    arrays = load_entry(key, root)
+    if arrays is not None:
+        print(f"Preprocessing cache hit: {os.path.join(root, key)}")
+        return arrays
+    print(f"Preprocessing cache miss, building {os.path.join(root, key)}")
+    save_entry(key, build_fn(), paths, params, root, code)
+    return load_entry(key, root)
+
+
+# ------------------- Fitted transformers as arrays -------------------
+
+def minmax_state(scaler, prefix):
+    return {
+        f"{prefix}_min": scaler.min_,
+        f"{prefix}_scale": scaler.scale_,
+        f"{prefix}_data_min": scaler.data_min_,
+        f"{prefix}_data_max": scaler.data_max_,
+        f"{prefix}_feature_range": np.array(scaler.feature_range, dtype=np.float64),
+        f"{prefix}_n_samples_seen": np.array(scaler.n_samples_seen_),
+    }
+
+
+def restore_minmax(arrays, prefix):
+    low, high = (float(v) for v in arrays[f"{prefix}_feature_range"])
+    scaler = MinMaxScaler(feature_range=(low, high))
+    scaler.min_ = np.array(arrays[f"{prefix}_min"])
+    scaler.scale_ = np.array(arrays[f"{prefix}_scale"])
+    scaler.data_min_ = np.array(arrays[f"{prefix}_data_min"])
+    scaler.data_max_ = np.array(arrays[f"{prefix}_data_max"])
+    scaler.data_range_ = scaler.data_max_ - scaler.data_min_
+    scaler.n_samples_seen_ = int(arrays[f"{prefix}_n_samples_seen"])
+    scaler.n_features_in_ = len(scaler.scale_)
+    return scaler
+
+
+def label_encoder_state(encoder, prefix):
+    # unicode, not object, so it saves without pickle
+    return {f"{prefix}_classes": np.asarray(encoder.classes_, dtype=str)}
+
+
+def restore_label_encoder(arrays, prefix):
+    encoder = LabelEncoder()
+    encoder.classes_ = np.array(arrays[f"{prefix}_classes"])
+    return encoder
+
+
+# ------------------- Transformers saved with a model -------------------
+
+# The fitted scaler / label encoder arrays and the preprocessing parameters,
+# written next to a model as <model>.preprocess.npz, so fine-tuning it later
+# scales new recordings exactly as the model was trained instead of refitting
+def transformers_path(model_path):
+    return os.path.splitext(model_path)[0] + ".preprocess.npz"
+
+
+def save_transformers(model_path, arrays, params):
+    path = transformers_path(model_path)
+    np.savez(path, params=np.array(json.dumps(params, sort_keys=True, default=str)),
+             **{name: np.asarray(array) for name, array in arrays.items()})
+    return path
+
+
+# (arrays, params), or None for models saved before these files existed
+def load_transformers(model_path):
+    path = transformers_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as f:
+        arrays = {name: f[name] for name in f.files if name != "params"}
+        params = json.loads(str(f["params"]))
+    return arrays, params
+
+
+def transformer_arrays(arrays):
+    return {name: arrays[name] for name in arrays if name.startswith(("scaler", "label_encoder"))}
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from preprocess_cache import restore_minmax
+from train import (DEFAULT_CSV_FILES, classifier_data, classifier_splits, full_config, regression_data,
+                   regression_splits)
+
+# ------------------- Config -------------------
+
+# Post-training TFLite variants of a trained model, next to the float32
+# export the training scripts already write:
+#   float32       the scripts' export (builtins + Select TF ops), the reference
+#   dynamic_int8  int8 weights, float activations (no calibration data)
+#   int8          full-integer model: the fixed-batch, builtin-only graph of
+#                 tflite_builtin.py (the dynamic-batch graph lowers the LSTM
+#                 to Flex TensorList ops, which cannot be quantized), with
+#                 weights and activations calibrated on real scaled training
+#                 windows. Float I/O, builtin float kernels only where an op
+#                 has no int8 one; --strict-int8 demands int8-only ops and
+#                 int8 I/O. Takes one window per invoke.
+#   float16       float16 weights, dequantized to float32 at load
+VARIANTS = ("float32", "dynamic_int8", "int8", "float16")
+REPRESENTATIVE_WINDOWS = 200
+EVAL_WINDOWS = 2000
+LATENCY_RUNS = 200
+NUM_THREADS = 1          # gateways run one inference thread
+
+# ------------------- Conversion -------------------
+
+def convert(model, variant, representative_windows=None, strict_int8=False):
+    import tensorflow as tf
+
+    if variant == "int8":
+        return convert_int8(model, representative_windows, strict_int8)
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    # Same op set as the float export in LSTM_Model.py / LSTM_Classifier.py
+    converter.target_spec.supported_ops = [
+        tf.lite.OpsSet.TFLITE_BUILTINS,
+        tf.lite.OpsSet.SELECT_TF_OPS
+    ]
+    converter._experimental_lower_tensor_list_ops = False
+
+    if variant == "dynamic_int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif variant == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant != "float32":
+        raise ValueError(f"Unknown variant {variant!r}, expected one of {VARIANTS}")
+    return converter.convert()
+
+
+def convert_int8(model, representative_windows, strict_int8=False):
+    import tensorflow as tf
+    from tflite_builtin import builtin_converter
+
+    if representative_windows is None:
+        raise ValueError("int8 needs representative windows")
+
+    def representative_dataset():
+        for window in representative_windows:
+            yield [np.asarray(window, dtype=np.float32)[None]]
+
+    converter = builtin_converter(model, "fused")
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    if strict_int8:
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    else:
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+                                               tf.lite.OpsSet.TFLITE_BUILTINS]
+    return converter.convert()
+
+
+# ------------------- Evaluation -------------------
+
+class TFLiteRunner:
+    """Runs a converted model on float32 windows, quantizing int8 I/O when needed."""
+
+    def __init__(self, tflite_model, num_threads=NUM_THREADS):
+        import tensorflow as tf
+
+        self.interpreter = tf.lite.Interpreter(model_content=tflite_model, num_threads=num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        # fixed-batch graphs (int8, tflite_builtin.py) cannot be resized
+        self.fixed_batch = int(self.input.get("shape_signature", self.input["shape"])[0]) != -1
+        self._batch = int(self.input["shape"][0]) if self.fixed_batch else None
+        if self.fixed_batch:
+            self.interpreter.allocate_tensors()
+
+    def _resize(self, shape):
+        if not self.fixed_batch and self._batch != shape[0]:
+            self.interpreter.resize_tensor_input(self.input["index"], list(shape))
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self._batch = shape[0]
+
+    def _quantize(self, x):
+        if self.input["dtype"] == np.float32:
+            return x.astype(np.float32)
+        scale, zero_point = self.input["quantization"]
+        info = np.iinfo(self.input["dtype"])
+        return np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(self.input["dtype"])
+
+    def _dequantize(self, y):
+        if self.output["dtype"] == np.float32:
+            return y
+        scale, zero_point = self.output["quantization"]
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def invoke(self, x):
+        self._resize(x.shape)
+        self.interpreter.set_tensor(self.input["index"], self._quantize(x))
+        self.interpreter.invoke()
+        return self._dequantize(self.interpreter.get_tensor(self.output["index"]))
+
+    def predict(self, X, batch_size=256):
+        if self.fixed_batch:
+            batch_size = self._batch
+        return np.concatenate([self.invoke(np.asarray(X[i:i + batch_size]))
+                               for i in range(0, len(X), batch_size)])
+
+    # Milliseconds per single-window invoke (p50, p99), after a short warm-up
+    def latency(self, window, runs=LATENCY_RUNS):
+        x = np.asarray(window, dtype=np.float32)[None]
+        for _ in range(10):
+            self.invoke(x)
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            self.invoke(x)
+            times.append((time.perf_counter() - start) * 1000.0)
+        return float(np.percentile(times, 50)), float(np.percentile(times, 99))
+
+
+def regression_score(y_true_scaled, scaler_y):
+    y_true = scaler_y.inverse_transform(y_true_scaled)
+
+    def score(pred):
+        pred = scaler_y.inverse_transform(pred)
+        return {"rmse": float(np.sqrt(np.mean((pred - y_true) ** 2)))}
+    return score
+
+
+def accuracy_score(y_true_onehot):
+    y_true = np.argmax(y_true_onehot, axis=1)
+
+    def score(pred):
+        return {"accuracy": float(np.mean(np.argmax(pred, axis=1) == y_true))}
+    return score
+
+
+# Calibration windows drawn at random (in time order) from the training set
+def sample_windows(X, n=REPRESENTATIVE_WINDOWS, seed=0):
+    rng = np.random.default_rng(seed)
+    return X[np.sort(rng.choice(len(X), min(n, len(X)), replace=False))]
+
+
+# Representative training windows and a slice of the test set, prepared as in
+# train.py (same preprocessing cache entry), for models loaded from disk
+def evaluation_data(task, config=None, csv_files=DEFAULT_CSV_FILES, n_eval=EVAL_WINDOWS):
+    config = full_config(task, config)
+    if task == "regression":
+        prepared = regression_data(csv_files, config)
+        (X_train, _), _, (X_test, y_test) = regression_splits(prepared, config)
+        # test windows are chronological; keep a contiguous head of them
+        return (sample_windows(X_train), X_test[:n_eval],
+                regression_score(y_test[:n_eval], restore_minmax(prepared, "scaler_y")))
+    prepared = classifier_data(csv_files, config)
+    X_seq, y_seq, train_idx, test_idx = classifier_splits(prepared, config)
+    return (X_seq[sample_windows(train_idx)], X_seq[test_idx[:n_eval]],
+            accuracy_score(y_seq[test_idx[:n_eval]]))
+
+
+# ------------------- Report -------------------
+
+# Converts, writes <name>_<variant>.tflite and measures size, single-window
+# latency and the test metric, with deltas against float32.
+# score(predictions) -> {metric: value}, e.g. regression_score / accuracy_score.
+def quantization_report(model, name, representative, X_eval, score, output_dir=".", variants=VARIANTS,
+                        strict_int8=False, num_threads=NUM_THREADS):
+    os.makedirs(output_dir, exist_ok=True)
+
+    rows, metric = [], None
+    for variant in variants:
+        row = {"variant": variant}
+        try:
+            tflite_model = convert(model, variant, representative, strict_int8=strict_int8)
+        except Exception as e:
+            # e.g. strict int8 when an op has no int8 kernel; keep the other variants
+            row["error"] = repr(e)
+            rows.append(row)
+            print(f"{variant}: conversion failed: {e!r}")
+            continue
+        path = os.path.join(output_dir, f"{name}_{variant}.tflite")
+        with open(path, "wb") as f:
+            f.write(tflite_model)
+
+        runner = TFLiteRunner(tflite_model, num_threads)
+        p50, p99 = runner.latency(X_eval[0])
+        scores = score(runner.predict(X_eval))
+        metric = next(iter(scores))
+        row.update({"path": path, "size_bytes": len(tflite_model), "latency_p50_ms": round(p50, 4),
+                    "latency_p99_ms": round(p99, 4), **scores})
+        rows.append(row)
+
+    base = next((r for r in rows if r["variant"] == "float32" and "error" not in r), None)
+    if base:
+        for row in rows:
+            if "error" not in row:
+                row["size_ratio"] = round(row["size_bytes"] / base["size_bytes"], 4)
+                row[f"{metric}_delta"] = row[metric] - base[metric]
+
+    report = {"name": name, "metric": metric, "eval_windows": len(X_eval), "num_threads": num_threads,
+              "variants": rows}
+    with open(os.path.join(output_dir, f"{name}_quantization.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    return report
+
+
+def print_report(report):
+    metric = report["metric"]
+    print(f"\n--- {report['name']} TFLite variants ({report['eval_windows']} test windows, "
+          f"{report['num_threads']} thread) ---")
+    print(f"{'variant':<14} {'KB':>9} {'size':>7} {'p50 ms':>8} {'p99 ms':>8} {metric:>10} {'delta':>10}")
+    for row in report["variants"]:
+        if "error" in row:
+            print(f"{row['variant']:<14} failed: {row['error']}")
+            continue
+        print(f"{row['variant']:<14} {row['size_bytes'] / 1024:>9.1f} {row.get('size_ratio', 1):>6.0%} "
+              f"{row['latency_p50_ms']:>8.3f} {row['latency_p99_ms']:>8.3f} {row[metric]:>10.4f} "
+              f"{row.get(metric + '_delta', 0.0):>+10.4f}")
+
+
+# ------------------- Main -------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Quantized TFLite exports with a size / latency / accuracy report")
+    parser.add_argument("task", choices=["regression", "classifier"])
+    parser.add_argument("model", help="trained Keras model, e.g. co_lstm_regression_v1.h5")
+    parser.add_argument("--name", default=None, help="output name prefix (default: model file name)")
+    parser.add_argument("--config", default="{}", help="train.py settings the model was trained with (JSON)")
+    parser.add_argument("--csv", nargs="+", default=DEFAULT_CSV_FILES)
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument("--strict-int8", action="store_true", help="int8-only ops and int8 input / output")
+    parser.add_argument("--threads", type=int, default=NUM_THREADS)
+    return parser.parse_args()
+
+
+def main():
+    from tensorflow.keras.models import load_model
+
+    args = parse_args()
+    model = load_model(args.model, compile=False)
+    name = args.name or os.path.splitext(os.path.basename(args.model))[0]
+    representative, X_eval, score = evaluation_data(args.task, json.loads(args.config), args.csv)
+    quantization_report(model, name, representative, X_eval, score, args.output_dir, args.variants,
+                        args.strict_int8, args.threads)
+
+
+if __name__ == "__main__":
+    main()
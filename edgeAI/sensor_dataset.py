@@ -0,0 +1,307 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# ------------------- Column layout -------------------
+
+# Gas sensor array CSVs (e.g. 20160930_203718.csv) are parsed once into one
+# float32 matrix with these columns, in this order:
+#   0 Temperature, 1 Humidity, 2 Heater voltage, 3 Flow rate, 4..17 R1..R14, 18 CO
+# Columns 0..17 are exactly the regression model's 18 features and
+# [0, 1, 2, 18] the classifier's 4, so both inputs are taken without reordering.
+# This is the same row layout the FastAPI /stream endpoint uses.
+TIME_COLUMN = "Time (s)"
+CO_COLUMN = "CO (ppm)"
+REGRESSION_FEATURES = [
+    "Temperature (C)",
+    "Humidity (%r.h.)",
+    "Heater voltage (V)",
+    "Flow rate (mL/min)"
+] + [f"R{i} (MOhm)" for i in range(1, 15)]  # Sensor resistances
+CLASSIFY_FEATURES = ["Temperature (C)", "Humidity (%r.h.)", "Heater voltage (V)", "CO (ppm)"]
+
+SENSOR_COLUMNS = REGRESSION_FEATURES + [CO_COLUMN]
+CO_INDEX = SENSOR_COLUMNS.index(CO_COLUMN)
+REGRESSION_COLUMNS = slice(0, len(REGRESSION_FEATURES))
+CLASSIFY_COLUMNS = [SENSOR_COLUMNS.index(c) for c in CLASSIFY_FEATURES]
+
+CACHE_VERSION = 1
+
+
+class SensorData:
+    """matrix: (rows, 19) float32 in SENSOR_COLUMNS order (np.memmap when cached).
+    time: (rows,) float64 seconds from the Time (s) column (NaN where a
+    stacked file has none), or None.
+    """
+
+    def __init__(self, path, matrix, time=None):
+        self.path = path
+        self.matrix = matrix
+        self.time = time
+
+    def __len__(self):
+        return len(self.matrix)
+
+    @property
+    def co_ppm(self):
+        return self.matrix[:, CO_INDEX]
+
+    # (rows, 18) view in LSTM_Model.py feature order
+    @property
+    def regression_features(self):
+        return self.matrix[:, REGRESSION_COLUMNS]
+
+    # (rows, 4) in LSTM_Classifier.py feature order (a copy: columns are not contiguous)
+    @property
+    def classify_features(self):
+        return self.matrix[:, CLASSIFY_COLUMNS]
+
+
+# ------------------- Parsing -------------------
+
+def _read_columns(path):
+    wanted = set(SENSOR_COLUMNS) | {TIME_COLUMN}
+    # usecols: the C parser only converts the columns we keep, straight into
+    # float arrays, with no per-row dicts or strings
+    df = pd.read_csv(path, usecols=lambda c: c.strip() in wanted, engine="c")
+    df.columns = df.columns.str.strip()
+
+    missing = [c for c in SENSOR_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"{path} is missing columns {missing}")
+
+    matrix = np.empty((len(df), len(SENSOR_COLUMNS)), dtype=np.float32)
+    for i, column in enumerate(SENSOR_COLUMNS):
+        matrix[:, i] = df[column].to_numpy(dtype=np.float32)
+    time = df[TIME_COLUMN].to_numpy(dtype=np.float64) if TIME_COLUMN in df.columns else None
+    return matrix, time
+
+
+def _cache_paths(path, cache_dir):
+    stem = os.path.basename(path)
+    directory = cache_dir or os.path.dirname(os.path.abspath(path))
+    base = os.path.join(directory, stem)
+    return base + ".matrix.npy", base + ".time.npy", base + ".cache.json"
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {"version": CACHE_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "columns": SENSOR_COLUMNS}
+
+
+# Parse a sensor CSV into a SensorData. With cache=True the matrix is saved as
+# .npy next to the CSV (or in cache_dir) and later loads memory-map it; the
+# cache is rebuilt whenever the CSV's size or mtime changes.
+def load_sensor_csv(path, cache=True, cache_dir=None):
+    if not cache:
+        matrix, time = _read_columns(path)
+        return SensorData(path, matrix, time)
+
+    matrix_path, time_path, meta_path = _cache_paths(path, cache_dir)
+    signature = _source_signature(path)
+    try:
+        with open(meta_path) as f:
+            fresh = json.load(f) == signature
+    except (OSError, ValueError):
+        fresh = False
+
+    if fresh:
+        matrix = np.load(matrix_path, mmap_mode="r")
+        time = np.load(time_path, mmap_mode="r") if os.path.exists(time_path) else None
+        return SensorData(path, matrix, time)
+
+    matrix, time = _read_columns(path)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    _save_atomic(matrix_path, lambda f: np.save(f, matrix))
+    if time is not None:
+        _save_atomic(time_path, lambda f: np.save(f, time))
+    elif os.path.exists(time_path):
+        os.remove(time_path)
+    _save_atomic(meta_path, lambda f: f.write(json.dumps(signature).encode()))
+    return SensorData(path, np.load(matrix_path, mmap_mode="r"), time)
+
+
+# Write via a per-process temporary file and rename, so processes parsing the
+# same CSV concurrently (e.g. a training sweep) never read a partial file
+def _save_atomic(path, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+# Load several CSVs and stack them (one copy of the combined matrix). time
+# lines up with the stacked rows: NaN for files without a Time (s) column,
+# None only if no file has one.
+def load_sensor_csvs(paths, cache=True, cache_dir=None):
+    parts = [load_sensor_csv(p, cache=cache, cache_dir=cache_dir) for p in paths]
+    if len(parts) == 1:
+        return SensorData(paths[0], parts[0].matrix, parts[0].time)
+    matrix = np.concatenate([p.matrix for p in parts])
+    time = None
+    if any(p.time is not None for p in parts):
+        time = np.concatenate([np.full(len(p), np.nan) if p.time is None else np.asarray(p.time, dtype=np.float64)
+                               for p in parts])
+    return SensorData(",".join(paths), matrix, time)
+
+
+# ------------------- Windows -------------------
+
+# (n_windows, time_steps, columns) read-only view over a (rows, columns)
+# array: window i starts at row i * stride. No data is copied.
+def window_view(features, time_steps, stride=1):
+    if len(features) < time_steps:
+        raise ValueError(f"Need at least {time_steps} rows, got {len(features)}")
+    view = sliding_window_view(features, (time_steps, features.shape[1]))[:, 0]
+    return view[::stride]
+
+
+# ------------------- Training sequences -------------------
+
+# Same pairs as the training scripts' original create_sequences():
+# X[i:i + time_steps] -> y[i + time_steps] for i in range(len(X) - time_steps)
+def sequence_count(n_rows, time_steps):
+    return max(n_rows - time_steps, 0)
+
+
+# Windows as a strided view over X (no copy) plus the aligned targets (a view
+# of y). Slicing the result chronologically keeps it a view; fancy indexing
+# (e.g. a shuffled split) copies only the selected windows.
+def sequence_view(X, y, time_steps):
+    n = sequence_count(len(X), time_steps)
+    if n == 0:
+        raise ValueError(f"Need more than {time_steps} rows, got {len(X)}")
+    return window_view(X, time_steps)[:n], y[time_steps:]
+
+
+# tf.data pipeline over the same pairs, built batch by batch with a gather
+# from the (rows, features) matrix, so only one batch of windows ever exists.
+# indices: window start positions to use (default all), e.g. a train split.
+def sequence_dataset(X, y, time_steps, indices=None, batch_size=32, shuffle=False, seed=None):
+    import tensorflow as tf
+
+    n = sequence_count(len(X), time_steps)
+    if indices is None:
+        indices = np.arange(n)
+    indices = np.asarray(indices, dtype=np.int64)
+    if len(indices) and (indices.min() < 0 or indices.max() >= n):
+        raise ValueError(f"Window indices must be in [0, {n})")
+
+    features = tf.constant(np.asarray(X, dtype=np.float32))
+    targets = tf.constant(np.asarray(y[time_steps:], dtype=np.float32))
+    offsets = tf.range(time_steps, dtype=tf.int64)
+
+    def gather(batch):
+        return tf.gather(features, batch[:, None] + offsets), tf.gather(targets, batch)
+
+    ds = tf.data.Dataset.from_tensor_slices(indices)
+    if shuffle:
+        ds = ds.shuffle(len(indices), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size).map(gather, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+# ------------------- Streaming corpus -------------------
+
+# A sensor CSV, or a .npy shard already in SENSOR_COLUMNS layout
+def load_sensor_file(path, cache=True, cache_dir=None):
+    if path.endswith(".npy"):
+        return SensorData(path, np.load(path, mmap_mode="r"))
+    return load_sensor_csv(path, cache=cache, cache_dir=cache_dir)
+
+
+class StreamingCorpus:
+    """Many recordings used as one training set without concatenating them.
+
+    Only one file per interleaved reader is in memory at a time. Windows never
+    cross a file boundary, and split fractions (start, end) apply within each
+    file, so (0, 0.8) / (0.8, 1) is a chronological split of every recording.
+
+    target_fn(co_ppm, offset, total_rows, file_index) returns one file's
+    (rows,) target; offset is the file's first row within the whole corpus.
+    It must be deterministic (seed any noise per file): it is called again
+    for the scaler pass and every epoch.
+    """
+
+    def __init__(self, paths, time_steps, target_fn, feature_columns=REGRESSION_COLUMNS,
+                 cache=True, cache_dir=None):
+        self.paths = list(paths)
+        self.time_steps = time_steps
+        self.target_fn = target_fn
+        self.feature_columns = feature_columns
+        self.cache = cache
+        self.cache_dir = cache_dir
+        # Row counts only; cached files are memory-mapped, so this reads headers
+        self.rows = [len(load_sensor_file(p, cache, cache_dir)) for p in self.paths]
+        self.offsets = np.concatenate([[0], np.cumsum(self.rows)[:-1]]).astype(np.int64)
+        self.total_rows = int(sum(self.rows))
+        self.n_features = np.empty((1, len(SENSOR_COLUMNS)))[:, feature_columns].shape[1]
+        self.scaler_X = self.scaler_y = None
+
+    def _load(self, i):
+        data = load_sensor_file(self.paths[i], self.cache, self.cache_dir)
+        features = np.asarray(data.matrix[:, self.feature_columns], dtype=np.float32)
+        target = self.target_fn(data.co_ppm, int(self.offsets[i]), self.total_rows, int(i))
+        return features, np.asarray(target).reshape(-1, 1)
+
+    # One pass over every file with MinMaxScaler.partial_fit
+    def fit_scalers(self, scaler_X, scaler_y):
+        for i in range(len(self.paths)):
+            features, target = self._load(i)
+            scaler_X.partial_fit(features)
+            scaler_y.partial_fit(target)
+        self.scaler_X, self.scaler_y = scaler_X, scaler_y
+        return scaler_X, scaler_y
+
+    def _window_range(self, i, start, end):
+        n = sequence_count(self.rows[i], self.time_steps)
+        return int(n * start), int(n * end)
+
+    def window_count(self, start=0.0, end=1.0):
+        return sum(b - a for a, b in (self._window_range(i, start, end) for i in range(len(self.paths))))
+
+    # Scaled (X, y) windows of file i in chunks of up to `chunk` windows
+    def _file_windows(self, i, start, end, chunk):
+        a, b = self._window_range(int(i), float(start), float(end))
+        if a >= b:
+            return
+        features, target = self._load(int(i))
+        X = self.scaler_X.transform(features).astype(np.float32)
+        y = self.scaler_y.transform(target).astype(np.float32)
+        X_seq, y_seq = sequence_view(X, y, self.time_steps)
+        for s in range(a, b, int(chunk)):
+            e = min(s + int(chunk), b)
+            yield np.ascontiguousarray(X_seq[s:e]), np.ascontiguousarray(y_seq[s:e])
+
+    # tf.data pipeline: interleave files -> windows -> shuffle buffer -> batch -> prefetch.
+    # shuffle_buffer=0 keeps a deterministic order (validation / test).
+    def dataset(self, start=0.0, end=1.0, batch_size=32, shuffle_buffer=0, seed=None,
+                cycle_length=4, chunk_windows=1024):
+        import tensorflow as tf
+
+        if self.scaler_X is None:
+            raise RuntimeError("Call fit_scalers() before dataset()")
+        signature = (
+            tf.TensorSpec((None, self.time_steps, self.n_features), tf.float32),
+            tf.TensorSpec((None, 1), tf.float32),
+        )
+
+        def file_dataset(i):
+            return tf.data.Dataset.from_generator(
+                self._file_windows, args=(i, start, end, chunk_windows), output_signature=signature)
+
+        files = tf.data.Dataset.range(len(self.paths))
+        if shuffle_buffer:
+            files = files.shuffle(len(self.paths), seed=seed, reshuffle_each_iteration=True)
+        ds = files.interleave(file_dataset, cycle_length=min(cycle_length, len(self.paths)),
+                              num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle_buffer)
+        ds = ds.unbatch()
+        if shuffle_buffer:
+            ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,170 @@
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sensor_dataset import load_sensor_csv
+from train import DEFAULT_CSV_FILES, config_id, full_config
+
+# ------------------- Config -------------------
+
+# Trains every combination of a hyperparameter grid with train.py, several
+# configurations at a time in separate processes. Results are appended to a
+# JSON-lines file as runs finish; configurations already in it (same task,
+# settings and input file contents) are skipped, so an interrupted sweep
+# resumes where it stopped.
+RESULTS_FILE = "sweep_results.jsonl"
+THREADS_PER_WORKER = 2
+
+EXAMPLE_GRID = {
+    "units": [[128, 64], [64, 32], [32]],
+    "time_steps": [20, 30],
+    "batch_size": [32, 128],
+}
+
+TABLE_COLUMNS = {
+    "regression": ["test_rmse", "test_mae", "test_r2"],
+    "classifier": ["test_accuracy", "test_macro_f1"],
+}
+
+
+def expand_grid(grid):
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def load_results(path):
+    results = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    results.append(json.loads(line))
+    return results
+
+
+# ------------------- Workers -------------------
+
+# Runs in each pool process before TensorFlow is imported, so every worker's
+# intra-op / inter-op pools stay at `threads` and N workers do not each spawn
+# one thread per core
+def init_worker(threads):
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def run_one(task, overrides, csv_files, output_dir):
+    from train import train
+
+    result = train(task, overrides, csv_files=csv_files, output_dir=output_dir, verbose=0)
+    result["overrides"] = overrides
+    return result
+
+
+# ------------------- Results table -------------------
+
+def print_table(task, results):
+    metrics = TABLE_COLUMNS[task]
+    rows = [r for r in results if r.get("task") == task and "error" not in r]
+    # best first: lowest RMSE for regression, highest accuracy for classification
+    reverse = task == "classifier"
+    rows.sort(key=lambda r: r[metrics[0]], reverse=reverse)
+
+    print(f"\n--- {task} sweep ({len(rows)} runs) ---")
+    numeric = metrics + ["train_s", "epochs", "params", "model_kb"]
+    print("  ".join([f"{'id':<16}", f"{'overrides':<40}"] + [f"{h:>10}" for h in numeric]))
+    for r in rows:
+        cells = [f"{r['id']:<16}", f"{json.dumps(r['overrides'], sort_keys=True):<40}"]
+        cells += [f"{r[m]:>10.4f}" for m in metrics]
+        cells += [f"{r['train_seconds']:>10.1f}", f"{r['epochs_run']:>10}", f"{r['params']:>10}",
+                  f"{r['model_bytes'] / 1024:>10.1f}"]
+        print("  ".join(cells))
+
+
+def write_csv(path, task, results):
+    metrics = TABLE_COLUMNS[task]
+    fields = ["id", "overrides"] + metrics + ["train_seconds", "epochs_run", "params", "model_bytes", "model_path"]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        for r in results:
+            if r.get("task") == task and "error" not in r:
+                writer.writerow([json.dumps(r["overrides"], sort_keys=True) if k == "overrides" else r.get(k)
+                                 for k in fields])
+
+
+# ------------------- Main -------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep over train.py")
+    parser.add_argument("task", choices=sorted(TABLE_COLUMNS))
+    parser.add_argument("--grid", default=json.dumps(EXAMPLE_GRID),
+                        help="JSON object of setting -> list of values, or a path to one")
+    parser.add_argument("--csv", nargs="+", default=DEFAULT_CSV_FILES)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // THREADS_PER_WORKER))
+    parser.add_argument("--threads-per-worker", type=int, default=THREADS_PER_WORKER)
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSON-lines results (appended, used for skipping)")
+    parser.add_argument("--table-csv", default=None, help="also write the results table as CSV")
+    parser.add_argument("--output-dir", default=None, help="keep each trained .h5 here")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    grid = args.grid
+    if os.path.exists(grid):
+        with open(grid) as f:
+            grid = f.read()
+    grid = json.loads(grid)
+
+    configs = []
+    for overrides in expand_grid(grid):
+        run_id = config_id(args.task, full_config(args.task, overrides), args.csv)
+        configs.append((run_id, overrides))
+
+    # Parse each CSV once here, so the workers only memory-map the cached matrix
+    for path in args.csv:
+        load_sensor_csv(path)
+
+    done = {r["id"] for r in load_results(args.results) if "error" not in r}
+    pending = [(run_id, overrides) for run_id, overrides in configs if run_id not in done]
+    print(f"{len(configs)} configurations, {len(configs) - len(pending)} already done, "
+          f"{len(pending)} to train on {args.workers} workers x {args.threads_per_worker} threads")
+
+    # spawn, not fork: TensorFlow's runtime is not fork-safe
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(args.workers, mp_context=ctx, initializer=init_worker,
+                             initargs=(args.threads_per_worker,)) as pool:
+        futures = {pool.submit(run_one, args.task, overrides, args.csv, args.output_dir): (run_id, overrides)
+                   for run_id, overrides in pending}
+        for future in as_completed(futures):
+            run_id, overrides = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # recorded but not counted as done, so the next sweep retries it
+                result = {"task": args.task, "overrides": overrides, "error": repr(e)}
+                print(f"FAILED {run_id} {overrides}: {e!r}")
+            else:
+                print(f"done {run_id} {overrides} in {result['train_seconds']:.0f} s")
+            result["id"] = run_id
+            with open(args.results, "a") as f:
+                f.write(json.dumps(result, default=str) + "\n")
+
+    results = load_results(args.results)
+    print_table(args.task, results)
+    if args.table_csv:
+        write_csv(args.table_csv, args.task, results)
+
+
+if __name__ == "__main__":
+    main()
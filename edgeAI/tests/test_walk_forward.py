@@ -0,0 +1,40 @@
+import pytest
+
+from walk_forward import fold_bounds
+
+
+def test_expanding_folds_leave_the_gap_before_each_test_block():
+    assert fold_bounds(100, folds=2, gap=5) == [
+        {"fold": 0, "train": [0, 45], "test": [50, 75]},
+        {"fold": 1, "train": [0, 70], "test": [75, 100]},
+    ]
+
+
+def test_rolling_folds_keep_a_fixed_train_size():
+    bounds = fold_bounds(100, folds=2, scheme="rolling", gap=5)
+    assert [b["train"] for b in bounds] == [[0, 45], [25, 70]]
+    assert [b["test"] for b in bounds] == [[50, 75], [75, 100]]
+
+
+@pytest.mark.parametrize("scheme", ["expanding", "rolling"])
+@pytest.mark.parametrize("gap", [0, 3, 29])
+def test_train_never_reaches_into_the_gap_or_test(scheme, gap):
+    bounds = fold_bounds(103, folds=4, scheme=scheme, min_train_fraction=0.3, gap=gap)
+    assert len(bounds) == 4
+    for b in bounds:
+        train_start, train_end = b["train"]
+        test_start, test_end = b["test"]
+        assert 0 <= train_start < train_end
+        assert test_start - train_end == gap
+        assert test_end <= 103
+    # test blocks are contiguous and do not overlap
+    assert all(a["test"][1] == b["test"][0] for a, b in zip(bounds, bounds[1:]))
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError, match="Unknown scheme"):
+        fold_bounds(100, scheme="sliding")
+    with pytest.raises(ValueError, match="too few"):
+        fold_bounds(8, folds=5)
+    with pytest.raises(ValueError, match="too few"):
+        fold_bounds(100, folds=2, gap=50)
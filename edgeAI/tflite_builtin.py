@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from quantize import EVAL_WINDOWS, NUM_THREADS, TFLiteRunner, convert, evaluation_data
+from train import DEFAULT_CSV_FILES
+
+# ------------------- Config -------------------
+
+# The default exports allow Select TF ops because the Keras LSTM's dynamic
+# batch dimension turns into TensorList ops, which only the Flex delegate can
+# run. Fixing the batch size (1, one window per invoke as on the gateway) lets
+# the converter fuse each LSTM into the builtin UNIDIRECTIONAL_SEQUENCE_LSTM;
+# "unrolled" instead unrolls the time loop into plain builtin matmuls. Either
+# way the converter only gets TFLITE_BUILTINS, so conversion fails rather than
+# silently pulling in Flex.
+MODES = ("fused", "unrolled")
+BATCH_SIZE = 1
+PARITY_ATOL = 1e-4       # max |TFLite - Keras| on the model's (scaled) outputs
+
+# ------------------- Conversion -------------------
+
+# Same architecture and weights with a fixed batch dimension, and the
+# recurrent layers unrolled for mode="unrolled"
+def fixed_batch_model(model, batch_size=BATCH_SIZE, unroll=False):
+    import tensorflow as tf
+
+    def clone_layer(layer):
+        config = layer.get_config()
+        if unroll and "unroll" in config:
+            config["unroll"] = True
+        return layer.__class__.from_config(config)
+
+    inputs = tf.keras.Input(batch_shape=(batch_size,) + tuple(model.input_shape[1:]))
+    clone = tf.keras.models.clone_model(model, input_tensors=inputs, clone_function=clone_layer)
+    clone.set_weights(model.get_weights())
+    return clone
+
+
+# Converter over the fixed-batch graph, builtin ops only; quantize.py adds
+# int8 calibration on top of it
+def builtin_converter(model, mode="fused", batch_size=BATCH_SIZE):
+    import tensorflow as tf
+
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+    fixed = fixed_batch_model(model, batch_size, unroll=mode == "unrolled")
+    run = tf.function(lambda x: fixed(x, training=False))
+    concrete = run.get_concrete_function(tf.TensorSpec(fixed.input_shape, fixed.inputs[0].dtype))
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], fixed)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+    return converter
+
+
+def convert_builtin(model, mode="fused", batch_size=BATCH_SIZE):
+    return builtin_converter(model, mode, batch_size).convert()
+
+
+# ------------------- Parity and latency -------------------
+
+# Keras vs TFLite on held-out windows, one batch_size-window invoke at a time
+def parity(model, tflite_model, X, batch_size=BATCH_SIZE, atol=PARITY_ATOL):
+    n = len(X) - len(X) % batch_size
+    expected = model.predict(np.asarray(X[:n], dtype=np.float32), batch_size=256, verbose=0)
+    got = TFLiteRunner(tflite_model).predict(X[:n], batch_size=batch_size)
+    diff = np.abs(got - expected)
+    result = {"windows": int(n), "max_abs_diff": float(diff.max()), "mean_abs_diff": float(diff.mean()),
+              "atol": atol, "passed": bool(diff.max() <= atol)}
+    if expected.shape[1] > 1:
+        result["argmax_agreement"] = float(np.mean(np.argmax(got, axis=1) == np.argmax(expected, axis=1)))
+    return result
+
+
+# Converts the builtin-only model, checks it against Keras, writes
+# <name>_builtin.tflite and compares size and latency with the Flex export.
+# Raises if the parity check fails, so a wrong model is never written.
+def export_builtin(model, name, X_holdout, output_dir=".", mode="fused", n_eval=EVAL_WINDOWS,
+                   num_threads=NUM_THREADS, atol=PARITY_ATOL):
+    builtin = convert_builtin(model, mode)
+    check = parity(model, builtin, X_holdout[:n_eval], atol=atol)
+    if not check["passed"]:
+        raise RuntimeError(f"{name} builtin TFLite ({mode}) differs from Keras: "
+                           f"max |diff| {check['max_abs_diff']:.3g} > {atol:g}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{name}_builtin.tflite")
+    with open(path, "wb") as f:
+        f.write(builtin)
+
+    flex = convert(model, "float32")
+    window = X_holdout[0]
+    report = {"name": name, "mode": mode, "path": path, "parity": check, "num_threads": num_threads}
+    for label, tflite_model in (("flex", flex), ("builtin", builtin)):
+        p50, p99 = TFLiteRunner(tflite_model, num_threads).latency(window)
+        report[label] = {"size_bytes": len(tflite_model), "latency_p50_ms": round(p50, 4),
+                         "latency_p99_ms": round(p99, 4)}
+    with open(os.path.join(output_dir, f"{name}_builtin.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    return report
+
+
+def print_report(report):
+    check = report["parity"]
+    print(f"\n--- {report['name']} builtin-only TFLite ({report['mode']}) ---")
+    print(f"parity on {check['windows']} windows: max |diff| {check['max_abs_diff']:.3g}, "
+          f"mean {check['mean_abs_diff']:.3g}"
+          + (f", argmax agreement {check['argmax_agreement']:.2%}" if "argmax_agreement" in check else ""))
+    print(f"{'':<10} {'KB':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for label in ("flex", "builtin"):
+        row = report[label]
+        print(f"{label:<10} {row['size_bytes'] / 1024:>9.1f} {row['latency_p50_ms']:>8.3f} "
+              f"{row['latency_p99_ms']:>8.3f}")
+    print(f"✅ Exported to TFLite (builtin ops only): {report['path']}")
+
+
+# ------------------- Main -------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="TFLite export with builtin ops only (no Flex delegate)")
+    parser.add_argument("task", choices=["regression", "classifier"])
+    parser.add_argument("model", help="trained Keras model, e.g. co_lstm_regression_v1.h5")
+    parser.add_argument("--name", default=None, help="output name prefix (default: model file name)")
+    parser.add_argument("--config", default="{}", help="train.py settings the model was trained with (JSON)")
+    parser.add_argument("--csv", nargs="+", default=DEFAULT_CSV_FILES)
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--mode", choices=MODES, default="fused")
+    parser.add_argument("--atol", type=float, default=PARITY_ATOL)
+    parser.add_argument("--threads", type=int, default=NUM_THREADS)
+    return parser.parse_args()
+
+
+def main():
+    from tensorflow.keras.models import load_model
+
+    args = parse_args()
+    model = load_model(args.model, compile=False)
+    name = args.name or os.path.splitext(os.path.basename(args.model))[0]
+    _, X_holdout, _ = evaluation_data(args.task, json.loads(args.config), args.csv)
+    export_builtin(model, name, X_holdout, args.output_dir, args.mode, num_threads=args.threads, atol=args.atol)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+from math import sqrt
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score, mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder, MinMaxScaler
+
+from preprocess_cache import (DEFAULT_ROOT, cached_preprocess, code_digest, file_digest, label_encoder_state,
+                              minmax_state, restore_label_encoder, restore_minmax, save_transformers,
+                              transformer_arrays)
+from sensor_dataset import CLASSIFY_FEATURES, REGRESSION_FEATURES, load_sensor_csvs, sequence_view
+
+
+# ------------------- Configurations -------------------
+
+# Importable version of LSTM_Model.py / LSTM_Classifier.py: the same data
+# preparation, architecture and splits, with every hyperparameter in a dict.
+# train("regression", {"units": [64, 32]}) returns test metrics, training
+# time and model size instead of plotting and exporting.
+DEFAULT_CSV_FILES = ["20160930_203718.csv"]
+
+REGRESSION_DEFAULTS = {
+    "time_steps": 30,
+    "units": [128, 64],          # LSTM(128, return_sequences=True) -> LSTM(64)
+    "dropout": 0.2,
+    "learning_rate": 0.001,
+    "batch_size": 32,
+    "epochs": 100,
+    "patience": 10,              # EarlyStopping on val_loss, best weights restored
+    "test_split": 0.2,           # chronological
+    "val_split": 0.1,            # tail of the training part
+    "drift_rate": 0.001,
+    "noise_std": 0.05,
+    "noise_seed": 0,
+    "seed": 0,
+}
+
+CLASSIFIER_DEFAULTS = {
+    "time_steps": 10,
+    "units": [64],
+    "dropout": 0.0,
+    "learning_rate": 0.001,
+    "batch_size": 32,
+    "epochs": 10,
+    "patience": None,            # no early stopping, as in LSTM_Classifier.py
+    "test_split": 0.2,           # shuffled, random_state=42
+    "val_split": 0.1,
+    "split_seed": 42,
+    "drift_rate": 0.001,
+    "noise_std": 0.05,
+    "noise_seed": 0,
+    "label_bins": [-np.inf, 50, 100, np.inf],
+    "label_names": ["safe", "warning", "danger"],
+    "seed": 0,
+}
+
+DEFAULTS = {"regression": REGRESSION_DEFAULTS, "classifier": CLASSIFIER_DEFAULTS}
+
+
+def full_config(task, overrides=None):
+    unknown = set(overrides or {}) - set(DEFAULTS[task])
+    if unknown:
+        raise ValueError(f"Unknown {task} settings: {sorted(unknown)}")
+    return {**DEFAULTS[task], **(overrides or {})}
+
+
+# Stable id of (task, config, input file contents), used to skip finished runs
+def config_id(task, config, csv_files):
+    spec = {"task": task, "config": config, "files": [file_digest(p) for p in csv_files]}
+    return hashlib.blake2b(json.dumps(spec, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+
+
+# ------------------- Preprocessing -------------------
+
+# The one implementation of the drift / noise / scaling / label steps; the
+# training scripts (LSTM_Model*.py, LSTM_Classifier*.py) call these too.
+
+# offset / total: drift for rows [offset, offset + len(data)) of a longer series
+def simulate_drift(data, drift_rate=0.001, offset=0, total=None):
+    total = len(data) if total is None else total
+    step = drift_rate * total / (total - 1) if total > 1 else 0.0
+    drift = (offset + np.arange(len(data))) * step
+    return data + drift
+
+
+def add_noise(data, std_dev=0.05, rng=np.random):
+    return data + rng.normal(0, std_dev, size=data.shape)
+
+
+# StreamingCorpus target: the same drift over the whole corpus, noise seeded
+# per file so every pass over a file sees the same values
+def streaming_target(config):
+    def noisy_co(co_ppm, offset, total, file_index):
+        drifted = simulate_drift(np.asarray(co_ppm, dtype=np.float64), config["drift_rate"], offset=offset,
+                                 total=total)
+        return add_noise(drifted, config["noise_std"], rng=np.random.default_rng([config["noise_seed"], file_index]))
+
+    return noisy_co
+
+
+# Source of everything a cache entry depends on besides the files and the
+# parameters, hashed into the key so editing any of it invalidates old entries
+def _preprocess_code(builder):
+    return code_digest(builder, simulate_drift, add_noise, load_sensor_csvs)
+
+
+def _preprocess_params(task, features, config, extra=()):
+    keys = ("drift_rate", "noise_std", "noise_seed", "time_steps") + tuple(extra)
+    return {"model": task, "features": features, **{k: config[k] for k in keys}}
+
+
+# Cache key parameters of the preprocessing, also saved with each model
+def preprocess_params(task, config):
+    if task == "regression":
+        return _preprocess_params("regression", REGRESSION_FEATURES, config)
+    return _preprocess_params("classifier", CLASSIFY_FEATURES, config, ("label_bins", "label_names"))
+
+
+def regression_data(csv_files, config, cache_root=DEFAULT_ROOT):
+    def build():
+        data = load_sensor_csvs(csv_files)
+        co_ppm_drifted = simulate_drift(data.co_ppm.astype(np.float64), config["drift_rate"])
+        co_ppm_noisy = add_noise(co_ppm_drifted, config["noise_std"],
+                                 rng=np.random.default_rng(config["noise_seed"]))
+        scaler_X = MinMaxScaler()
+        scaler_y = MinMaxScaler()
+        return {
+            "X_scaled": scaler_X.fit_transform(data.regression_features),
+            "y_scaled": scaler_y.fit_transform(co_ppm_noisy.reshape(-1, 1)),
+            **minmax_state(scaler_X, "scaler_X"),
+            **minmax_state(scaler_y, "scaler_y"),
+        }
+
+    return cached_preprocess(csv_files, preprocess_params("regression", config), build, root=cache_root,
+                             code=_preprocess_code(regression_data))
+
+
+def classifier_data(csv_files, config, cache_root=DEFAULT_ROOT):
+    def build():
+        data = load_sensor_csvs(csv_files)
+        co_ppm_drifted = simulate_drift(data.co_ppm.astype(np.float64), config["drift_rate"])
+        co_ppm_noisy = add_noise(co_ppm_drifted, config["noise_std"],
+                                 rng=np.random.default_rng(config["noise_seed"]))
+
+        hazard_label = pd.cut(co_ppm_noisy, bins=config["label_bins"], labels=config["label_names"])
+        valid = np.asarray(~pd.isna(hazard_label))
+        hazard_label = hazard_label[valid]
+
+        scaler = MinMaxScaler()
+        label_encoder = LabelEncoder()
+        return {
+            "scaled_features": scaler.fit_transform(data.classify_features[valid]),
+            "labels": label_encoder.fit_transform(np.asarray(hazard_label)),
+            **minmax_state(scaler, "scaler"),
+            **label_encoder_state(label_encoder, "label_encoder"),
+        }
+
+    return cached_preprocess(csv_files, preprocess_params("classifier", config), build, root=cache_root,
+                             code=_preprocess_code(classifier_data))
+
+
+# ------------------- Splits -------------------
+
+# Chronological: (train, val, test) pairs of window views, as in LSTM_Model.py
+def regression_splits(prepared, config):
+    X_seq, y_seq = sequence_view(prepared["X_scaled"], prepared["y_scaled"], config["time_steps"])
+    split_index = int(len(X_seq) * (1 - config["test_split"]))
+    val_samples = int(split_index * config["val_split"])
+    train_end = split_index - val_samples
+    return ((X_seq[:train_end], y_seq[:train_end]),
+            (X_seq[train_end:split_index], y_seq[train_end:split_index]),
+            (X_seq[split_index:], y_seq[split_index:]))
+
+
+# Shuffled window indices, as in LSTM_Classifier.py; y is one-hot
+def classifier_splits(prepared, config):
+    from tensorflow.keras.utils import to_categorical
+
+    n_classes = len(prepared["label_encoder_classes"])
+    X_seq, y_seq = sequence_view(prepared["scaled_features"],
+                                 to_categorical(prepared["labels"], n_classes), config["time_steps"])
+    train_idx, test_idx = train_test_split(np.arange(len(X_seq)), test_size=config["test_split"],
+                                           random_state=config["split_seed"])
+    return X_seq, y_seq, train_idx, test_idx
+
+
+# ------------------- Model -------------------
+
+# Stacked LSTMs (all but the last return sequences), optional Dropout after
+# each, then the output layer
+def build_lstm(input_shape, units, dropout, n_outputs, activation=None):
+    from tensorflow.keras.layers import LSTM, Dense, Dropout, Input
+    from tensorflow.keras.models import Sequential
+
+    layers = [Input(shape=input_shape)]
+    for i, n in enumerate(units):
+        layers.append(LSTM(n, return_sequences=i < len(units) - 1))
+        if dropout:
+            layers.append(Dropout(dropout))
+    layers.append(Dense(n_outputs, activation=activation))
+    return Sequential(layers)
+
+
+def _callbacks(config):
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    if not config["patience"]:
+        return []
+    return [EarlyStopping(monitor="val_loss", patience=config["patience"], restore_best_weights=True)]
+
+
+# Saved .h5 size (the server's format); to a temporary file when not kept
+def _save_model(model, output_dir, name):
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, name + ".h5")
+        model.save(path)
+        return path, os.path.getsize(path)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, name + ".h5")
+        model.save(path)
+        return None, os.path.getsize(path)
+
+
+# ------------------- Training -------------------
+
+def train_regression(config=None, csv_files=DEFAULT_CSV_FILES, output_dir=None, verbose=2,
+                     cache_root=DEFAULT_ROOT):
+    import tensorflow as tf
+
+    config = full_config("regression", config)
+    tf.keras.utils.set_random_seed(config["seed"])
+    prepared = regression_data(csv_files, config, cache_root)
+    scaler_y = restore_minmax(prepared, "scaler_y")
+
+    (X_train, y_train), (X_val, y_val), (X_test, y_test) = regression_splits(prepared, config)
+
+    model = build_lstm(X_train.shape[1:], config["units"], config["dropout"], 1)
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=config["learning_rate"]), loss="mse")
+
+    start = time.perf_counter()
+    history = model.fit(X_train, y_train, epochs=config["epochs"], batch_size=config["batch_size"],
+                        validation_data=(X_val, y_val), callbacks=_callbacks(config), verbose=verbose)
+    train_seconds = time.perf_counter() - start
+
+    y_pred = scaler_y.inverse_transform(model.predict(X_test, batch_size=1024, verbose=0))
+    y_true = scaler_y.inverse_transform(y_test)
+    name = "co_lstm_regression_" + config_id("regression", config, csv_files)
+    model_path, model_bytes = _save_model(model, output_dir, name)
+    if model_path:
+        save_transformers(model_path, transformer_arrays(prepared), preprocess_params("regression", config))
+    return {
+        "task": "regression",
+        "config": config,
+        "test_rmse": float(sqrt(mean_squared_error(y_true, y_pred))),
+        "test_mae": float(mean_absolute_error(y_true, y_pred)),
+        "test_r2": float(r2_score(y_true, y_pred)),
+        "epochs_run": len(history.history["loss"]),
+        "train_seconds": round(train_seconds, 2),
+        "params": int(model.count_params()),
+        "model_bytes": model_bytes,
+        "model_path": model_path,
+    }
+
+
+def train_classifier(config=None, csv_files=DEFAULT_CSV_FILES, output_dir=None, verbose=2,
+                     cache_root=DEFAULT_ROOT):
+    import tensorflow as tf
+
+    config = full_config("classifier", config)
+    tf.keras.utils.set_random_seed(config["seed"])
+    prepared = classifier_data(csv_files, config, cache_root)
+    n_classes = len(restore_label_encoder(prepared, "label_encoder").classes_)
+
+    X_seq, y_seq, train_idx, test_idx = classifier_splits(prepared, config)
+
+    model = build_lstm(X_seq.shape[1:], config["units"], config["dropout"], n_classes, "softmax")
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=config["learning_rate"]),
+                  loss="categorical_crossentropy", metrics=["accuracy"])
+
+    start = time.perf_counter()
+    history = model.fit(X_seq[train_idx], y_seq[train_idx], epochs=config["epochs"],
+                        batch_size=config["batch_size"], validation_split=config["val_split"],
+                        callbacks=_callbacks(config), verbose=verbose)
+    train_seconds = time.perf_counter() - start
+
+    y_pred = np.argmax(model.predict(X_seq[test_idx], batch_size=1024, verbose=0), axis=1)
+    y_true = np.argmax(y_seq[test_idx], axis=1)
+    name = "co_lstm_classifier_" + config_id("classifier", config, csv_files)
+    model_path, model_bytes = _save_model(model, output_dir, name)
+    if model_path:
+        save_transformers(model_path, transformer_arrays(prepared), preprocess_params("classifier", config))
+    return {
+        "task": "classifier",
+        "config": config,
+        "test_accuracy": float(accuracy_score(y_true, y_pred)),
+        "test_macro_f1": float(f1_score(y_true, y_pred, average="macro")),
+        "epochs_run": len(history.history["loss"]),
+        "train_seconds": round(train_seconds, 2),
+        "params": int(model.count_params()),
+        "model_bytes": model_bytes,
+        "model_path": model_path,
+    }
+
+
+TRAINERS = {"regression": train_regression, "classifier": train_classifier}
+
+
+def train(task, config=None, csv_files=DEFAULT_CSV_FILES, output_dir=None, verbose=2, cache_root=DEFAULT_ROOT):
+    return TRAINERS[task](config, csv_files=csv_files, output_dir=output_dir, verbose=verbose,
+                          cache_root=cache_root)
+
+
+# ------------------- Main -------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train one CO LSTM configuration and print its test metrics")
+    parser.add_argument("task", choices=sorted(TRAINERS))
+    parser.add_argument("--config", default="{}",
+                        help='JSON overrides of the defaults, e.g. \'{"units": [64, 32], "time_steps": 20}\'')
+    parser.add_argument("--csv", nargs="+", default=DEFAULT_CSV_FILES)
+    parser.add_argument("--output-dir", default=None, help="keep the trained .h5 here")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    result = train(args.task, json.loads(args.config), csv_files=args.csv, output_dir=args.output_dir)
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
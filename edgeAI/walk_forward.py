@@ -0,0 +1,194 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from scipy import stats
+
+from preprocess_cache import DEFAULT_ROOT
+from sensor_dataset import sequence_count
+from sweep import THREADS_PER_WORKER, init_worker
+from train import DEFAULT_CSV_FILES, config_id, full_config, regression_data
+
+# ------------------- Config -------------------
+
+# Walk-forward (rolling origin) evaluation of the regression model instead of
+# the single 80/20 chronological split. The windows after the first
+# MIN_TRAIN_FRACTION are cut into FOLDS consecutive test blocks; fold k trains
+# on everything before its block ("expanding") or on a fixed-length stretch
+# right before it ("rolling"), with the last val_split of that as validation.
+# GAP windows (default time_steps) are dropped between train and test so no
+# test target is inside a training window. Folds train concurrently, one
+# process each; every process memory-maps the same preprocessing cache entry.
+#
+# The MinMax scalers are those of the cached preprocessing (fitted on the
+# whole recording, as in LSTM_Model.py), so folds differ only in the split.
+FOLDS = 5
+SCHEME = "expanding"
+MIN_TRAIN_FRACTION = 0.5
+CONFIDENCE = 0.95
+METRICS = ["rmse", "mae", "r2"]
+
+
+def fold_bounds(n_windows, folds=FOLDS, scheme=SCHEME, min_train_fraction=MIN_TRAIN_FRACTION, gap=0):
+    if scheme not in ("expanding", "rolling"):
+        raise ValueError(f"Unknown scheme {scheme!r}, expected 'expanding' or 'rolling'")
+    first_test = int(n_windows * min_train_fraction)
+    test_size = (n_windows - first_test) // folds
+    train_size = first_test - gap
+    if test_size < 1 or train_size < 1:
+        raise ValueError(f"{n_windows} windows are too few for {folds} folds")
+    bounds = []
+    for k in range(folds):
+        test_start = first_test + k * test_size
+        train_end = test_start - gap
+        bounds.append({
+            "fold": k,
+            "train": [0 if scheme == "expanding" else train_end - train_size, train_end],
+            "test": [test_start, test_start + test_size],
+        })
+    return bounds
+
+
+# ------------------- Folds -------------------
+
+def run_fold(config, csv_files, bounds, cache_root=DEFAULT_ROOT, verbose=0):
+    import tensorflow as tf
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    from preprocess_cache import restore_minmax
+    from sensor_dataset import sequence_view
+    from train import build_lstm
+
+    tf.keras.utils.set_random_seed(config["seed"])
+    # cache hit: the arrays are memory-mapped, not rebuilt, in every worker
+    prepared = regression_data(csv_files, config, cache_root)
+    scaler_y = restore_minmax(prepared, "scaler_y")
+    X_seq, y_seq = sequence_view(prepared["X_scaled"], prepared["y_scaled"], config["time_steps"])
+
+    train_start, train_end = bounds["train"]
+    test_start, test_end = bounds["test"]
+    val_start = train_end - int((train_end - train_start) * config["val_split"])
+
+    model = build_lstm(X_seq.shape[1:], config["units"], config["dropout"], 1)
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=config["learning_rate"]), loss="mse")
+    callbacks = []
+    if config["patience"]:
+        callbacks.append(tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=config["patience"],
+                                                          restore_best_weights=True))
+    start = time.perf_counter()
+    history = model.fit(X_seq[train_start:val_start], y_seq[train_start:val_start], epochs=config["epochs"],
+                        batch_size=config["batch_size"], callbacks=callbacks, verbose=verbose,
+                        validation_data=(X_seq[val_start:train_end], y_seq[val_start:train_end]))
+    train_seconds = time.perf_counter() - start
+
+    y_pred = scaler_y.inverse_transform(model.predict(X_seq[test_start:test_end], batch_size=1024, verbose=0))
+    y_true = scaler_y.inverse_transform(y_seq[test_start:test_end])
+    return {
+        **bounds,
+        "rmse": float(np.sqrt(mean_squared_error(y_true, y_pred))),
+        "mae": float(mean_absolute_error(y_true, y_pred)),
+        "r2": float(r2_score(y_true, y_pred)),
+        "epochs_run": len(history.history["loss"]),
+        "train_seconds": round(train_seconds, 2),
+    }
+
+
+# Mean with a Student-t confidence interval over the folds
+def aggregate(results, confidence=CONFIDENCE):
+    summary = {}
+    for metric in METRICS:
+        values = np.array([r[metric] for r in results])
+        mean = float(values.mean())
+        if len(values) > 1:
+            std = float(values.std(ddof=1))
+            half = float(stats.t.ppf((1 + confidence) / 2, len(values) - 1) * std / np.sqrt(len(values)))
+        else:
+            std, half = 0.0, float("nan")
+        summary[metric] = {"mean": mean, "std": std, "ci_low": mean - half, "ci_high": mean + half}
+    return summary
+
+
+def walk_forward(config=None, csv_files=DEFAULT_CSV_FILES, folds=FOLDS, scheme=SCHEME,
+                 min_train_fraction=MIN_TRAIN_FRACTION, gap=None, workers=None,
+                 threads_per_worker=THREADS_PER_WORKER, confidence=CONFIDENCE, cache_root=DEFAULT_ROOT):
+    config = full_config("regression", config)
+    gap = config["time_steps"] if gap is None else gap
+
+    # Build (or hit) the preprocessing cache once here, so the workers only map it
+    prepared = regression_data(csv_files, config, cache_root)
+    n_windows = sequence_count(len(prepared["X_scaled"]), config["time_steps"])
+    bounds = fold_bounds(n_windows, folds, scheme, min_train_fraction, gap)
+    workers = workers or min(folds, max(1, (os.cpu_count() or 2) // threads_per_worker))
+    print(f"{folds} {scheme} folds over {n_windows} windows on {workers} workers x {threads_per_worker} threads")
+
+    results = []
+    # spawn, not fork: TensorFlow's runtime is not fork-safe
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=init_worker,
+                             initargs=(threads_per_worker,)) as pool:
+        futures = [pool.submit(run_fold, config, csv_files, b, cache_root) for b in bounds]
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"fold {result['fold']}: RMSE={result['rmse']:.4f} MAE={result['mae']:.4f} "
+                  f"R2={result['r2']:.4f} ({result['train_seconds']:.0f} s)")
+            results.append(result)
+    results.sort(key=lambda r: r["fold"])
+
+    return {
+        "id": config_id("regression", config, csv_files),
+        "config": config,
+        "scheme": scheme,
+        "gap": gap,
+        "confidence": confidence,
+        "folds": results,
+        "summary": aggregate(results, confidence),
+    }
+
+
+def print_report(report):
+    print(f"\n--- Walk-forward ({report['scheme']}, {len(report['folds'])} folds, gap {report['gap']}) ---")
+    print(f"{'fold':>4} {'train':>17} {'test':>17} {'RMSE':>10} {'MAE':>10} {'R2':>10}")
+    for r in report["folds"]:
+        print(f"{r['fold']:>4} {'%d-%d' % tuple(r['train']):>17} {'%d-%d' % tuple(r['test']):>17} "
+              f"{r['rmse']:>10.4f} {r['mae']:>10.4f} {r['r2']:>10.4f}")
+    level = f"{report['confidence']:.0%}"
+    for metric in METRICS:
+        s = report["summary"][metric]
+        print(f"{metric.upper():>4}: {s['mean']:.4f} ± {s['std']:.4f} (std), "
+              f"{level} CI [{s['ci_low']:.4f}, {s['ci_high']:.4f}]")
+
+
+# ------------------- Main -------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parallel walk-forward evaluation of the CO regression LSTM")
+    parser.add_argument("--config", default="{}", help="train.py regression settings (JSON)")
+    parser.add_argument("--csv", nargs="+", default=DEFAULT_CSV_FILES)
+    parser.add_argument("--folds", type=int, default=FOLDS)
+    parser.add_argument("--scheme", choices=["expanding", "rolling"], default=SCHEME)
+    parser.add_argument("--min-train-fraction", type=float, default=MIN_TRAIN_FRACTION)
+    parser.add_argument("--gap", type=int, default=None, help="windows dropped before each test block "
+                                                               "(default: time_steps)")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per fold, bounded by the cores")
+    parser.add_argument("--threads-per-worker", type=int, default=THREADS_PER_WORKER)
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE)
+    parser.add_argument("--output", default=None, help="also write the report as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = walk_forward(json.loads(args.config), args.csv, args.folds, args.scheme, args.min_train_fraction,
+                          args.gap, args.workers, args.threads_per_worker, args.confidence)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()